@@ -1,32 +1,94 @@
+import copy
+import hashlib
 import re
 from PIL import Image
 from PIL.PngImagePlugin import PngImageFile
 import numpy.ma as ma
-from osgeo import gdal, osr
+import pandas as pd
+from osgeo import gdal, gdal_array, osr
+from scipy.sparse import csr_matrix
+from shapely.geometry import Polygon
 
 from pextant.lib.geoshapely import *
 from pextant.lib.geoutils import filled_grid_circle
+from pextant.lib.bitmask import mask_dtype, pack_bool, shifted_slices, unpack_bits, unpack_bool
+from pextant.lib.blockcache import BlockCache, DEFAULT_CACHE_BYTES
+from pextant.lib.memory import nbytes
+from pextant.lib.rasterize import geojson_polygons, polygons_window, rasterize_polygons
+from pextant.lib.sharedarrays import SharedArrays, attach_array
 from pextant.mesh.abstractmesh import GeoMesh, EnvironmentalModel, \
-    SearchKernel, coordinate_transform, Dataset, NpDataset
+    SearchKernel, coordinate_transform, Dataset, NpDataset, obstacle_versions
 from pextant.mesh.abstractcomponents import MeshCollection
 from pextant.mesh.concretecomponents import MeshElement
+from pextant.mesh.clearance import Clearance
+from pextant.mesh.overlay import DEFAULT_TILE_SIZE, tiled
+from pextant.mesh.slope import compute_slopes, extend_slopes
 from pathlib import Path
 from itertools import count
 
+# names of gdal's resampling algorithms (gdal.GRIORA_...) for reads at a coarser resolution than the file's
+RESAMPLING_ALGORITHMS = {
+    'nearest': 'GRIORA_NearestNeighbour',
+    'average': 'GRIORA_Average',
+    'bilinear': 'GRIORA_Bilinear',
+    'cubic': 'GRIORA_Cubic',
+}
+
 class GDALDataset(Dataset):
     '''
     This is a wrapper that gives gdal datasets a shape property, similar to numpy arrays
+
+    Point lookups read the raster one native block at a time, on demand, into an LRU block cache bounded by
+    cache_bytes. In lazy mode subsections are assembled from that cache too and keep the file's native dtype,
+    which allows working with rasters that do not fit in memory.
     '''
-    def __init__(self, dataset, row_size, col_size, resolution):
+    def __init__(self, dataset, row_size, col_size, resolution, lazy=False, cache_bytes=DEFAULT_CACHE_BYTES):
         super(GDALDataset, self).__init__(dataset, row_size, col_size, resolution)
         self.raster = dataset
         self.map_array = None
+        self.lazy = lazy
+        self.cache_bytes = cache_bytes
+        self._open_band()
+
+    def _open_band(self):
+        band = self.raster.GetRasterBand(1)
+        self.nodata = band.GetNoDataValue()
+        self.block_cache = BlockCache(band, self.cache_bytes)
 
     # override interpolator since the data set is just a shell
     def _grid_interpolator_initializer(self):
         return lambda : None
 
-    def subsection(self, x_offset, y_offset, x_size, y_size, desired_res=None):
+    # a live gdal.Dataset can't be pickled, so pickle the file it was opened from and reopen it
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['file_path'] = self.raster.GetDescription()
+        del state['raster'], state['data_container'], state['block_cache']
+        state['map_array'] = None
+        return state
+
+    def __setstate__(self, state):
+        file_path = state.pop('file_path')
+        self.__dict__.update(state)
+        self.raster = gdal.Open(file_path)
+        self.data_container = self.raster
+        self._open_band()
+
+    def nodata_mask(self, values):
+        """True where values are missing: nan, the band's nodata value, or (as always) below -2000"""
+        mask = values < -2e3
+        if self.nodata is not None:
+            mask |= values == self.nodata
+        if values.dtype.kind == 'f':
+            mask |= np.isnan(values)
+        return mask
+
+    def subsection(self, x_offset, y_offset, x_size, y_size, desired_res=None, resampling='nearest', dtype=float):
+        """
+        :param resampling: kernel used when desired_res is coarser than the file: 'nearest', 'average',
+            'bilinear' or 'cubic'. Reads come from the coarsest overview that is still fine enough, if the file has any
+        :param dtype: type gdal reads the elevations as (lazy subsections keep the file's own)
+        """
         buf_x = None
         buf_y = None
         if desired_res:
@@ -37,17 +99,65 @@ class GDALDataset(Dataset):
             buf_x = int(x_size)
             buf_y = int(y_size)
 
-        band = self.raster.GetRasterBand(1)
-
-        # float casting occurs here due to an exception that is hit in gdal_array.BandRasterIONumPy if the 3rd (and 4-6)
-        #   argument is not a 'double'. In addition, explicit passing of non-None buf_x, buf_y occurs since otherwise another
-        #   exception, this one from numpy.empty (1st argument must be int or int tuple)
-        map_array = band.ReadAsArray(float(x_offset), float(y_offset), float(x_size), float(y_size), buf_x, buf_y).astype(np.float)
+        if self.lazy and (buf_x, buf_y) == (int(x_size), int(y_size)):
+            # at native resolution the window is just a set of (possibly already cached) blocks
+            map_array = self.block_cache.read_window(int(x_offset), int(y_offset), buf_x, buf_y)
+        else:
+            band, scale = self.best_overview(desired_res)
+
+            # float casting occurs here due to an exception that is hit in gdal_array.BandRasterIONumPy if the 3rd
+            #   (and 4-6) argument is not a 'double'. In addition, explicit passing of non-None buf_x, buf_y occurs
+            #   since otherwise another exception, this one from numpy.empty (1st argument must be int or int tuple)
+            # gdal converts into the buffer type as it reads, so no intermediate copy of the window is made
+            buf_type = None if self.lazy else gdal_array.NumericTypeCodeToGDALTypeCode(np.dtype(dtype).type)
+            with self.block_cache.lock:
+                map_array = band.ReadAsArray(float(x_offset / scale), float(y_offset / scale),
+                                             float(x_size / scale), float(y_size / scale), buf_x, buf_y,
+                                             buf_type=buf_type,
+                                             resample_alg=getattr(gdal, RESAMPLING_ALGORITHMS[resampling]))
 
         self.map_array = map_array
-        dataset_clean = ma.masked_array(map_array, np.isnan(map_array)).filled(-99999)
-        dataset_clean = NpDataset(ma.masked_array(dataset_clean, dataset_clean < -2e3), desired_res)
-        return dataset_clean
+        return NpDataset(ma.masked_array(map_array, self.nodata_mask(map_array), copy=False), desired_res)
+
+    def best_overview(self, desired_res):
+        """
+        coarsest band (the full resolution one or an overview) whose resolution is still at least desired_res,
+        along with its scale (overview pixel size in full resolution pixels)
+        """
+        band = self.raster.GetRasterBand(1)
+        best_band, best_scale = band, 1.
+        for i in range(band.GetOverviewCount()):
+            overview = band.GetOverview(i)
+            scale = self.x_size / float(overview.XSize)
+            if best_scale < scale <= desired_res / self.resolution:
+                best_band, best_scale = overview, scale
+        return best_band, best_scale
+
+    def build_overviews(self, factors=(2, 4, 8, 16), resampling='average'):
+        """
+        builds overviews once, so that later coarse reads only touch a fraction of the file. Files opened read
+        only get an external .ovr file
+        """
+        self.raster.BuildOverviews(resampling.upper(), list(factors))
+
+    def get_elevations(self, rows, cols):
+        """elevations at integer (row, col) positions of the raster, nan where there is no data"""
+        values = self.block_cache.read_points(rows, cols).astype(float)
+        values[self.nodata_mask(values)] = np.nan
+        return values
+
+    def get_datapoint(self, localpoint):
+        """bilinear interpolation of the elevation at fractional [N x 2] (row, col) positions"""
+        rows, cols = np.transpose(np.atleast_2d(localpoint)).astype(float)
+        row0 = np.clip(np.floor(rows).astype(int), 0, max(self.y_size - 2, 0))
+        col0 = np.clip(np.floor(cols).astype(int), 0, max(self.x_size - 2, 0))
+        row1, col1 = np.minimum(row0 + 1, self.y_size - 1), np.minimum(col0 + 1, self.x_size - 1)
+        row_weight, col_weight = rows - row0, cols - col0
+        corners = self.get_elevations(np.concatenate([row0, row0, row1, row1]),
+                                      np.concatenate([col0, col1, col0, col1])).reshape(4, -1)
+        top = corners[0] * (1 - col_weight) + corners[1] * col_weight
+        bottom = corners[2] * (1 - col_weight) + corners[3] * col_weight
+        return top * (1 - row_weight) + bottom * row_weight
 
 class GridMesh(GeoMesh):
     def __init__(self, *arg, **kwargs):
@@ -55,11 +165,14 @@ class GridMesh(GeoMesh):
         self.ROW_COL = Cartesian(self.nw_geo_point, self.resolution, reverse=True)
         self.COL_ROW = Cartesian(self.nw_geo_point, self.resolution)
 
-    def subsection(self, geo_envelope=None, desired_res=None):
+    def subsection(self, geo_envelope=None, desired_res=None, resampling=None, dtype=None):
         """
                 :param geo_envelope:
                 :type geo_envelope pextant.geoshapely.GeoEnvelope
                 :param desired_res:
+                :param resampling: kernel used for desired_res ('nearest', 'average', 'bilinear' or 'cubic'),
+                    defaults to the dataset's own default
+                :param dtype: type to read the elevations as, defaults to the dataset's own default
                 :return:
         """
         map_nw_corner, map_se_corner  = self.nw_geo_point, GeoPoint(self.COL_ROW, self.x_size, self.y_size)
@@ -86,7 +199,10 @@ class GridMesh(GeoMesh):
             x_size -= 1
             y_size -= 1
 
-        dataset_clean = self.dataset.subsection(x_offset, y_offset, x_size, y_size, desired_res)
+        options = {} if resampling is None else {'resampling': resampling}
+        if dtype is not None:
+            options['dtype'] = dtype
+        dataset_clean = self.dataset.subsection(x_offset, y_offset, x_size, y_size, desired_res, **options)
 
         # TODO: this hack needs explanation
         nw_coord_hack = GeoPoint(self.nw_geo_point.utm_reference, inter_easting.min(), inter_northing.max())\
@@ -96,47 +212,96 @@ class GridMesh(GeoMesh):
                              xoff=x_offset, yoff=y_offset)
         return meta_mesh
 
-    def loadSubSection(self, geo_envelope=None, desired_res=None, **kwargs):
+    def loadSubSection(self, geo_envelope=None, desired_res=None, resampling=None, **kwargs):
         #kwargs is reserved for max slope argument
-        sub_mesh = self.subsection(geo_envelope, desired_res)
+        # elevations are read straight into the model's dtype
+        sub_mesh = self.subsection(geo_envelope, desired_res, resampling, kwargs.get('dtype'))
         return GridMeshModel.from_parent(sub_mesh, **kwargs)
 
+def gdal_nw_geo_point(dataset):
+    """north west corner of a gdal dataset, in the UTM zone named by its projection"""
+    dataset_info = dataset.GetGeoTransform()
+    nw_easting = dataset_info[0]
+    nw_northing = dataset_info[3]
+
+    proj = dataset.GetProjection()
+    srs = osr.SpatialReference(wkt=proj)
+    projcs = srs.GetAttrValue('projcs')  # "NAD83 / UTM zone 5N"...hopefully
+    regex_result = re.search('zone(\s|\_)(\d+)(\w)', projcs, flags=re.IGNORECASE)
+
+    if regex_result:
+        zone_number = regex_result.group(2)  # zone letter is group(2)
+        return GeoPoint(UTM(zone_number), nw_easting, nw_northing)
+    else:
+        return GeoPoint(UTM(0), 0, 0)
+
 class GDALMesh(GridMesh):
     """
     This class should be used for loading all GeoTiff terrains, and any subset thereof
+
+    With lazy=True the file is only read block by block as it is used (see GDALDataset), so elevation lookups
+    and subsections work on rasters larger than memory.
     """
 
-    def __init__(self, file_path):
+    def __init__(self, file_path, lazy=False, cache_bytes=DEFAULT_CACHE_BYTES):
         if isinstance(file_path, Path):
             file_path = str(file_path.absolute())
         self.file_path = file_path
+        self.lazy = lazy
+        self.cache_bytes = cache_bytes
         gdal.UseExceptions()
         dataset = gdal.Open(file_path)
         x_size = dataset.RasterXSize
         y_size = dataset.RasterYSize
 
-        dataset_info = dataset.GetGeoTransform()
-        nw_easting = dataset_info[0]
-        nw_northing = dataset_info[3]
-        resolution = dataset_info[1]
+        resolution = dataset.GetGeoTransform()[1]
         dataset_wrapped = GDALDataset(dataset, row_size=y_size, col_size=x_size,
-                                      resolution=resolution)
+                                      resolution=resolution, lazy=lazy, cache_bytes=cache_bytes)
 
-        proj = dataset.GetProjection()
-        srs = osr.SpatialReference(wkt=proj)
-        projcs = srs.GetAttrValue('projcs')  # "NAD83 / UTM zone 5N"...hopefully
-        regex_result = re.search('zone(\s|\_)(\d+)(\w)', projcs, flags=re.IGNORECASE)
+        super(GDALMesh, self).__init__(gdal_nw_geo_point(dataset), dataset_wrapped)
 
-        if regex_result:
-            zone_number = regex_result.group(2)  # zone letter is group(2)
-            nw_geo_point = GeoPoint(UTM(zone_number), nw_easting, nw_northing)
-        else:
-            nw_geo_point = GeoPoint(UTM(0), 0, 0)
+    def __reduce__(self):
+        # everything is derived from the file, which is much cheaper to reopen than to pickle
+        return GDALMesh, (self.file_path, self.lazy, self.cache_bytes)
 
-        super(GDALMesh, self).__init__(nw_geo_point, dataset_wrapped)
+    def build_overviews(self, factors=(2, 4, 8, 16), resampling='average'):
+        self.dataset.build_overviews(factors, resampling)
+
+    def getElevations(self, mesh_coordinates):
+        # same signature as GridMeshModel.getElevations, but reads (and caches) only the blocks needed
+        row, col = mesh_coordinates
+        return self.dataset.get_elevations(row, col)
+
+def profile_key(max_slope, explorer_type=None):
+    """
+    key of a passability profile: explorer type (e.g. Explorer.type, None for any explorer) and max slope
+    """
+    return explorer_type, float(max_slope)
+
+class PassabilityProfile(object):
+    """
+    Obstacles and neighbour masks of a model for one profile (see profile_key), stored bit-packed while another
+    profile is in use. Obstacle edits made while the profile was in use are kept.
+    """
+    def __init__(self, obstacles, cached_neighbours):
+        self.shape = np.shape(obstacles)
+        self.obstacle_bits = pack_bool(obstacles)
+        self.cached_neighbours = cached_neighbours  # already one bit per kernel element
+
+    def obstacles(self):
+        return unpack_bool(self.obstacle_bits, self.shape)
+
+    @property
+    def nbytes(self):
+        return self.obstacle_bits.nbytes + np.asarray(self.cached_neighbours).nbytes
 
 class GridMeshModel(EnvironmentalModel):
     def __init__(self, *arg, **kwargs):
+        """
+        :param known_model: a smaller model of the same mesh (see window_offset), whose slopes are reused rather than
+            recomputed
+        """
+        self._known_model = kwargs.pop('known_model', None)
         super(GridMeshModel, self).__init__(*arg, **kwargs)
         self.dataset_unmasked = self.data.filled(0) if isinstance(self.data, np.ma.core.MaskedArray) else self.data
         self.isvaliddata = np.logical_not(self.data.mask) if isinstance(self.data, np.ma.core.MaskedArray) \
@@ -148,6 +313,185 @@ class GridMeshModel(EnvironmentalModel):
         self.cached_neighbours = []
         if self.cached:
             self.cache_neighbours()
+        self.profile = profile_key(self.maxSlope)  # profile in use, see select_profile
+        self.profiles = {}  # other profiles, by key
+
+    # arrays that get placed in shared memory when handing a model over to worker processes
+    SHARED_ARRAYS = ['data', 'mask', 'dataset_unmasked', 'isvaliddata', 'slopes', 'obstacles', 'passable',
+                     'cached_neighbours', 'clearance']
+
+    # coordinate frames that models rebuilt by attach() only construct on first use (they need pyproj)
+    LAZY_FRAMES = ['nw_geo_point', 'se_geo_point', 'local_coordinates', 'UTM_REF', 'ROW_COL', 'COL_ROW']
+
+    def __getattr__(self, name):
+        # only called for attributes that are missing, i.e. frames of an attached model not built yet
+        if name in GridMeshModel.LAZY_FRAMES and '_frame_parameters' in self.__dict__:
+            self._build_frames()
+            return self.__dict__[name]
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+    def _build_frames(self):
+        zone, nw_easting, nw_northing = self._frame_parameters
+        nw_geo_point = GeoPoint(UTM(zone), nw_easting, nw_northing)
+        self.nw_geo_point = nw_geo_point
+        self.se_geo_point = GeoPoint(Cartesian(nw_geo_point, self.resolution), self.x_size, self.y_size)
+        self.local_coordinates = XY(nw_geo_point, self.resolution)
+        self.UTM_REF = nw_geo_point.utm_reference
+        self.ROW_COL = Cartesian(nw_geo_point, self.resolution, reverse=True)
+        self.COL_ROW = Cartesian(nw_geo_point, self.resolution)
+
+    def _arrays(self):
+        arrays = {}
+        for name in GridMeshModel.SHARED_ARRAYS:
+            if name == 'data':
+                arrays[name] = np.ma.getdata(self.data)
+            elif name == 'mask':
+                arrays[name] = np.ma.getmaskarray(self.data)
+            elif name == 'cached_neighbours' and not self.cached:
+                continue
+            elif name == 'clearance':
+                if self.clearance is not None:
+                    arrays[name] = np.asarray(self.clearance.distance)
+            else:
+                arrays[name] = np.asarray(getattr(self, name))  # overlays' tiled layers are assembled
+        return arrays
+
+    def memory_report(self):
+        """
+        bytes held by each of the model's arrays (see pextant.lib.memory). Arrays sharing memory with one listed
+        before them (e.g. dataset_unmasked of a model without missing data) count as 0, overlays only count their
+        own tiles
+        """
+        report = {}
+        counted = []
+        for name in GridMeshModel.SHARED_ARRAYS:
+            if name == 'data':
+                array = np.ma.getdata(self.data)
+            elif name == 'mask':
+                array = np.ma.getmask(self.data)
+                array = None if array is np.ma.nomask else array
+            elif name == 'clearance':
+                array = None if self.clearance is None else self.clearance.distance
+            else:
+                array = getattr(self, name)
+            shared = any(array is other or (isinstance(array, np.ndarray) and isinstance(other, np.ndarray) and
+                                            np.may_share_memory(array, other)) for other in counted)
+            report[name] = 0 if shared else nbytes(array)
+            counted.append(array)
+        report['profiles'] = sum(profile.nbytes for profile in self.profiles.values())
+        return report
+
+    def _parameters(self):
+        # plain (picklable) parameters from which the coordinate frames and kernel can be rebuilt
+        if '_frame_parameters' in self.__dict__:
+            frame_parameters = self._frame_parameters
+        else:
+            frame_parameters = (self.UTM_REF.proj_param["zone"], self.nw_geo_point.easting,
+                                self.nw_geo_point.northing)
+        return {
+            'frame': frame_parameters,
+            'resolution': self.resolution,
+            'planet': self.planet,
+            'xoff': self.xoff,
+            'yoff': self.yoff,
+            'maxSlope': self.maxSlope,
+            'kernel_size': self.kernel_size,
+            'kernel_type': self.kernel_type,
+            'cached': self.cached,
+            'dtype': self.dtype.str,
+            'slope_operator': self.slope_operator,
+            'clearance': None if self.clearance is None else
+                (self.clearance.radius, self.clearance.cost_weight, self.clearance.cost_range),
+        }
+
+    def to_shared(self, shared_arrays=None, directory=None):
+        """
+        Places all of the model's large arrays in named shared-memory segments (or memory-mapped files, if
+        'directory' is given) and returns a small picklable state from which other processes can rebuild
+        the model with GridMeshModel.attach, without copying any of the arrays.
+
+        If no 'shared_arrays' owner is passed in, the model owns the segments itself until release_shared()
+        is called. Once shared, pickling the model only pickles this state.
+
+        :type shared_arrays: pextant.lib.sharedarrays.SharedArrays
+        """
+        if shared_arrays is None:
+            shared_arrays = SharedArrays(directory)
+            self._shared_owner = shared_arrays
+
+        handles = dict((name, shared_arrays.share(array)) for name, array in self._arrays().items())
+        state = {'arrays': handles, 'parameters': self._parameters()}
+        self._shared_state = state
+        return state
+
+    def release_shared(self):
+        """unlinks shared memory created by to_shared() (only if the model owns it)"""
+        owner = self.__dict__.pop('_shared_owner', None)
+        if owner is not None:
+            owner.close()
+        self.__dict__.pop('_shared_state', None)
+
+    @classmethod
+    def attach(cls, state):
+        """rebuilds a model from the output of to_shared, without copying or recomputing any arrays"""
+        segments = []
+        arrays = dict((name, attach_array(handle, segments)) for name, handle in state['arrays'].items())
+        model = cls._from_arrays(arrays, state['parameters'])
+        model._shared_segments = segments  # keeps the shared memory mapped for as long as the model lives
+        model._shared_state = state
+        return model
+
+    @classmethod
+    def _from_arrays(cls, arrays, parameters):
+        # builds a model around already computed arrays, skipping slope/obstacle/neighbour computation
+        model = cls.__new__(cls)
+        model._frame_parameters = tuple(parameters['frame'])
+        data = ma.masked_array(arrays['data'], arrays['mask'], copy=False)
+        dataset = NpDataset(data, parameters['resolution'])
+
+        # GeoMesh
+        model.dataset = dataset
+        model.data = dataset.data_container
+        model.x_size = dataset.x_size
+        model.y_size = dataset.y_size
+        model.shape = dataset.shape
+        model.size = dataset.size
+        model.resolution = dataset.resolution
+        model.planet = parameters['planet']
+        model.parent_mesh = None
+        model.xoff = parameters['xoff']
+        model.yoff = parameters['yoff']
+
+        # EnvironmentalModel
+        model.maxSlope = parameters['maxSlope']
+        model.cached = parameters['cached']
+        model.kernel_type = parameters['kernel_type']
+        model.kernel_size = parameters['kernel_size']
+        model.dtype = np.dtype(parameters.get('dtype', 'float64'))
+        model.slope_operator = parameters.get('slope_operator', 'gradient')
+        model.slopes = arrays['slopes']
+        model.obstacles = arrays['obstacles']
+        model.passable = arrays['passable']
+        model.special_obstacles = set()
+        model.version = next(obstacle_versions)
+        clearance = parameters.get('clearance')
+        model.clearance = None if clearance is None else \
+            Clearance(model.shape, model.resolution, *clearance, distance=arrays['clearance'])
+
+        # GridMeshModel
+        model.dataset_unmasked = arrays['dataset_unmasked']
+        model.isvaliddata = arrays['isvaliddata']
+        model.searchKernel = SearchKernel(model.kernel_size, model.kernel_type)
+        model.cached_neighbours = arrays.get('cached_neighbours', [])
+        model.profile = profile_key(model.maxSlope)
+        model.profiles = {}
+        return model
+
+    def __reduce__(self):
+        # shared models are sent as their (tiny) shared state, others by value as plain arrays + parameters
+        if '_shared_state' in self.__dict__:
+            return GridMeshModel.attach, (self._shared_state,)
+        return GridMeshModel._from_arrays, (self._arrays(), self._parameters())
 
     def _getMeshElement(self, mesh_coordinates):
         if len(self._inBounds(mesh_coordinates))>0:
@@ -164,7 +508,7 @@ class GridMeshModel(EnvironmentalModel):
         kernel = self.searchKernel
         offset = kernel.getKernel()
         if self.cached:
-            selection = self.cached_neighbours[state[0],state[1]]
+            selection = self.neighbour_selection(state[0], state[1])
             passable_neighbours = state + offset[selection]
         else:
             potential_neighbours = state + offset
@@ -174,9 +518,30 @@ class GridMeshModel(EnvironmentalModel):
         return MeshCollection(self, passable_neighbours.transpose(), coordsxy.transpose())
 
     def setSlopes(self):
-        [gy, gx] = np.gradient(self.data, self.resolution, self.resolution)
-        self.slopes = np.degrees(
-            np.arctan(np.sqrt(np.add(np.square(gx), np.square(gy)))))  # Combining for now for less RAM usage
+        # tiled and multithreaded; slopes that depend on cells without data are nan
+        known_model = self.__dict__.pop('_known_model', None)
+        offset = None if known_model is None else self.window_offset(known_model)
+        if offset is not None and known_model.slope_operator == self.slope_operator and \
+                known_model.dtype == self.dtype:
+            self.slopes = extend_slopes(self.data, self.resolution, known_model.slopes, offset[0], offset[1],
+                                        self.slope_operator, dtype=self.dtype)
+        else:
+            self.slopes = compute_slopes(self.data, self.resolution, self.slope_operator, dtype=self.dtype)
+
+    def window_offset(self, model):
+        """
+        (row, col) offset of 'model' within this model if it is a window of it, i.e. a model of the same mesh at the
+        mesh's resolution, lying within this model. None otherwise
+        """
+        parent_mesh = self.parent_mesh
+        if parent_mesh is None or model.parent_mesh is not parent_mesh or \
+                not (self.resolution == model.resolution == parent_mesh.resolution):
+            return None
+        row_offset, col_offset = model.yoff - self.yoff, model.xoff - self.xoff
+        if row_offset < 0 or col_offset < 0 or row_offset + model.y_size > self.y_size or \
+                col_offset + model.x_size > self.x_size:
+            return None
+        return row_offset, col_offset
 
     def setRadialKeepOutZone(self, center, radius):
         circlex, circley = filled_grid_circle(radius)
@@ -214,21 +579,107 @@ class GridMeshModel(EnvironmentalModel):
         return len(self._hasdata(mesh_coordinate)) > 0
 
     def maxSlopeObstacle(self, maxSlope):
-        self.obstacles = self.slopes > maxSlope
-        self.passable = np.logical_not(self.obstacles)
+        # written as 'not passable' so that nan slopes (next to missing data) are obstacles
+        self.passable = np.less_equal(self.slopes, maxSlope, out=np.empty(self.shape, dtype=bool))
+        self.obstacles = np.logical_not(self.passable, out=np.empty(self.shape, dtype=bool))
+
+    def select_profile(self, max_slope, explorer_type=None):
+        """
+        makes the passability profile of 'explorer_type' and 'max_slope' the one obstacles, passable and the
+        neighbour masks hold, so one model (elevations, slopes, cost layers) serves several explorers. The profile in
+        use is set aside bit-packed; new profiles are built from the slopes on first use.
+
+        :return: key of the profile
+        """
+        key = profile_key(max_slope, explorer_type)
+        if key == self.profile:
+            return key
+        self.profiles[self.profile] = PassabilityProfile(self.obstacles, self.cached_neighbours)
+
+        profile = self.profiles.pop(key, None)
+        if profile is None:
+            self.maxSlopeObstacle(max_slope)
+        else:
+            self.obstacles = profile.obstacles()
+            self.passable = np.logical_not(self.obstacles)
+        if self.clearance is not None:
+            self.clearance.compute(self.obstacles)
+        if profile is None or self.clearance is not None:
+            # (a stored profile's neighbour masks may have been inflated by another clearance)
+            self.cached_neighbours = self._cache_neighbours() if self.cached else []
+        else:
+            self.cached_neighbours = profile.cached_neighbours
+        self.maxSlope = max_slope
+        self.profile = key
+        self.version = next(obstacle_versions)
+        return key
+
+    def overlay(self, tile_size=DEFAULT_TILE_SIZE):
+        """
+        what-if copy of the model for trying out obstacle edits: it shares every array with the model, except that
+        its obstacles, passable cells and neighbour masks are copy-on-write tiled layers (see TiledLayer). Many
+        overlays of one model can thus be edited and solved on side by side, each costing memory for the tiles
+        its edits touch only. Overlays of an overlay start from its edits.
+
+        Edits made to the model itself afterwards show through the tiles an overlay has not touched.
+        """
+        overlay = copy.copy(self)
+        # shared memory handles describe the model's own arrays
+        overlay.__dict__.pop('_shared_state', None)
+        overlay.__dict__.pop('_shared_owner', None)
+        overlay.obstacles = tiled(self.obstacles, tile_size)
+        overlay.passable = tiled(self.passable, tile_size)
+        if self.cached:
+            overlay.cached_neighbours = tiled(self.cached_neighbours, tile_size)
+        if self.clearance is not None:
+            overlay.clearance = self.clearance.fork(tile_size)
+        overlay.profiles = {}
+        overlay.version = next(obstacle_versions)
+        return overlay
+
+    def set_clearance(self, radius=0., cost_weight=0., cost_range=0.):
+        """
+        computes the clearance of every cell (distance to the nearest obstacle, see Clearance) from the obstacles,
+        keeping it up to date through obstacle edits. Cells closer than 'radius' to an obstacle become unreachable
+        (the neighbour masks and searches leave them out, see inflated_obstacles), and entering a cell within
+        'cost_range' of an obstacle costs up to 'cost_weight' more (see ExplorerCost). set_clearance() with no
+        radius or cost removes the clearance.
+        """
+        if radius or (cost_weight and cost_range):
+            self.clearance = Clearance(self.shape, self.resolution, radius, cost_weight, cost_range)
+            self.clearance.compute(self.obstacles)
+        else:
+            self.clearance = None
+        if self.cached:
+            self.cached_neighbours = self._cache_neighbours()
+        self.version = next(obstacle_versions)
+        return self.clearance
+
+    def inflated_obstacles(self, window=(slice(None), slice(None))):
+        """bool array, over 'window' ((rows, cols) slices), of the obstacles and the cells too close to them"""
+        obstacles = np.asarray(self.obstacles[window], dtype=bool)
+        if self.clearance is not None:
+            obstacles = np.logical_or(obstacles, self.clearance.inflated(window))
+        return obstacles
 
     def set_obstacles(self, obstacles):
+        self.version = next(obstacle_versions)
         if isinstance(self.obstacles, np.ma.core.MaskedArray):
             self.obstacles = np.ma.core.MaskedArray(obstacles)
         elif isinstance(self.obstacles, np.ndarray):
             self.obstacles = np.array(obstacles)
         else:
             self.obstacles = obstacles
+        if self.clearance is not None:
+            self.clearance.compute(self.obstacles)
 
     def _isPassable(self, mesh_coordinates):
         valid_data = self._hasdata(mesh_coordinates)
         row, col = valid_data.transpose()
-        return valid_data[self.passable[row, col]]
+        passable = self.passable[row, col]
+        if self.clearance is not None:
+            passable = np.logical_and(passable, np.logical_not(self.clearance.inflated((row, col))))
+        return valid_data[passable]
 
     def convert_coordinates(self, coordinates):
         if isinstance(coordinates, GeoPoint):
@@ -238,59 +689,173 @@ class GridMeshModel(EnvironmentalModel):
         else:
             return np.array([coordinates])
 
-    #TODO: move to parent class
-    def cache_neighbours(self):
-
-        # cached_neighbours is 3 dimensional array of bools
-        #   D1: x-coordinate into grid
-        #   D2: y-coordinate into grid
-        #   D3: kernal element index
-        #     e.g. cached_neighbours[x, y, idx] tells you whether or not point
-        #     <x,y> can reach point <x,y> + kernal_offsets[idx]
-        self.cached_neighbours = self._cache_neighbours()
-        return self.cached_neighbours
+    def mesh_coordinates(self, coordinates, geo_type):
+        """
+        [N x 2] array of the (row, col) of an [N x 2] array of coordinates in geo_type (LAT_LONG, a UTM zone,
+        ROW_COL...), all converted in one call
+        """
+        return transform_points(coordinates, geo_type, self.ROW_COL).astype(int)
 
-    def _cache_neighbours(self):
+    def node_ids(self, mesh_coordinates):
+        # node index used by graph exports: row-major position in the grid
+        rows, cols = np.transpose(mesh_coordinates)
+        return rows * self.x_size + cols
 
-        # construct array containing all gridpoint coordinates
-        rows, cols = np.mgrid[0:self.y_size, 0:self.x_size]
-        gridpoints = np.array([rows.flatten(), cols.flatten()]).transpose()
+    def node_coordinates(self, node_ids):
+        rows, cols = np.divmod(node_ids, self.x_size)
+        return np.array([rows, cols]).transpose()
 
-        # create empty [x-size * y-size * kernal-size] matrix 'neighbor_reachability_map'
-        #   each matrix element is array of size 'kernal-size' of boolean values
-        #
-        kernel = self.searchKernel
-        offsets = kernel.getKernel()
-        neighbor_reachability_map = np.empty((self.shape[0], self.shape[1], len(offsets)), dtype=bool)
+    def to_csr_graph(self, edge_costs=None):
+        """
+        Exports the passable edges of the grid as a scipy.sparse.csr_matrix, where entry [i, j] is the cost of
+        moving from node i to node j (node ids given by node_ids).
 
-        # cache relative distances of all neighboring nodes to any given node
-        # dr = np.apply_along_axis(np.linalg.norm, 1, offsets) * self.resolution
+        :param edge_costs: [y_size x x_size x kernel size] array of costs to each neighbour (same layout as the
+            layers of ExplorerCost.create_costs_cache). Defaults to the planar distance between nodes.
+        """
+        offsets = self.searchKernel.getKernel()
+        neighbours = np.asarray(self.cached_neighbours) if self.cached else self._cache_neighbours()
+
+        # one entry per passable edge, vectorized per kernel element (one bit of the neighbour masks)
+        rows, cols, kernel_idx = [], [], []
+        for idx in range(len(offsets)):
+            offset_rows, offset_cols = np.nonzero(neighbours & neighbours.dtype.type(1 << idx))
+            rows.append(offset_rows)
+            cols.append(offset_cols)
+            kernel_idx.append(np.full(len(offset_rows), idx))
+        rows, cols, kernel_idx = np.concatenate(rows), np.concatenate(cols), np.concatenate(kernel_idx)
+        from_nodes = rows * self.x_size + cols
+        to_nodes = from_nodes + (offsets[kernel_idx, 0] * self.x_size + offsets[kernel_idx, 1])
+        if edge_costs is None:
+            weights = (np.linalg.norm(offsets, axis=1) * self.resolution)[kernel_idx]
+        else:
+            weights = edge_costs[rows, cols, kernel_idx]
 
-        # go through all neighbors
-        for idx, offset in enumerate(offsets):
+        return csr_matrix((weights, (from_nodes, to_nodes)), shape=(self.size, self.size))
 
-            # construct array of candidate neighbor points, where each entry represents the candidate neighbor for the
-            #   corresponding point in 'gridpoints'
-            candidate_neighbour_point = gridpoints + offset
+    def search_mask(self, region, buffer=0):
+        """
+        Rasterizes a region of interest (e.g. an EVA's approved operating area) into a boolean [y_size x x_size]
+        mask that solvers accept as search_mask, so searches only expand nodes inside it.
+
+        :param region: one of
+            - a boolean array of the model's shape, used as is
+            - a GeoEnvelope, treated as a bounding box
+            - a GeoPolygon, treated as the filled polygon through its points
+            - a shapely (Multi)Polygon in the model's UTM coordinates, e.g. geo_polygon.buffer(50)
+            - a GeoJSON object in longitude/latitude (see set_obstacle_polygons)
+        :param buffer: margin in meters to grow a GeoEnvelope or GeoPolygon by
+        """
+        if isinstance(region, np.ndarray):
+            if region.shape != self.shape:
+                raise ValueError('search mask of shape %s does not match model of shape %s'
+                                 % (region.shape, self.shape))
+            return region.astype(bool, copy=False)
+
+        mask = np.zeros(self.shape, dtype=bool)
+        if isinstance(region, GeoEnvelope):
+            margin = int(np.ceil(buffer / self.resolution))
+            (row_min, col_min), (row_max, col_max) = [point.to(self.ROW_COL) for point in region.getBounds()]
+            mask[max(row_min - margin, 0):max(row_max + margin + 1, 0),
+                 max(col_min - margin, 0):max(col_max + margin + 1, 0)] = True
+            return mask
+
+        if isinstance(region, GeoPolygon):
+            region = Polygon(region.coords)
+            if buffer:
+                region = region.buffer(buffer)
+        return rasterize_polygons(self._polygon_cells(region), self.shape)
+
+    def set_obstacle_polygons(self, polygons, state=True):
+        """
+        marks the cells whose centres lie inside 'polygons' (e.g. keep-out zones) as obstacles (state=True) or
+        passable (state=False), rasterizing them over their bounding window only
 
-            # array of bools corresponding to 'gridpoints' array; value at index indicates if point at 'offset'
-            #   can be a be grdipoint point's neighbor (based exclusively on whether or not that point is within
-            #   bounds of dataset).
-            point_is_neighbour = self._inbounds_bool(candidate_neighbour_point)
+        :param polygons: a GeoPolygon, a shapely (Multi)Polygon in the model's UTM coordinates, a GeoJSON object
+            (geometry, Feature or FeatureCollection, in longitude/latitude), or a list of those. Holes are left out
+        :return: [N x 2] array of the (row, col) of cells that actually changed
+        """
+        cell_polygons = self._polygon_cells(polygons)
+        window = polygons_window(cell_polygons, self.shape)
+        if window is None:
+            return np.empty((0, 2), dtype=int)
+        return self.set_obstacle_window(window, rasterize_polygons(cell_polygons, self.shape, window), state)
+
+    def _polygon_cells(self, polygons):
+        # polygons (see set_obstacle_polygons) as lists of rings of (row, col) vertices in cell units
+        if isinstance(polygons, (list, tuple)):
+            return [polygon for item in polygons for polygon in self._polygon_cells(item)]
+        if isinstance(polygons, dict):
+            return [[self._utm_cells(transform_points(ring, LONG_LAT, self.UTM_REF)) for ring in polygon]
+                    for polygon in geojson_polygons(polygons)]
+        if isinstance(polygons, GeoPolygon):
+            polygons = Polygon(polygons.coords)
+        shapes = polygons.geoms if hasattr(polygons, 'geoms') else [polygons]
+        return [[self._utm_cells(np.array(ring.coords)) for ring in [shape.exterior] + list(shape.interiors)]
+                for shape in shapes]
+
+    def _utm_cells(self, utm_coordinates):
+        # [N x 2] (easting, northing) to (row, col) in cell units, cell (r, c) spanning [r, r + 1) x [c, c + 1)
+        eastings, northings = np.asarray(utm_coordinates, dtype=float).reshape(-1, 2)[:, :2].transpose()
+        return np.column_stack([(self.nw_geo_point.y - northings) / self.resolution,
+                                (eastings - self.nw_geo_point.x) / self.resolution])
 
-            # check to see if 'inbounds' points have valid data
-            #   => update point_is_neighbor with results
-            inbound_rows, inbound_cols = candidate_neighbour_point[point_is_neighbour].transpose()
-            point_is_neighbour[point_is_neighbour] = self.isvaliddata[inbound_rows, inbound_cols]
+    #TODO: move to parent class
+    def cache_neighbours(self):
 
-            # check to see if 'inbounds & valid' points are passable (no obstacles)
-            #   => update point_is_neighbor with results
-            hasdata_rows, hasdata_cols = candidate_neighbour_point[point_is_neighbour].transpose()
-            point_is_neighbour[point_is_neighbour] = self.passable[hasdata_rows, hasdata_cols]
+        # cached_neighbours is a 2 dimensional array of bitmasks, one per grid point
+        #   D1: row into grid
+        #   D2: column into grid
+        #     bit idx of cached_neighbours[row, col] tells you whether or not point <row, col> can reach point
+        #     <row, col> + kernel_offsets[idx]. The integer type is the smallest that has a bit per kernel element
+        #     (uint8 for the 3x3 kernel). neighbour_selection/neighbour_mask unpack it
+        self.cached_neighbours = self._cache_neighbours()
+        return self.cached_neighbours
 
-            # update reachability map
-            neighbor_reachability_map[:,:,idx] = np.reshape(point_is_neighbour, self.shape)
-        return neighbor_reachability_map
+    def _cache_neighbours(self):
+        # a point can be reached if it has valid data and is passable
+        return self._pack_neighbours(self._reachable((slice(None), slice(None))))
+
+    def _reachable(self, window):
+        reachable = np.logical_and(self.isvaliddata[window], self.passable[window])
+        if self.clearance is not None:
+            reachable &= np.logical_not(self.clearance.inflated(window))
+        return reachable
+
+    def _pack_neighbours(self, reachable):
+        offsets = self.searchKernel.getKernel()
+        dtype = mask_dtype(len(offsets))
+
+        # for each offset, compare every point with the point shifted by that offset (no coordinate arrays needed,
+        #   points whose neighbour would be out of bounds are simply never set)
+        packed = np.zeros(reachable.shape, dtype=dtype)
+        for idx, offset in enumerate(offsets):
+            source, destination = shifted_slices(offset, reachable.shape)
+            packed[source] |= reachable[destination] * dtype.type(1 << idx)
+        return packed
+
+    def _update_neighbours(self, rows, cols):
+        # recomputes the masks of every point that can reach a cell of the window rows x cols (slices), after the
+        #   window's obstacles changed. Those points lie within the kernel's reach of the window, and their own
+        #   neighbours within reach again of them
+        reach = int(np.abs(self.searchKernel.getKernel()).max())
+        inner = [(max(s.start - reach, 0), min(s.stop + reach, size)) for s, size in zip((rows, cols), self.shape)]
+        outer = [(max(start - reach, 0), min(stop + reach, size)) for (start, stop), size in zip(inner, self.shape)]
+        (row0, row1), (col0, col1) = outer
+        reachable = self._reachable((slice(row0, row1), slice(col0, col1)))
+        packed = self._pack_neighbours(reachable)
+        (inner_row0, inner_row1), (inner_col0, inner_col1) = inner
+        self.cached_neighbours[inner_row0:inner_row1, inner_col0:inner_col1] = \
+            packed[inner_row0 - row0:inner_row1 - row0, inner_col0 - col0:inner_col1 - col0]
+
+    def neighbour_selection(self, row, col):
+        """bool array over the kernel of the neighbours point <row, col> can reach (needs cache_neighbours)"""
+        return unpack_bits(self.cached_neighbours[row, col], len(self.searchKernel.getKernel()))
+
+    def neighbour_mask(self):
+        """the whole neighbour cache unpacked into a [y_size x x_size x kernel size] bool array"""
+        neighbours = self.cached_neighbours if self.cached else self._cache_neighbours()
+        return unpack_bits(neighbours, len(self.searchKernel.getKernel()))
 
 
 def loadElevationMap(fullPath, maxSlope=35, nw_corner=None, se_corner=None, desiredRes=None):
@@ -299,9 +864,9 @@ def loadElevationMap(fullPath, maxSlope=35, nw_corner=None, se_corner=None, desi
     dem = GDALMesh(fullPath)
     return dem.loadSubSection(geoenvelope, maxSlope=maxSlope, desired_res=desiredRes)
 
-def load_legacy(filename):
+def load_legacy(filename, cache_directory=None):
+    """:param cache_directory: where to keep the parsed grid, if anywhere, see load_legacy_grid"""
     m = Path(filename)
-    name = m.stem
     d = {}
     c = count()
     r = True
@@ -323,38 +888,71 @@ def load_legacy(filename):
 
     # load text beginning with line after all key-value pairs (should be start of grid-based elevation values)
     l = next(c) - 1
-    data = np.loadtxt(str(m.resolve()), skiprows=l)
+    data = load_legacy_grid(m, l, cache_directory)
     dataset = NpDataset(data, resolution=d["cellsize"])
     if "UTMzone" in d:
-        gp = GeoPoint(UTM("UTMzone"), d["xllcorner"], d["yllcorner"])
+        gp = GeoPoint(UTM(d["UTMzone"]), d["xllcorner"], d["yllcorner"])
     else:
         gp = GeoPoint(UTM(1), d["xllcorner"], d["yllcorner"])
     return GridMesh(gp, dataset)
 
+def load_legacy_grid(path, skiprows, cache_directory=None):
+    """
+    elevation grid of a legacy text DEM. Parsing is done by pandas' C parser. If a cache_directory is given, the
+    result is kept there in a .npy file, used instead of the text file for as long as that does not change
+    """
+    cached_grid = None
+    if cache_directory:
+        cache_directory = Path(cache_directory)
+        # named after the text file's full path, so text files of the same name do not collide
+        path_hash = hashlib.sha1(str(path.absolute()).encode('utf-8')).hexdigest()[:16]
+        cached_grid = cache_directory / ('%s.%s.npy' % (path.name, path_hash))
+        if cached_grid.exists() and cached_grid.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+            return np.load(str(cached_grid))
+
+    data = pd.read_csv(str(path), sep=r'\s+', header=None, skiprows=skiprows, dtype=float).to_numpy()
+    if cached_grid is not None:
+        try:
+            cache_directory.mkdir(parents=True, exist_ok=True)
+            np.save(str(cached_grid), data)
+        except OSError:
+            pass  # read-only location, parse again next time
+    return data
+
 def load_obstacle_map(filename):
 
-    # load the image
+    # load the image, 'black' pixels (i.e. '0', or RGB = 000 whatever the alpha) are obstacles
     img: PngImageFile = Image.open(filename, 'r')
-    pixel_values = list(img.getdata())
-
-    # create a 'zero elevation' model with same dimensions as image
-    data = np.zeros((img.height, img.width), dtype=float)
-    dataset = NpDataset(data, resolution=1.0)
-    gp = GeoPoint(UTM(1), 0, 0)
-    grid_mesh = GridMesh(gp, dataset)
-    model = grid_mesh.loadSubSection(maxSlope=90, cached=False)
-
-    # convert to 0/1 values
-    if len(pixel_values) > 0 and isinstance(pixel_values[0], tuple):
-        zero_value = (0, 0, 0)  # want RGB = 000, don't care about alpha
-        pixel_values = [0 if value[0:3] == zero_value else 1 for value in pixel_values]
-
-    # add the obstacles to the model
-    obstacle_map = np.array(np.logical_not(pixel_values))  # 'black' (i.e. '0') values are obstacles, want to only those
-    obstacle_map = obstacle_map.reshape(img.height, img.width)
-    model.set_obstacle_map(obstacle_map)
-
-    return model
+    pixel_values = np.asarray(img)
+    if pixel_values.ndim == 3:
+        obstacle_map = np.logical_not(pixel_values[:, :, :3].any(axis=2))
+    else:
+        obstacle_map = np.logical_not(pixel_values)
+
+    # mazes are flat, so build a 'zero elevation' model with same dimensions as image around the obstacles directly,
+    #   without going through the slope computation
+    shape = obstacle_map.shape
+    arrays = {
+        'data': np.zeros(shape),
+        'mask': np.zeros(shape, dtype=bool),
+        'dataset_unmasked': np.zeros(shape),
+        'isvaliddata': np.ones(shape, dtype=bool),
+        'slopes': np.zeros(shape),
+        'obstacles': obstacle_map,
+        'passable': np.logical_not(obstacle_map),
+    }
+    parameters = {
+        'frame': (1, 0, 0),
+        'resolution': 1.0,
+        'planet': 'Earth',
+        'xoff': 0,
+        'yoff': 0,
+        'maxSlope': 90,
+        'kernel_size': 3,
+        'kernel_type': 'square',
+        'cached': False,
+    }
+    return GridMeshModel._from_arrays(arrays, parameters)
 
 
 if __name__ == '__main__':
@@ -19,10 +19,16 @@ class Pathfinder:
     optimize on other resources like battery power or water sublimated, but those are significantly more
     difficult because they depend on shadowing and was not implemented by Aaron.
     """
-    def __init__(self, explorer_model, environmental_model):
-        cheating = 1
-        self.solver = astarSolver(environmental_model, explorer_model,
-                                  optimize_on = 'Energy', heuristic_accelerate = cheating)
+    def __init__(self, explorer_model, environmental_model=None, solver=None):
+        """
+        :param solver: solver to use instead of an astarSolver on environmental_model, e.g. an adaptiveSolver
+            that loads its own model around the waypoints
+        """
+        if solver is None:
+            cheating = 1
+            solver = astarSolver(environmental_model, explorer_model,
+                                 optimize_on = 'Energy', heuristic_accelerate = cheating)
+        self.solver = solver
 
     def aStarCompletePath(self, optimize_on, waypoints, returnType="JSON", dh=None, fileName=None ):
         pass
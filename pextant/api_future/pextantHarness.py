@@ -20,7 +20,8 @@ import os
 from pextant.api import Pathfinder
 from pextant.explorers import Astronaut
 from pextant.lib.geoshapely import GeoPoint, GeoEnvelope, LAT_LONG
-from pextant.EnvironmentalModel import loadElevationMap
+from pextant.EnvironmentalModel import GDALMesh, loadElevationMap
+from pextant.solvers.adaptive import adaptiveSolver
 
 class SettingsTest:
     def __init__(self, root):
@@ -35,10 +36,22 @@ def getCornersForMap(extent, zone, zoneLetter):
     return None, None
 
 
-def getMap(site, maxSlope=15, extent=None):
+def getDemPath(site):
     site_frame = site['name']
     dem_name = site_frame.replace(' ', '_') + '.tif'
-    fullPath = os.path.join(settings.DATA_ROOT, 'dem', dem_name)
+    return os.path.join(settings.DATA_ROOT, 'dem', dem_name)
+
+
+def getMesh(site):
+    # read lazily: the solver only loads the blocks around the plan
+    fullPath = getDemPath(site)
+    if os.path.isfile(fullPath):
+        return GDALMesh(fullPath, lazy=True)
+    return None
+
+
+def getMap(site, maxSlope=15, extent=None):
+    fullPath = getDemPath(site)
     if os.path.isfile(fullPath):
         zone = site['alternateCrs']['properties']['zone']
         zoneLetter = site['alternateCrs']['properties']['zoneLetter']
@@ -106,11 +119,17 @@ def callPextant(request, plan, optimize=None, maxSlope=15, extent=None):
 
     site = plan.jsonPlan.site
 
-    dem = getMap(site, maxSlope, extent)
-    if not dem:
-        raise Exception('Could not load DEM while calling Pextant for ' + site['name'])
-    #
-    pathFinder = Pathfinder(explorer, dem)
+    if extent:
+        dem = getMap(site, maxSlope, extent)
+        if not dem:
+            raise Exception('Could not load DEM while calling Pextant for ' + site['name'])
+        pathFinder = Pathfinder(explorer, dem)
+    else:
+        # no fixed extent: the window around the plan grows until the paths fit in it
+        mesh = getMesh(site)
+        if not mesh:
+            raise Exception('Could not load DEM while calling Pextant for ' + site['name'])
+        pathFinder = Pathfinder(explorer, solver=adaptiveSolver(mesh, explorer, maxSlope=maxSlope))
     sequence = plan.jsonPlan.sequence
     jsonSequence = json.dumps(sequence)
     try:
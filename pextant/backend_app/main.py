@@ -2,6 +2,7 @@ import sys
 sys.path.append('../../')
 import argparse
 from pextant.backend_app.app_state_manager import AppStateManager
+from pextant.backend_app.path_manager import PathManager
 
 if __name__ == '__main__':
 
@@ -14,8 +15,16 @@ if __name__ == '__main__':
         action="store_true"
     )
 
+    # bundles_directory
+    parser.add_argument(
+        "-b", "--bundles_directory",
+        help="where preprocessed models are kept (default: %s)" % PathManager.BUNDLES_DIRECTORY
+    )
+
     # parse command line
     args = parser.parse_args()
+    if args.bundles_directory:
+        PathManager.BUNDLES_DIRECTORY = args.bundles_directory
 
     # create the app state manager
     app_man = AppStateManager(create_gui=args.create_gui)
@@ -0,0 +1,108 @@
+import json
+from collections import OrderedDict
+import numpy as np
+from pextant.lib.bitmask import pack_bool, unpack_bool
+from pextant.lib.memory import report_total
+
+# default memory budget of the loaded model cache, in bytes
+DEFAULT_MODEL_CACHE_BYTES = 2 * 2**30
+
+
+def model_cache_key(bundle_key):
+    """hashable version of a model's invalidation key (see pextant.mesh.bundle.bundle_key)"""
+    return json.dumps(bundle_key, sort_keys=True, default=str)
+
+
+class LoadedModel(object):
+    """
+    A terrain model together with everything derived from it: its cost function and the path finder holding
+    its C++ cached layers (kernel, costs...)
+    """
+    def __init__(self, terrain_model, cost_function, path_finder):
+        self.terrain_model = terrain_model
+        self.cost_function = cost_function
+        self.path_finder = path_finder
+
+        # obstacles as loaded (bit-packed), before any scenario or user edits, per passability profile
+        self.base_obstacles = {}
+        self.remember_profile()
+
+    @property
+    def nbytes(self):
+        """
+        bytes held by the model, its cost function and path finder as they are now (profiles, clearances or cost
+        layers added since loading included)
+        """
+        terrain_model = self.terrain_model
+        nbytes = report_total(terrain_model.memory_report()) + report_total(self.cost_function.memory_report()) + \
+            report_total(dict(self.path_finder.memory_report()))
+        if not self.path_finder.costs_cached:
+            # the energy layer the path finder will hold again as floats
+            nbytes += terrain_model.size * len(terrain_model.searchKernel.getKernel()) * 4
+        return nbytes
+
+    def remember_profile(self):
+        # called once a profile is first selected, before anything edits it
+        profile = getattr(self.terrain_model, 'profile', None)
+        if profile not in self.base_obstacles:
+            self.base_obstacles[profile] = pack_bool(self.terrain_model.obstacles)
+
+    def select_profile(self, max_slope, explorer_type=None):
+        """switches the model to another explorer's passability profile, see GridMeshModel.select_profile"""
+        self.terrain_model.select_profile(max_slope, explorer_type)
+        self.remember_profile()
+
+    def reset(self):
+        """brings the model back to its loaded obstacles, and drops the path finder's obstacle and endpoint layers"""
+        terrain_model = self.terrain_model
+        obstacles = np.asarray(terrain_model.obstacles)
+        if obstacles.dtype != bool:
+            terrain_model.obstacles = obstacles = obstacles.astype(bool)
+        base_obstacles = unpack_bool(self.base_obstacles[getattr(terrain_model, 'profile', None)], obstacles.shape)
+
+        # only the cells that differ get touched, along with their neighbour masks
+        terrain_model.set_obstacle_map(np.logical_and(base_obstacles, np.logical_not(obstacles)), True)
+        terrain_model.set_obstacle_map(np.logical_and(obstacles, np.logical_not(base_obstacles)), False)
+
+        self.path_finder.clear_obstacles()
+        self.path_finder.clear_heuristics()
+        self.path_finder.reset_progress()
+
+
+class ModelCache(object):
+    """
+    Loaded models by key, least recently used ones evicted beyond a budget in bytes. Models are measured each time
+    the budget is checked, as they grow after loading (see LoadedModel.nbytes)
+    """
+    def __init__(self, cache_bytes=DEFAULT_MODEL_CACHE_BYTES):
+        self.cache_bytes = cache_bytes
+        self.models = OrderedDict()
+
+    @property
+    def nbytes(self):
+        return sum(loaded_model.nbytes for loaded_model in self.models.values())
+
+    def get(self, key):
+        loaded_model = self.models.get(key)
+        if loaded_model is not None:
+            self.models.move_to_end(key)
+        return loaded_model
+
+    def put(self, key, loaded_model):
+        self.discard(key)
+        self.models[key] = loaded_model
+
+        # evict least recently used models, but always keep the one just added
+        nbytes = self.nbytes
+        while nbytes > self.cache_bytes and len(self.models) > 1:
+            _, evicted = self.models.popitem(last=False)
+            nbytes -= evicted.nbytes
+            evicted.path_finder.clear_all()
+
+    def discard(self, key):
+        self.models.pop(key, None)
+
+    def clear(self):
+        for loaded_model in self.models.values():
+            loaded_model.path_finder.clear_all()
+        self.models = OrderedDict()
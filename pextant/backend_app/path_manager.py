@@ -4,9 +4,12 @@ import pextant.backend_app.utils as utils
 from os import path
 from pextant.backend_app.app_component import AppComponent
 from pextant.backend_app.events.event_dispatcher import EventDispatcher
+from pextant.backend_app.model_cache import LoadedModel, ModelCache, model_cache_key
 from pextant.EnvironmentalModel import load_legacy, GDALMesh, load_obstacle_map
 from pextant.explorers import Astronaut, TraversePath
+from pextant.lib.bitmask import rle_decode, rle_encode
 from pextant.lib.geoshapely import GeoPoint, GeoPolygon, LatLon, Cartesian, LAT_LONG
+from pextant.mesh.bundle import DEFAULT_BUNDLES_DIRECTORY, bundle_key, load_bundled
 from pextant.solvers.astarMesh import ExplorerCost
 from pextant_cpp import PathFinder
 from threading import Thread
@@ -21,6 +24,9 @@ class PathManager(AppComponent):
     # consts
     SCENARIOS_DIRECTORY = 'scenarios'
     MODELS_DIRECTORY = 'models'
+    # preprocessed (memory-mapped) versions of the models, see pextant.mesh.bundle. Unlike the directories above it
+    #   does not depend on the working directory, and can be pointed elsewhere (e.g. a larger disk, see main.py)
+    BUNDLES_DIRECTORY = DEFAULT_BUNDLES_DIRECTORY
     OBSTACLES_DIRECTORY = 'obstacles'
 
     # properties
@@ -92,6 +98,8 @@ class PathManager(AppComponent):
         # path variables
         self.path_finder = PathFinder()
         self.agent = Astronaut(80)
+        self.model_cache = ModelCache()  # models loaded so far, with their path finders, for scenario switches
+        self.model_key = None
         self.terrain_model = None
         self.cost_function = None
         self.start_point = None
@@ -139,18 +147,9 @@ class PathManager(AppComponent):
 
         # model
         self.load_model(model_file, max_slope, False)
-        # obstacles
-        if obstacles_file:
-            json_object = utils.read_file_as_json(obstacles_file, PathManager.OBSTACLES_DIRECTORY)
-            self.terrain_model.set_obstacles(json_object['obstacles'])
-        # obstacles list
-        elif obstacles_list_file:
-            json_object = utils.read_file_as_json(obstacles_list_file, PathManager.OBSTACLES_DIRECTORY)
-            obstacles_list = json_object['obstacles']
-            obstacles_grid = np.zeros(self.terrain_model.shape, dtype=bool)
-            for coordinates in obstacles_list:
-                obstacles_grid[coordinates[0], coordinates[1]] = True
-            self.terrain_model.set_obstacles(obstacles_grid)
+        # obstacles (grid or list)
+        if obstacles_file or obstacles_list_file:
+            self.terrain_model.set_obstacles(self.read_obstacles(obstacles_file or obstacles_list_file))
         # endpoint setting
         self.set_start_point(start_coordinates, coordinate_system, False)
         self.set_end_point(end_coordinates, coordinate_system, False)
@@ -208,18 +207,9 @@ class PathManager(AppComponent):
         obstacles_file = scenario.get('obstacles', None)
         obstacles_list_file = scenario.get('obstacles_list', None)
 
-        # obstacles
-        if obstacles_file:
-            json_object = utils.read_file_as_json(obstacles_file, PathManager.OBSTACLES_DIRECTORY)
-            self.terrain_model.set_obstacles(json_object['obstacles'])
-        # obstacles list
-        elif obstacles_list_file:
-            json_object = utils.read_file_as_json(obstacles_list_file, PathManager.OBSTACLES_DIRECTORY)
-            obstacles_list = json_object['obstacles']
-            obstacles_grid = np.zeros(self.terrain_model.shape, dtype=bool)
-            for coordinates in obstacles_list:
-                obstacles_grid[coordinates[0], coordinates[1]] = True
-            self.terrain_model.set_obstacles(obstacles_grid)
+        # obstacles (grid or list)
+        if obstacles_file or obstacles_list_file:
+            self.terrain_model.set_obstacles(self.read_obstacles(obstacles_file or obstacles_list_file))
 
         # get new obstacles
         new_obstacles = self.terrain_model.obstacles.astype(bool)
@@ -230,6 +220,41 @@ class PathManager(AppComponent):
             new_obstacles
         )
 
+    def read_obstacles(self, obstacles_file):
+        """
+        reads an obstacles file into a bool grid of the terrain model's shape. Files hold a json object in one of
+        these formats:
+            - {'shape': [rows, cols], 'runs': [...]}: run lengths of the grid (see obstacles_json)
+            - {'polygons': GeoJSON}: keep-out polygons in longitude/latitude, holes and multipolygons included
+            - {'obstacles': [[row, col], ...]}: list of obstacle cells
+            - {'obstacles': [[bool, ...], ...]}: full grid (the original format)
+        """
+        json_object = utils.read_file_as_json(obstacles_file, PathManager.OBSTACLES_DIRECTORY)
+        shape = self.terrain_model.shape
+        if 'runs' in json_object:
+            if tuple(json_object['shape']) != shape:
+                raise ValueError('obstacles of shape %s do not match model of shape %s'
+                                 % (tuple(json_object['shape']), shape))
+            return rle_decode(json_object['runs'], shape)
+        if 'polygons' in json_object:
+            return self.terrain_model.search_mask(json_object['polygons'])
+
+        obstacles = np.asarray(json_object['obstacles'])
+        if obstacles.dtype == bool:
+            return obstacles
+        obstacles_grid = np.zeros(shape, dtype=bool)
+        if len(obstacles):
+            obstacles_grid[obstacles[:, 0], obstacles[:, 1]] = True
+        return obstacles_grid
+
+    @staticmethod
+    def obstacles_json(obstacles):
+        """compact json object of a bool obstacle grid, as the run lengths of its cells in row-major order (see read_obstacles)"""
+        return {
+            'shape': list(np.shape(obstacles)),
+            'runs': rle_encode(obstacles).tolist()
+        }
+
     '''=======================================
     MODELS
     ======================================='''
@@ -242,30 +267,30 @@ class PathManager(AppComponent):
     def load_model(self, model_to_load, max_slope, dispatch_completed_event=True):
         """load terrain model from data at specified 'model_to_load' location"""
 
-        # clear everything
-        self.path_finder.clear_all()
-
         # get the name of the file of the model to load
         local_path_file_name = path.join(PathManager.MODELS_DIRECTORY, model_to_load)
         _, extension = path.splitext(local_path_file_name)
-
-        # load the model
-        if extension == '.txt':  # text file is 'legacy'
-            grid_mesh = load_legacy(local_path_file_name)
-            self.terrain_model = grid_mesh.loadSubSection(maxSlope=max_slope, cached=True)
-        elif extension == '.png':  # .png is obstacle 'maze'
-            self.terrain_model = load_obstacle_map(local_path_file_name)
-        elif extension == '.img' or extension == '.tif':  # .img and .tif are DEMs
-            grid_mesh = GDALMesh(local_path_file_name)
-            self.terrain_model = grid_mesh.loadSubSection(maxSlope=max_slope, cached=True)
-        else:
+        if extension not in ('.txt', '.img', '.tif', '.png'):
             print(f"File type {extension} not valid for model loading!")
             return
 
-        # load the kernel, cost function
-        kernel_list = self.terrain_model.searchKernel.getKernel().tolist()
-        self.path_finder.set_kernel(kernel_list)
-        self.cost_function = ExplorerCost(self.agent, self.terrain_model, 'Energy', cached=True)
+        # models loaded before (same file, agent and kernel) are reused along with their path finder, only their
+        #   obstacles and endpoints are reset. Terrain models, and their bundles, serve every max slope through
+        #   passability profiles derived from their slopes, except obstacle mazes whose obstacles do not come from
+        #   slopes
+        key = bundle_key(local_path_file_name, max_slope if extension == '.png' else None, self.agent)
+        self.model_key = model_cache_key(key)
+        loaded_model = self.model_cache.get(self.model_key)
+        if loaded_model is None:
+            loaded_model = self.read_model(model_to_load, local_path_file_name, max_slope, key)
+            self.model_cache.put(self.model_key, loaded_model)
+        if extension != '.png':
+            loaded_model.select_profile(max_slope)
+        loaded_model.reset()
+
+        self.terrain_model = loaded_model.terrain_model
+        self.cost_function = loaded_model.cost_function
+        self.path_finder = loaded_model.path_finder
 
         # dispatch loaded event
         if dispatch_completed_event:
@@ -274,10 +299,44 @@ class PathManager(AppComponent):
                 self.terrain_model
             )
 
+    def read_model(self, model_to_load, local_path_file_name, max_slope, key):
+        """reads a model, its cost function and a path finder set up with its kernel"""
+
+        # load the model, from its preprocessed bundle when there is an up to date one
+        costs = None
+        _, extension = path.splitext(local_path_file_name)
+        if extension == '.png':  # .png is obstacle 'maze'
+            terrain_model = load_obstacle_map(local_path_file_name)
+        else:
+            bundle_directory = path.join(PathManager.BUNDLES_DIRECTORY, model_to_load)
+            terrain_model, costs = load_bundled(
+                bundle_directory, key, lambda: self.compile_model(local_path_file_name, max_slope))
+
+        # load the kernel, cost function
+        path_finder = PathFinder()
+        kernel_list = terrain_model.searchKernel.getKernel().tolist()
+        path_finder.set_kernel(kernel_list)
+        cost_function = ExplorerCost(self.agent, terrain_model, 'Energy', cached=True, costs=costs)
+        return LoadedModel(terrain_model, cost_function, path_finder)
+
+    def compile_model(self, local_path_file_name, max_slope):
+        """builds a model and its cost layers from a source file (the slow path that bundles let us skip)"""
+
+        _, extension = path.splitext(local_path_file_name)
+        if extension == '.txt':  # text file is 'legacy'
+            grid_mesh = load_legacy(local_path_file_name)
+        else:  # .img and .tif are DEMs
+            grid_mesh = GDALMesh(local_path_file_name)
+        terrain_model = grid_mesh.loadSubSection(maxSlope=max_slope, cached=True)
+        costs = ExplorerCost(self.agent, terrain_model, 'Energy', cached=True).cached["costs"]
+        return terrain_model, costs
+
     def unload_model(self):
         """Unload (and clear cache) of whatever model is in memory"""
 
         # unload model, cost function
+        self.model_cache.discard(self.model_key)
+        self.model_key = None
         self.terrain_model = None
         self.cost_function = None
 
@@ -330,6 +389,15 @@ class PathManager(AppComponent):
         if dispatch_completed_event:
             EventDispatcher.instance().trigger_event(event_definitions.END_POINT_SET_COMPLETE, self.end_point)
 
+    def memory_report(self):
+        """bytes held by the loaded model, its cost function and the path finder, per component"""
+        report = {'path_finder': dict(self.path_finder.memory_report())}
+        if self.terrain_model is not None:
+            report['terrain_model'] = self.terrain_model.memory_report()
+        if self.cost_function is not None:
+            report['cost_function'] = self.cost_function.memory_report()
+        return report
+
     '''=======================================
     CACHING
     ======================================='''
@@ -341,10 +409,10 @@ class PathManager(AppComponent):
         if not self.terrain_model or not self.cost_function:
             return
 
-        # cache costs, list-ify, and store in pathfinder
-        cached_costs = self.cost_function.create_costs_cache()
-        cost_map = cached_costs["energy"].tolist()
-        self.path_finder.cache_costs(cost_map)
+        # cache costs (computed when the model was loaded), list-ify, and store in pathfinder. They only depend on the
+        #   model, so a path finder reused along with its model already has them
+        if not self.costs_cached:
+            self.cost_function.cache_path_finder_costs(self.path_finder)
 
         # dispatch caching complete event
         if dispatch_completed_event:
@@ -358,9 +426,15 @@ class PathManager(AppComponent):
         if not self.terrain_model:
             return
 
-        # list-ify the obstacles and store in pathfinder
-        obstacle_map = self.terrain_model.obstacles.astype(int).tolist()
+        # list-ify the obstacles (inflated by the clearance radius, if any) and store in pathfinder, along with the
+        #   clearance costs
+        obstacle_map = self.terrain_model.inflated_obstacles().astype(int).tolist()
         self.path_finder.cache_obstacles(obstacle_map)
+        clearance = self.terrain_model.clearance
+        if clearance is not None and clearance.cost_weight:
+            self.path_finder.cache_clearance_costs(clearance.cost().tolist())
+        else:
+            self.path_finder.clear_clearance_costs()
 
         # dispatch caching complete event
         if dispatch_completed_event:
@@ -390,38 +464,27 @@ class PathManager(AppComponent):
         """Mark a circle of specified radius at the specified location as either
         an obstacle (state=true) or passable (state=false)"""
 
-        # clear cached obstacles
-        self.path_finder.clear_obstacles()
-
-        # store original obstacles
-        original_obstacles = self.terrain_model.obstacles.astype(int)
-        if isinstance(original_obstacles, np.ma.core.MaskedArray):
-            original_obstacles = original_obstacles.filled(0)
-
         # convert to appropriate coordinates
         geo_point = self.create_geo_point_from_coordinates(coordinates, coordinate_system)
         elt = self.terrain_model.getMeshElement(geo_point)
 
         # TODO: USE setRadialKeepOutZone?
-        self.terrain_model.set_circular_obstacle(
+        # only the circle's bounding window is edited, the model returns the cells that changed
+        changed_obstacles = self.terrain_model.set_circular_obstacle(
             (elt.x, elt.y),
             radius * self.terrain_model.resolution,
             state
         )
-
-        # cache immediately if specified
-        if cache_immediate:
+        row_col_coordinates_list = changed_obstacles.tolist()
+
+        # patch cached obstacles in place, or cache them all if specified and not cached yet
+        if self.path_finder.obstacles_cached:
+            self.update_cached_obstacles(changed_obstacles, state)
+            if cache_immediate:
+                EventDispatcher.instance().trigger_event(event_definitions.OBSTACLES_CACHING_COMPLETE)
+        elif cache_immediate:
             self.cache_obstacles()
 
-        # get new obstacles
-        new_obstacles = self.terrain_model.obstacles.astype(int)
-        if isinstance(original_obstacles, np.ma.core.MaskedArray):
-            new_obstacles = original_obstacles.filled(0)
-
-        # create list of changed points
-        changed_obstacles = new_obstacles - original_obstacles
-        row_col_coordinates_list = np.array(changed_obstacles.nonzero()).transpose().tolist()
-
         # dispatch obstacle change complete
         EventDispatcher.instance().trigger_event(
             event_definitions.OBSTACLE_CHANGE_COMPLETE,
@@ -433,24 +496,19 @@ class PathManager(AppComponent):
         """Mark coordinates specified in list as either
         an obstacle (state=true) or passable (state=false)"""
 
-        # clear cached obstacles
-        self.path_finder.clear_obstacles()
-
-        # go through all coordinates in list, create geo_point list
-        geo_point_list = []
-        for coordinates in coordinates_list:
-            geo_point = self.create_geo_point_from_coordinates(coordinates, coordinate_system)
-            geo_point_list.append(geo_point)
+        # convert all coordinates to [row, col] at once, and set the obstacles at those points
+        mesh_coordinates = self.create_row_col_from_coordinates(coordinates_list, coordinate_system)
+        changed_obstacles = self.terrain_model.set_obstacle_cells(mesh_coordinates, state)
 
-        # set the obstacles at specified points
-        self.terrain_model.set_obstacle_list(geo_point_list, state)
-
-        # cache immediately if specified
-        if cache_immediate:
+        # patch cached obstacles in place, or cache them all if specified and not cached yet
+        if self.path_finder.obstacles_cached:
+            self.update_cached_obstacles(changed_obstacles, state)
+            if cache_immediate:
+                EventDispatcher.instance().trigger_event(event_definitions.OBSTACLES_CACHING_COMPLETE)
+        elif cache_immediate:
             self.cache_obstacles()
 
-        # convert list to [row, col] coordinates
-        row_col_coordinates_list = [geo_point.to(self.terrain_model.ROW_COL).tolist() for geo_point in geo_point_list]
+        row_col_coordinates_list = mesh_coordinates.tolist()
 
         # dispatch obstacle setting complete
         EventDispatcher.instance().trigger_event(
@@ -459,6 +517,35 @@ class PathManager(AppComponent):
             state
         )
 
+    def update_cached_obstacles(self, changed_cells, state):
+        """patches the path finder's obstacles (and clearance costs) after the model's 'changed_cells' changed"""
+        clearance = self.terrain_model.clearance
+        if clearance is None:
+            self.path_finder.update_obstacles(changed_cells.tolist(), state)
+            return
+        if len(changed_cells) == 0:
+            return
+
+        # with a clearance, everything within its reach of the changed cells may have changed
+        rows, cols = clearance.window(changed_cells)
+        inflated = self.terrain_model.inflated_obstacles((rows, cols))
+        offset = (rows.start, cols.start)
+        self.path_finder.update_obstacles((np.argwhere(inflated) + offset).tolist(), True)
+        self.path_finder.update_obstacles((np.argwhere(np.logical_not(inflated)) + offset).tolist(), False)
+        if self.path_finder.clearance_costs_cached:
+            self.path_finder.update_clearance_costs(rows.start, cols.start, clearance.cost((rows, cols)).tolist())
+
+    def set_clearance(self, radius=0., cost_weight=0., cost_range=0.):
+        """
+        keeps paths 'radius' (in model units) away from obstacles, and makes coming within 'cost_range' of them cost
+        up to 'cost_weight' more, see GridMeshModel.set_clearance
+        """
+        if not self.terrain_model:
+            return
+        self.terrain_model.set_clearance(radius, cost_weight, cost_range)
+        if self.path_finder.obstacles_cached:
+            self.cache_obstacles(False)
+
     def clear_all_obstacles(self, cache_immediate=False):
         """Clears all obstacles / makes all regions of terrain 'passable'"""
 
@@ -501,8 +588,11 @@ class PathManager(AppComponent):
         self.path_finder.reset_progress()
 
         # solve!
-        source = self.terrain_model.getMeshElement(self.start_point).mesh_coordinate  # unscaled (row, column)
-        target = self.terrain_model.getMeshElement(self.end_point).mesh_coordinate  # unscaled (row, column)
+        # unscaled (row, column) of the endpoints, each converted from its own UTM zone (e.g. points given in
+        #   latitude/longitude near a zone boundary may lie in a neighbouring zone)
+        source, target = [tuple(self.terrain_model.mesh_coordinates([point.eastingnorthing()],
+                                                                    point.utm_reference)[0].tolist())
+                          for point in (self.start_point, self.end_point)]
 
         # save path
         source_passable = len(self.terrain_model.isPassable(self.start_point)) > 0
@@ -547,12 +637,8 @@ class PathManager(AppComponent):
         if not self.terrain_model:
             return
 
-        # go through all coordinates in list, create row_col list
-        row_col_coordinates_list = []
-        for coordinates in path_to_set:
-            geo_point = self.create_geo_point_from_coordinates(coordinates, coordinate_system)
-            row_col = geo_point.to(self.terrain_model.ROW_COL)
-            row_col_coordinates_list.append(row_col)
+        # convert all coordinates in list to row_col at once
+        row_col_coordinates_list = self.create_row_col_from_coordinates(path_to_set, coordinate_system).tolist()
 
         # set endpoints
         if len(row_col_coordinates_list) > 0:
@@ -607,12 +693,23 @@ class PathManager(AppComponent):
         """Takes a set of coordinates and a coordinate system, returns geo_point
         in location specified (with respect to terrain_model for UTM and ROW_COL)"""
 
+        geo_type = self.geo_type_from_coordinate_system(coordinate_system)
+        return GeoPoint(geo_type, coordinates[0], coordinates[1])
+
+    def create_row_col_from_coordinates(self, coordinates_list, coordinate_system) -> np.ndarray:
+        """Takes a list (or N x 2 array) of coordinates and a coordinate system, returns
+        the N x 2 array of their [row, col] in terrain_model, all converted in a single call"""
+
+        geo_type = self.geo_type_from_coordinate_system(coordinate_system)
+        return self.terrain_model.mesh_coordinates(coordinates_list, geo_type)
+
+    def geo_type_from_coordinate_system(self, coordinate_system):
+        """Coordinate system name to geo type (with respect to terrain_model for UTM and ROW_COL)"""
+
         if coordinate_system == LatLon.SYSTEM_NAME:
-            geo_point = GeoPoint(LAT_LONG, coordinates[0], coordinates[1])
+            return LAT_LONG
         elif coordinate_system == Cartesian.SYSTEM_NAME:
-            geo_point = GeoPoint(self.terrain_model.ROW_COL, coordinates[0], coordinates[1])
+            return self.terrain_model.ROW_COL
         else:  # assume UTM (coordinate_system == UTM.SYSTEM_NAME)
-            geo_point = GeoPoint(self.terrain_model.UTM_REF, coordinates[0], coordinates[1])
-
-        return geo_point
+            return self.terrain_model.UTM_REF
 
@@ -996,13 +996,8 @@ class PageFindPath(PageBase):
         )
         if in_file is not None:
 
-            # get python 'matrix' (list of lists) of current obstacles
-            current_obstacles = self.path_manager.terrain_model.obstacles.tolist()
-
-            # encode as json
-            json_object = {
-                'obstacles': current_obstacles
-            }
+            # encode current obstacles as json (run lengths, see PathManager.read_obstacles)
+            json_object = PathManager.obstacles_json(self.path_manager.terrain_model.obstacles)
             json_bytes = utils.json_encode(json_object)
 
             # write the json to the file
@@ -19,6 +19,8 @@ class TraversePath:
         coords = geopolygon.to(em.ROW_COL).T[::sampling].T
         y, x = coords
         z = em.dataset.get_datapoint(coords.transpose())
+        if hasattr(em, 'dtype'):
+            z = np.asarray(z, dtype=em.dtype)  # interpolators work in float64, keep the model's precision
         return cls(geopolygon, z, x, y, em, derived)
 
     @classmethod
@@ -97,11 +99,18 @@ class Astronaut(Explorer):  # Astronaut extends Explorer
         super(Astronaut, self).__init__(mass, parameters)
         self.type = 'Astronaut'
         self.maxvelocity = 1.6  # the maximum velocity is 1.6 from Marquez 2008
-        self.minenergy = {  # Aaron's thesis page 50
-            'Earth': lambda m: 1.504 * m + 53.298,
-            'Moon': lambda m: 2.295 * m + 52.936
+        self.minenergy = {  # bound methods rather than lambdas, so that explorers can be pickled
+            'Earth': self.min_energy_earth,
+            'Moon': self.min_energy_moon
         }
 
+    # Aaron's thesis page 50
+    def min_energy_earth(self, m):
+        return 1.504 * m + 53.298
+
+    def min_energy_moon(self, m):
+        return 2.295 * m + 52.936
+
     def velocity(self, slopes):
         if np.logical_or((slopes > 35), (slopes < -35)).any():
             logger.debug("WARNING, there are some slopes steeper than 35 degrees")
@@ -119,7 +128,7 @@ class Astronaut(Explorer):  # Astronaut extends Explorer
         downhill = slopes < 0
         uphill = slopes >= 0
         work_dz = m * g * path_lengths * np.sin(slopes)
-        energy_cost = np.empty(slopes.shape)
+        energy_cost = np.empty(slopes.shape, dtype=work_dz.dtype)
         energy_cost[downhill] = 2.4 * work_dz[downhill] * 0.3 ** (abs(np.degrees(slopes[downhill])) / 7.65)
         energy_cost[uphill] = 3.5 * work_dz[uphill]
 
@@ -183,10 +192,16 @@ class Rover(Explorer):  # Rover also extends explorer
         # activities being performed during the exploration
         self.type = 'Rover'
         self.minenergy = {
-            'Earth': lambda m: 0.0,  # rover on earth is not used
-            'Moon' : lambda m: 0.216 * m + self.P_e / 4.167
+            'Earth': self.min_energy_earth,
+            'Moon' : self.min_energy_moon
         }
 
+    def min_energy_earth(self, m):
+        return 0.0  # rover on earth is not used
+
+    def min_energy_moon(self, m):
+        return 0.216 * m + self.P_e / 4.167
+
     def velocity(self, slope=0):
         return self.speed  # we assume constant velocity for the rover
 
@@ -0,0 +1,67 @@
+import numpy as np
+
+# unsigned types able to hold one bit per kernel element, smallest first
+MASK_DTYPES = [np.uint8, np.uint16, np.uint32, np.uint64]
+
+# bits of every uint8 value, little-endian: UINT8_BITS[value, k] is bit k of value
+UINT8_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1, bitorder='little').astype(bool)
+
+
+def mask_dtype(nbits):
+    """smallest unsigned integer type with at least nbits bits"""
+    for dtype in MASK_DTYPES:
+        if np.dtype(dtype).itemsize * 8 >= nbits:
+            return np.dtype(dtype)
+    raise ValueError('cannot pack %d bits into a single integer' % nbits)
+
+
+def unpack_bits(packed, nbits):
+    """[... x nbits] bool array of the bits of 'packed' (bit k in [..., k])"""
+    packed = np.asarray(packed)
+    if packed.dtype == np.uint8:
+        return UINT8_BITS[packed, :nbits]
+    bits = np.arange(nbits, dtype=packed.dtype)
+    return (packed[..., np.newaxis] >> bits) & 1 == 1
+
+
+def pack_bool(array):
+    """bool array packed 8 cells per byte, see unpack_bool"""
+    return np.packbits(np.asarray(array, dtype=bool), axis=None)
+
+
+def unpack_bool(packed, shape):
+    """bool array of 'shape' from the output of pack_bool"""
+    return np.unpackbits(packed, count=int(np.prod(shape))).reshape(shape).view(bool)
+
+
+def shifted_slices(offset, shape):
+    """
+    pair of slices (source, destination) such that array[destination] is array[source] moved by 'offset' (in
+    (row, col)), both restricted to where the shifted cell is still inside 'shape'
+    """
+    source, destination = [], []
+    for delta, size in zip(offset, shape):
+        delta = int(delta)
+        source.append(slice(max(0, -delta), min(size, size - delta)))
+        destination.append(slice(max(0, delta), min(size, size + delta)))
+    return tuple(source), tuple(destination)
+
+
+def rle_encode(array):
+    """
+    lengths of the alternating runs of False and True cells of a bool array (row-major), starting with False (so
+    the first run is empty if the first cell is set). See rle_decode
+    """
+    flat = np.asarray(array, dtype=bool).ravel()
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    runs = np.diff(np.concatenate([[0], changes, [len(flat)]]))
+    if len(flat) and flat[0]:
+        runs = np.concatenate([[0], runs])
+    return runs
+
+
+def rle_decode(runs, shape):
+    """bool array of 'shape' from the output of rle_encode"""
+    runs = np.asarray(runs, dtype=int)
+    values = np.arange(len(runs)) % 2 == 1
+    return np.repeat(values, runs).reshape(shape)
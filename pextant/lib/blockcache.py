@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from osgeo import gdal_array
+
+# default memory budget of a block cache, in bytes
+DEFAULT_CACHE_BYTES = 256 * 2**20
+
+
+class BlockCache(object):
+    """
+    Reads a gdal raster band one native block at a time, on demand, keeping the most recently used blocks in
+    memory up to a budget (in bytes). Values keep the band's native dtype (float32, int16...).
+
+    A gdal band must not be read from several threads at once, so reads go through 'lock' (which direct reads of
+    the band should take too), and the cache can be shared with background prefetching.
+    """
+    def __init__(self, band, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.band = band
+        self.cache_bytes = cache_bytes
+        self.x_size, self.y_size = band.XSize, band.YSize
+        self.block_x, self.block_y = band.GetBlockSize()
+        if self.block_y == 1:
+            # striped files have one row blocks, read a few strips at a time instead
+            self.block_y = min(max(1, 2**16 // self.block_x), self.y_size)
+        self.block_cols = -(-self.x_size // self.block_x)  # ceiling division
+        self.dtype = np.dtype(gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType))
+        self.blocks = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.RLock()
+
+    def block(self, block_row, block_col):
+        with self.lock:
+            return self._block(block_row, block_col)
+
+    def _block(self, block_row, block_col):
+        key = (block_row, block_col)
+        block = self.blocks.get(key)
+        if block is not None:
+            self.blocks.move_to_end(key)
+            return block
+
+        x_offset, y_offset = block_col * self.block_x, block_row * self.block_y
+        x_size = min(self.block_x, self.x_size - x_offset)
+        y_size = min(self.block_y, self.y_size - y_offset)
+        # see GDALDataset.subsection for why offsets and sizes are passed as floats
+        block = self.band.ReadAsArray(float(x_offset), float(y_offset), float(x_size), float(y_size), x_size, y_size)
+        self.blocks[key] = block
+        self.nbytes += block.nbytes
+
+        # evict least recently used blocks, but always keep the one just read
+        while self.nbytes > self.cache_bytes and len(self.blocks) > 1:
+            _, evicted = self.blocks.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return block
+
+    def read_points(self, rows, cols):
+        """values at integer (row, col) positions, faulting in only the blocks they fall in"""
+        rows, cols = np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)
+        values = np.empty(rows.shape, dtype=self.dtype)
+        block_rows, block_cols = rows // self.block_y, cols // self.block_x
+        keys = block_rows * self.block_cols + block_cols
+        for key in np.unique(keys):
+            selection = keys == key
+            block_row, block_col = divmod(int(key), self.block_cols)
+            block = self.block(block_row, block_col)
+            values[selection] = block[rows[selection] - block_row * self.block_y,
+                                      cols[selection] - block_col * self.block_x]
+        return values
+
+    def read_window(self, x_offset, y_offset, x_size, y_size):
+        """[y_size x x_size] window of the band, assembled from its blocks"""
+        window = np.empty((y_size, x_size), dtype=self.dtype)
+        for block_row in range(y_offset // self.block_y, (y_offset + y_size - 1) // self.block_y + 1):
+            for block_col in range(x_offset // self.block_x, (x_offset + x_size - 1) // self.block_x + 1):
+                block = self.block(block_row, block_col)
+                block_y0, block_x0 = block_row * self.block_y, block_col * self.block_x
+                # overlap of the block with the window, in raster coordinates
+                y0, y1 = max(y_offset, block_y0), min(y_offset + y_size, block_y0 + block.shape[0])
+                x0, x1 = max(x_offset, block_x0), min(x_offset + x_size, block_x0 + block.shape[1])
+                window[y0 - y_offset:y1 - y_offset, x0 - x_offset:x1 - x_offset] = \
+                    block[y0 - block_y0:y1 - block_y0, x0 - block_x0:x1 - block_x0]
+        return window
+
+    def clear(self):
+        with self.lock:
+            self.blocks = OrderedDict()
+            self.nbytes = 0
@@ -1,21 +1,34 @@
+from functools import lru_cache
 import pyproj
 import numpy as np
 from shapely.geometry import Point, LineString
 import shapely.coords
 
 
+def proj_key(proj_param):
+    """hashable, order independent key of projection parameters (all of them share the WGS84 datum)"""
+    return tuple(sorted(dict(proj_param, datum="WGS84").items()))
+
+
+@lru_cache(maxsize=None)
+def get_transformer(from_key, to_key):
+    """
+    pyproj transformer between two projections given by their proj_key, built once and reused. Coordinates are
+    always (x, y) ordered, i.e. (longitude, latitude) and (easting, northing)
+    """
+    return pyproj.Transformer.from_proj(pyproj.Proj(**dict(from_key)), pyproj.Proj(**dict(to_key)), always_xy=True)
+
+
 class GeoType(object):
     def __init__(self, name, values, proj_param, proj_transform_order):
         self.name = name
         self.values = values
         self.proj_param = proj_param
+        self.proj_key = proj_key(proj_param)
         self.proj_transform_order = [values.index(parameter) for parameter in proj_transform_order]
 
     def get_proj(self):
-        # add additional parameters here
-        proj_param = self.proj_param
-        proj_param["datum"] = "WGS84"
-        return pyproj.Proj(**proj_param)
+        return pyproj.Proj(**dict(self.proj_key))
 
     # baseline is identity
     def to_utm(self, geo_point):
@@ -23,12 +36,12 @@ class GeoType(object):
 
     def transform(self, geo_point, to_geo_type, conversion_type=None):
         args = self.getargs(geo_point)
-        if self.proj_param == to_geo_type.proj_param:
+        if self.proj_key == to_geo_type.proj_key:
+            # same projection (e.g. Cartesian/XY frames and the UTM zone they lie in): getargs/post_process already
+            #   are the affine transforms to and from it
             out = args
         else:
-            p_from = self.get_proj()
-            p_to = to_geo_type.get_proj()
-            out = pyproj.transform(p_from, p_to, args[0], args[1])
+            out = get_transformer(self.proj_key, to_geo_type.proj_key).transform(args[0], args[1])
         array_out = np.array(out)  # just in case its not a numpy already, and will simplify calcs later
         post_array = to_geo_type.post_process(array_out)
         if conversion_type is not None:
@@ -240,6 +253,18 @@ class GeoObject(object):
         return self.easting, self.northing
 
 
+def transform_points(coordinates, from_geo_type, to_geo_type):
+    """
+    converts an [N x 2] array of coordinates, given in the order of from_geo_type's values (e.g. latitude, longitude
+    for LAT_LONG), to an [N x 2] array in to_geo_type, with a single projection call for all of them and no per point
+    objects
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    if len(coordinates) == 0:
+        return np.empty((0, 2))
+    values = dict(zip(from_geo_type.values, coordinates.transpose()))
+    return np.asarray(from_geo_type.transform(values, to_geo_type)).reshape(2, -1).transpose()
+
 class GeoPoint(GeoObject, Point):
     def __init__(self, geo_type, x, y):
         GeoObject.__init__(self, geo_type, x, y)
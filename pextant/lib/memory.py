@@ -0,0 +1,34 @@
+"""
+Memory accounting: memory_report() of models, cost functions and path finders give the bytes held by each of
+their components, as {component: bytes} dicts (nested for objects made of several parts).
+
+The memory budget bounds what a model and its cost layers may take together. Cost functions that would exceed it
+degrade instead (see ExplorerCost.plan_costs). None means no budget.
+"""
+import numpy as np
+
+_memory_budget = None
+
+
+def get_memory_budget():
+    return _memory_budget
+
+
+def set_memory_budget(budget):
+    """default budget, in bytes (or None), of cost functions created from now on"""
+    global _memory_budget
+    _memory_budget = budget
+
+
+def nbytes(value):
+    """bytes held by an array-like (numpy arrays, tiled layers, lists...), 0 for None"""
+    if value is None:
+        return 0
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return int(np.asarray(value).nbytes)
+
+
+def report_total(report):
+    """total bytes of a (possibly nested) memory report"""
+    return sum(report_total(value) if isinstance(value, dict) else value for value in report.values())
@@ -0,0 +1,95 @@
+"""
+Scanline rasterization of polygons (with holes, several at once) into boolean grids, vectorized over edges and spans:
+the crossings of every edge with every cell row are computed at once, paired up along each row (even-odd rule) and
+filled through a running sum, without any per cell loop.
+"""
+import numpy as np
+
+
+def polygons_window(polygons, shape):
+    """(rows, cols) slices of the cells of 'shape' covered by the bounding box of 'polygons', None if none are"""
+    vertices = np.concatenate([ring for polygon in polygons for ring in polygon if len(ring)] or [np.empty((0, 2))])
+    if len(vertices) == 0:
+        return None
+    (row_min, col_min), (row_max, col_max) = vertices.min(0), vertices.max(0)
+    rows = slice(max(int(np.floor(row_min)), 0), min(int(np.ceil(row_max)), shape[0]))
+    cols = slice(max(int(np.floor(col_min)), 0), min(int(np.ceil(col_max)), shape[1]))
+    if rows.start >= rows.stop or cols.start >= cols.stop:
+        return None
+    return rows, cols
+
+
+def rasterize_polygons(polygons, shape, window=None):
+    """
+    bool mask of the cells whose centres lie inside any of 'polygons'
+
+    :param polygons: list of polygons, each a list of rings (the exterior, then its holes) given as [N x 2] arrays
+        of (row, col) vertices, in cell units: cell (r, c) spans [r, r + 1) x [c, c + 1)
+    :param shape: (rows, cols) of the grid
+    :param window: (rows, cols) slices of the grid to rasterize (see polygons_window), defaults to all of it
+    :return: bool [rows x cols] mask of the window
+    """
+    if window is None:
+        window = (slice(0, shape[0]), slice(0, shape[1]))
+    rows, cols = window
+    height, width = rows.stop - rows.start, cols.stop - cols.start
+
+    # +1 where a span of inside cells starts, -1 past its end
+    spans = np.zeros((height, width + 1), dtype=np.int32)
+    for polygon in polygons:
+        crossing_rows, crossing_cols = _crossings(polygon, rows)
+        if len(crossing_rows) == 0:
+            continue
+
+        # along each row, crossings pair up into spans (a closed ring crosses every row an even number of times)
+        order = np.lexsort((crossing_cols, crossing_rows))
+        span_rows = crossing_rows[order][0::2] - rows.start
+        starts = np.ceil(crossing_cols[order][0::2] - 0.5).astype(int)
+        stops = np.ceil(crossing_cols[order][1::2] - 0.5).astype(int)
+        starts = np.clip(starts, cols.start, cols.stop) - cols.start
+        stops = np.clip(stops, cols.start, cols.stop) - cols.start
+        filled = starts < stops
+        np.add.at(spans, (span_rows[filled], starts[filled]), 1)
+        np.add.at(spans, (span_rows[filled], stops[filled]), -1)
+    return np.cumsum(spans, axis=1)[:, :width] > 0
+
+
+def _crossings(polygon, rows):
+    # (row, col) of the crossings of every edge of the polygon's rings with the centre lines (r + 0.5) of 'rows'
+    rings = [np.asarray(ring, dtype=float).reshape(-1, 2) for ring in polygon]
+    start = np.concatenate([ring for ring in rings if len(ring)] or [np.empty((0, 2))])
+    end = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings if len(ring)] or [np.empty((0, 2))])
+    (row0, col0), (row1, col1) = start.transpose(), end.transpose()
+
+    # rows r with low <= r + 0.5 < high: vertices on a centre line count for one of their two edges only
+    first = np.clip(np.ceil(np.minimum(row0, row1) - 0.5).astype(int), rows.start, rows.stop)
+    last = np.clip(np.ceil(np.maximum(row0, row1) - 0.5).astype(int), rows.start, rows.stop)
+    counts = np.maximum(last - first, 0)
+    edges = np.repeat(np.arange(len(counts)), counts)
+    if len(edges) == 0:
+        return np.empty(0, dtype=int), np.empty(0)
+    crossing_rows = first[edges] + np.arange(len(edges)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # (edges crossing a row are never horizontal)
+    fraction = (crossing_rows + 0.5 - row0[edges]) / (row1[edges] - row0[edges])
+    crossing_cols = col0[edges] + fraction * (col1[edges] - col0[edges])
+    return crossing_rows, crossing_cols
+
+
+def geojson_polygons(geojson):
+    """
+    polygons of a GeoJSON object (geometry, Feature or FeatureCollection), each as a list of rings of
+    [N x 2] (longitude, latitude) arrays, exterior first. Other geometries (points, lines) are skipped
+    """
+    geometry_type = geojson['type']
+    if geometry_type == 'FeatureCollection':
+        return [polygon for feature in geojson['features'] for polygon in geojson_polygons(feature)]
+    if geometry_type == 'Feature':
+        return geojson_polygons(geojson['geometry']) if geojson.get('geometry') else []
+    if geometry_type == 'GeometryCollection':
+        return [polygon for geometry in geojson['geometries'] for polygon in geojson_polygons(geometry)]
+    if geometry_type == 'Polygon':
+        return [[np.asarray(ring, dtype=float)[:, :2] for ring in geojson['coordinates']]]
+    if geometry_type == 'MultiPolygon':
+        return [[np.asarray(ring, dtype=float)[:, :2] for ring in polygon] for polygon in geojson['coordinates']]
+    return []
@@ -0,0 +1,66 @@
+import os
+import numpy as np
+from multiprocessing import shared_memory
+from uuid import uuid4
+
+
+class SharedArrays(object):
+    """
+    Owns a set of named shared-memory segments holding numpy arrays, so that worker processes can attach
+    to large arrays (elevations, obstacles, cost layers...) without them being pickled per task.
+
+    If a directory is given, arrays are instead written to memory-mapped .npy files in that directory
+    (useful when /dev/shm is small, or to let the OS page the arrays out).
+
+    The owning process should call close() (or use it as a context manager) once all workers are done,
+    which unlinks every segment/file.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.segments = []
+        self.files = []
+
+    def share(self, array):
+        """copies array into a new shared-memory segment (or file), returns a small picklable handle to it"""
+        array = np.asarray(array)
+        if self.directory is not None:
+            file_path = os.path.join(self.directory, 'pextant_%s.npy' % uuid4().hex)
+            shared_array = np.lib.format.open_memmap(file_path, mode='w+', dtype=array.dtype, shape=array.shape)
+            shared_array[...] = array
+            shared_array.flush()
+            self.files.append(file_path)
+            return {'path': file_path}
+
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared_array = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)
+        shared_array[...] = array
+        self.segments.append(segment)
+        return {'name': segment.name, 'shape': array.shape, 'dtype': array.dtype.str}
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+        for file_path in self.files:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        self.segments = []
+        self.files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def attach_array(handle, segments):
+    """
+    attaches to an array created by SharedArrays.share (zero-copy). The opened segment is appended to
+    'segments', which the caller needs to keep alive for as long as the array is in use
+    """
+    if 'path' in handle:
+        return np.load(handle['path'], mmap_mode='r+')
+    segment = shared_memory.SharedMemory(name=handle['name'])
+    segments.append(segment)
+    return np.ndarray(handle['shape'], dtype=np.dtype(handle['dtype']), buffer=segment.buf)
@@ -1,12 +1,17 @@
 import math
+from itertools import count
 import numpy as np
 import numpy.matlib as matlib
 from pextant.lib.geoshapely import GeoPoint, GeoPolygon, GeoEnvelope, Cartesian, XY
 from scipy.interpolate import NearestNDInterpolator, RegularGridInterpolator
+from scipy.ndimage import uniform_filter
 from scipy.ndimage.interpolation import zoom
 from skimage.draw import circle
 from pextant.explorers import Astronaut
 
+# ids of obstacle layouts: every model (or overlay) gets a new one whenever its obstacles change
+obstacle_versions = count()
+
 class GeoMesh(object):
 
     def __init__(self, nw_geo_point, dataset, planet='Earth',
@@ -73,14 +78,34 @@ class InterpolatingDataset(Dataset):
         y_axis = np.arange(self.y_size)
         return RegularGridInterpolator((y_axis, x_axis), self.data_container)
 
-    def downsample(self, resolution):
-        return InterpolatingDataset.from_np(zoom(self.data_container, self.resolution/resolution), resolution=resolution)
+    def downsample(self, resolution, resampling='cubic'):
+        return InterpolatingDataset.from_np(NpDataset(self.data_container, self.resolution)
+                                            .downsample(resolution, resampling).data_container,
+                                            resolution=resolution)
 
     # interpolation should be defined by children classes
     def get_datapoint(self, localpoint):
         return self.interpolator(localpoint)
 
 
+# spline order scipy's zoom uses for each resampling kernel
+ZOOM_ORDERS = {'nearest': 0, 'bilinear': 1, 'cubic': 3}
+
+
+def block_average(array, ratio):
+    """
+    downsamples 'array' by 'ratio' (coarse cell size in fine cells) with the mean of each coarse cell. Integer
+    ratios average exact blocks; other ratios are approximated with a box filter followed by a linear zoom
+    """
+    block = int(round(ratio))
+    if abs(ratio - block) < 1e-6:
+        rows, cols = array.shape[0] // block, array.shape[1] // block
+        blocks = np.asarray(array)[:rows * block, :cols * block].reshape(rows, block, cols, block)
+        return blocks.mean(axis=(1, 3))
+    smoothed = uniform_filter(np.asarray(array, dtype=float), size=max(int(np.ceil(ratio)), 1))
+    return zoom(smoothed, 1 / ratio, order=1)
+
+
 class NpDataset(np.ndarray):
     # Wraps around Interpolating Dataset aswell
     def __new__(cls, input_array, resolution=1.0):
@@ -96,20 +121,25 @@ class NpDataset(np.ndarray):
         # Finally, we must return the newly created object:
         return obj
 
-    def downsample(self, resolution):
+    def downsample(self, resolution, resampling='cubic'):
+        """
+        :param resampling: 'average' (mean over each coarse cell), or the order of the spline zoom interpolates
+            with: 'nearest', 'bilinear' or 'cubic'
+        """
         factor = self.resolution / float(resolution)
-        downsampled =zoom(self.data_container, factor)
+        if resampling == 'average':
+            downsampled = block_average(self.data_container, 1 / factor)
+        else:
+            downsampled = zoom(self.data_container, factor, order=ZOOM_ORDERS[resampling])
         return NpDataset(downsampled, resolution)
 
-    def subsection(self, xoff, yoff, xsize, ysize, resolution=None):
-        res = 1.0 if resolution == None else resolution/self.resolution
-        #print(xoff, yoff, xsize, ysize, res)
-        x2, y2 = int((xoff + xsize) / res), int((yoff + ysize) / res)
-        xoff, yoff = int(xoff/res), int(yoff/res)
-        #print(xoff,yoff,x2,y2)
-        npdataset = self.downsample(resolution) if resolution != None else self
-        sub = npdataset[yoff:y2, xoff:x2]
-        return sub
+    def subsection(self, xoff, yoff, xsize, ysize, resolution=None, resampling='cubic', dtype=None):
+        xoff, yoff, xsize, ysize = int(xoff), int(yoff), int(xsize), int(ysize)
+        sub = self[yoff:yoff + ysize, xoff:xoff + xsize]
+        if dtype is not None:
+            sub = sub.astype(dtype, copy=False)
+        # only the window gets resampled, not the whole array
+        return sub.downsample(resolution, resampling) if resolution != None else sub
 
     def interpolator(self):
         x_axis = np.arange(self.x_size)
@@ -152,9 +182,18 @@ class EnvironmentalModel(GeoMesh):
     """
     def __init__(self, nw_geo_point, dataset, planet='Earth',
                  parent_mesh=None, xoff=0, yoff=0, maxSlope=35, kernel_size=3, kernel_type="square",
-                 cached=False):
+                 cached=False, dtype=np.float64, slope_operator='gradient'):
+        """
+        :param dtype: floating point type of elevations, slopes and everything derived from them (e.g. float32 to
+            halve memory on large maps)
+        :param slope_operator: how slopes are computed from elevations, see pextant.mesh.slope.SLOPE_OPERATORS
+        """
         super(EnvironmentalModel, self).__init__(nw_geo_point, dataset, planet,
                  parent_mesh, xoff, yoff)
+        self.dtype = np.dtype(dtype)
+        self.slope_operator = slope_operator
+        if isinstance(self.data, np.ndarray) and self.data.dtype != self.dtype:
+            self.data = self.data.astype(self.dtype)
         self.maxSlope = maxSlope
         self.cached = cached
         self.kernel_type = kernel_type
@@ -163,6 +202,8 @@ class EnvironmentalModel(GeoMesh):
         self.obstacles = []  # obstacles is a list with boolean values for non-passable squares
         self.passable = []
         self.special_obstacles = set()  # a list of coordinates of obstacles are not identified by the slope
+        self.clearance = None  # see GridMeshModel.set_clearance
+        self.version = next(obstacle_versions)
         self.setSlopes()
         #TODO: make max slope a once only argument (right now it gets passed along several times)
         self.maxSlopeObstacle(self.maxSlope)
@@ -171,47 +212,123 @@ class EnvironmentalModel(GeoMesh):
         if maxslope is None:
             obstacles = self.obstacles
         else:
-            obstacles = self.slopes > maxslope
+            # (nan slopes, next to missing data, are obstacles)
+            obstacles = np.logical_not(self.slopes <= maxslope)
         return np.ma.masked_array(np.ones_like(self.data), np.logical_not(obstacles))
 
     def set_obstacle_map(self, obstacle_map, state=True):
-
-        self.obstacles[obstacle_map] = state
-        self.passable = np.logical_not(self.obstacles)
+        """
+        marks the cells set in 'obstacle_map' as obstacles (state=True) or passable (state=False). Only the bounding
+        window of those cells is touched.
+
+        :return: [N x 2] array of the (row, col) of cells that actually changed
+        """
+        rows = np.flatnonzero(np.any(obstacle_map, axis=1))
+        cols = np.flatnonzero(np.any(obstacle_map, axis=0))
+        if len(rows) == 0:
+            return np.empty((0, 2), dtype=int)
+        window = (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+        return self.set_obstacle_window(window, np.asarray(obstacle_map)[window], state)
+
+    def set_obstacle_window(self, window, window_map, state=True):
+        """
+        set_obstacle_map restricted to 'window', a (rows, cols) pair of slices: 'window_map' covers the window only.
+        obstacles, passable and the cached neighbour masks are updated in place.
+
+        :return: [N x 2] array of the (row, col) of cells that actually changed
+        """
+        changed = np.logical_and(window_map, self.obstacles[window] != state)
+        changed_cells = np.argwhere(changed) + (window[0].start, window[1].start)
+        # written by index so that it works on overlays' tiled layers too
+        rows, cols = changed_cells.transpose()
+        self.obstacles[rows, cols] = state
+        self.passable[rows, cols] = not state
+        self._obstacles_changed(changed_cells)
+        return changed_cells
+
+    def _obstacles_changed(self, changed_cells):
+        if len(changed_cells) > 0:
+            self.version = next(obstacle_versions)
+            # cached neighbour masks only need recomputing around the bounding window of the changed cells, or of
+            #   the cells whose clearance changed
+            (row_min, col_min), (row_max, col_max) = changed_cells.min(0), changed_cells.max(0)
+            rows, cols = slice(row_min, row_max + 1), slice(col_min, col_max + 1)
+            if self.clearance is not None:
+                rows, cols = self.clearance.update(self.obstacles, changed_cells)
+            if self.cached:
+                self._update_neighbours(rows, cols)
 
     def set_circular_obstacle(self, center, radius, state=True):
-
-        euclidean_dist_sq = self.get_euclidean_distance_sq_to_point(center)
-        added_mask = euclidean_dist_sq < radius * radius
-        self.set_obstacle_map(added_mask, state)
+        """
+        :param center: (x, y) of the centre, in the same units as radius (see get_xy_distance_grids_to_point)
+        :return: [N x 2] array of the (row, col) of cells that actually changed
+        """
+        # only the cells of the circle's bounding window are looked at
+        r = self.resolution
+        center_x, center_y = center
+        row_min, row_max = int(np.floor((center_y - radius) / r)), int(np.ceil((center_y + radius) / r))
+        col_min, col_max = int(np.floor((center_x - radius) / r)), int(np.ceil((center_x + radius) / r))
+        rows = slice(max(row_min, 0), min(row_max + 1, self.y_size))
+        cols = slice(max(col_min, 0), min(col_max + 1, self.x_size))
+        if rows.start >= rows.stop or cols.start >= cols.stop:
+            return np.empty((0, 2), dtype=int)
+
+        y = r * np.arange(rows.start, rows.stop, dtype=self.dtype)[:, np.newaxis]
+        x = r * np.arange(cols.start, cols.stop, dtype=self.dtype)[np.newaxis, :]
+        euclidean_dist_sq = np.square(x - self.dtype.type(center_x)) + np.square(y - self.dtype.type(center_y))
+        return self.set_obstacle_window((rows, cols), euclidean_dist_sq < radius * radius, state)
 
     def set_obstacle_list(self, geo_point_list, state=True):
-
-        obstacle_map = np.full((self.y_size, self.x_size), False, dtype=bool)
-
-        # go through all obstacle coordinate
-        for geo_point in geo_point_list:
-
-            # convert to appropriate coordinates
-            elt = self.getMeshElement(geo_point)
-            mesh_coordinate = elt.mesh_coordinate
-            coordinate_row = mesh_coordinate[0]
-            coordinate_col = mesh_coordinate[1]
-            obstacle_map[coordinate_row, coordinate_col] = True
-
-        self.set_obstacle_map(obstacle_map, state)
+        """
+        :return: [N x 2] array of the (row, col) of cells that actually changed
+        """
+        if len(geo_point_list) == 0:
+            return np.empty((0, 2), dtype=int)
+
+        # geo points already hold their UTM coordinates, in their own zones: convert the points of each zone at once
+        zones = {}
+        for i, geo_point in enumerate(geo_point_list):
+            zones.setdefault(geo_point.utm_reference.proj_key, []).append(i)
+        mesh_coordinates = np.empty((len(geo_point_list), 2), dtype=int)
+        for indices in zones.values():
+            utm_coordinates = [geo_point_list[i].eastingnorthing() for i in indices]
+            mesh_coordinates[indices] = np.reshape(
+                self.mesh_coordinates(utm_coordinates, geo_point_list[indices[0]].utm_reference), (-1, 2))
+        return self.set_obstacle_cells(mesh_coordinates, state)
+
+    def set_obstacle_cells(self, mesh_coordinates, state=True):
+        """
+        marks an [N x 2] array of (row, col) cells as obstacles (state=True) or passable (state=False), with a
+        single fancy-index assignment
+
+        :return: [N x 2] array of the (row, col) of cells that actually changed
+        """
+        mesh_coordinates = np.asarray(mesh_coordinates, dtype=int).reshape(-1, 2)
+        out_of_bounds = np.logical_or(mesh_coordinates < 0, mesh_coordinates >= self.shape).any(1)
+        if out_of_bounds.any():
+            row, col = mesh_coordinates[out_of_bounds][0]
+            raise IndexError("The location (%s, %s) is out of bounds" % (row, col))
+
+        rows, cols = mesh_coordinates.transpose()
+        changed_cells = np.unique(mesh_coordinates[self.obstacles[rows, cols] != state], axis=0)
+        self.obstacles[rows, cols] = state
+        self.passable[rows, cols] = not state
+        self._obstacles_changed(changed_cells)
+        return changed_cells
 
     def get_xy_distance_grids_to_point(self, point):
 
         point_x = point[0]
         point_y = point[1]
 
-        # value of cell in grid 'x' is x-coord, value of cell in grid 'y' is y-coord
+        # value of cell in grid 'x' is x-coord, value of cell in grid 'y' is y-coord (as a column and a row, which
+        #   broadcast to the whole grid)
         r = self.resolution
-        y, x = r*np.mgrid[0:self.y_size, 0:self.x_size]
+        y = r * np.arange(self.y_size, dtype=self.dtype)[:, np.newaxis]
+        x = r * np.arange(self.x_size, dtype=self.dtype)[np.newaxis, :]
 
         # x and y *offsets from goal* of every point in grid
-        return np.abs(y - point_y), np.abs(x - point_x)
+        return np.abs(y - self.dtype.type(point_y)), np.abs(x - self.dtype.type(point_x))
 
     def get_euclidean_distance_sq_to_point(self, point):
 
@@ -238,10 +355,12 @@ class EnvironmentalModel(GeoMesh):
 
         # total distance to goal if you can only travel left-right, up-down, or along diagonals
         #   Patel 2010. See page 49 of Aaron's thesis
-        return (np.sqrt(2)-2) * h_diagonal + h_straight
+        return self.dtype.type(np.sqrt(2)-2) * h_diagonal + h_straight
 
     def convert_coordinates(self, geo_coordinates): pass
 
+    def mesh_coordinates(self, coordinates, geo_type): pass
+
     def setSlopes(self): pass
 
     def getSlope(self, mesh_coordinates):
@@ -284,6 +403,8 @@ class EnvironmentalModel(GeoMesh):
 
     def setRadialKeepOutZone(self, center, radius): pass
 
+    def _update_neighbours(self, rows, cols): pass
+
     @coordinate_transform
     def in_bounds(self, geo_coordinates):
         return self._inBounds(geo_coordinates)
@@ -0,0 +1,166 @@
+"""
+Preprocessed terrain bundles: a directory holding everything a GridMeshModel (and optionally its explorer cost
+layers) needs, so that it can be memory-mapped back instead of being recomputed from the source DEM.
+
+Layout:
+    header.json     format version, invalidation key, model parameters and the name/dtype/shape of every array
+    <name>.bin      raw little-endian array data, one file per array
+
+Arrays are mapped copy-on-write, so processes loading the same bundle share its pages, and edits to a loaded
+model (e.g. new obstacles) never touch the files.
+"""
+import json
+import os
+import shutil
+from uuid import uuid4
+import numpy as np
+from pextant.EnvironmentalModel import GridMeshModel
+
+BUNDLE_VERSION = 2  # 2: bit-packed neighbour masks
+HEADER_FILE = 'header.json'
+# default parent directory of bundles: a per-user cache, since the package itself may be installed read-only
+DEFAULT_BUNDLES_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'pextant', 'bundles')
+
+
+def explorer_key(explorer):
+    """the explorer parameters cost layers depend on (its class and scalar attributes)"""
+    if explorer is None:
+        return None
+    key = dict((name, value) for name, value in vars(explorer).items()
+               if isinstance(value, (bool, int, float, str)))
+    key['class'] = type(explorer).__name__
+    return key
+
+
+def bundle_key(source_path, max_slope, explorer=None, kernel_size=3, kernel_type='square', **options):
+    """
+    invalidation key of a bundle: it is stale as soon as the source file, the max slope, the kernel, the explorer
+    parameters or any other loading option (e.g. desired_res) change. Bundles of models that serve any max slope
+    through passability profiles (see GridMeshModel.select_profile) are keyed with max_slope=None
+    """
+    source_stat = os.stat(source_path)
+    return {
+        'source': os.path.abspath(source_path),
+        'source_size': source_stat.st_size,
+        'source_mtime_ns': source_stat.st_mtime_ns,
+        'max_slope': max_slope,
+        'kernel_size': kernel_size,
+        'kernel_type': kernel_type,
+        'explorer': explorer_key(explorer),
+        'options': options,
+    }
+
+
+def _to_json(value):
+    # numpy scalars (offsets, resolutions...) found in model parameters
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('%s is not JSON serializable' % type(value).__name__)
+
+
+def _normalized(key):
+    # compare keys the way they come back from json (tuples become lists...)
+    return json.loads(json.dumps(key, default=_to_json))
+
+
+def write_bundle(directory, env_model, key=None, costs=None):
+    """
+    writes env_model (and cost layers, output of ExplorerCost.create_costs_cache) to a bundle directory,
+    replacing any existing bundle there
+
+    :type env_model: GridMeshModel
+    """
+    arrays = dict(env_model._arrays())
+    if costs is not None:
+        arrays.update(('costs_' + name, layer) for name, layer in costs.items())
+
+    # write next to the final location, then swap it in, so readers never see a partial bundle
+    parent_directory = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent_directory, exist_ok=True)
+    temp_directory = os.path.join(parent_directory, '.%s.%s' % (os.path.basename(directory), uuid4().hex))
+    os.makedirs(temp_directory)
+
+    try:
+        array_entries = {}
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            dtype = array.dtype.newbyteorder('<')
+            file_name = '%s.bin' % name
+            np.ascontiguousarray(array, dtype=dtype).tofile(os.path.join(temp_directory, file_name))
+            array_entries[name] = {'file': file_name, 'dtype': dtype.str, 'shape': list(array.shape)}
+
+        header = {
+            'version': BUNDLE_VERSION,
+            'key': key,
+            'parameters': env_model._parameters(),
+            'arrays': array_entries,
+        }
+        with open(os.path.join(temp_directory, HEADER_FILE), 'w') as header_file:
+            json.dump(header, header_file, indent=2, default=_to_json)
+
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.rename(temp_directory, directory)
+    except BaseException:
+        # e.g. a full disk: don't leave a partial bundle behind
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        raise
+
+
+def read_header(directory):
+    header_path = os.path.join(directory, HEADER_FILE)
+    if not os.path.exists(header_path):
+        return None
+    with open(header_path) as header_file:
+        return json.load(header_file)
+
+
+def is_stale(directory, key=None):
+    header = read_header(directory)
+    return header is None or header['version'] != BUNDLE_VERSION or \
+        (key is not None and header['key'] != _normalized(key))
+
+
+def read_bundle(directory, key=None):
+    """
+    memory-maps a bundle back into a model, without recomputing anything
+
+    :param key: if given, the bundle is only used if it was written with the same key
+    :return: (GridMeshModel, cost layers or None), or None if there is no up to date bundle
+    """
+    if is_stale(directory, key):
+        return None
+    header = read_header(directory)
+
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        shape = tuple(entry['shape'])
+        if np.prod(shape) == 0:
+            arrays[name] = np.empty(shape, dtype=np.dtype(entry['dtype']))
+        else:
+            arrays[name] = np.memmap(os.path.join(directory, entry['file']), dtype=np.dtype(entry['dtype']),
+                                     mode='c', shape=shape)
+
+    costs = dict((name[len('costs_'):], arrays.pop(name)) for name in list(arrays) if name.startswith('costs_'))
+    env_model = GridMeshModel._from_arrays(arrays, header['parameters'])
+    return env_model, costs or None
+
+
+def load_bundled(directory, key, compile_model):
+    """
+    returns (model, costs) from the bundle in 'directory' if it is up to date; otherwise calls
+    compile_model() -> (model, costs or None), writes its result as the new bundle and returns it. A bundle that
+    can't be read or written (e.g. a read-only directory) is skipped, and the compiled model is used as it is
+    """
+    try:
+        bundle = read_bundle(directory, key)
+    except (OSError, ValueError):  # unreadable or corrupt header
+        bundle = None
+    if bundle is not None:
+        return bundle
+    env_model, costs = compile_model()
+    try:
+        write_bundle(directory, env_model, key, costs)
+    except OSError:
+        pass  # compiled again next time
+    return env_model, costs
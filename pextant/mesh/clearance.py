@@ -0,0 +1,102 @@
+"""
+Clearance of a model's cells: their distance to the nearest obstacle, from a Euclidean distance transform of the
+obstacle layer. Explorers with a footprint cannot use cells closer to an obstacle than their radius (obstacles are
+inflated by it), and an optional cost keeps paths away from the obstacles they would otherwise hug (cliff edges,
+keep-out zones). See GridMeshModel.set_clearance.
+"""
+import copy
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+from pextant.lib.bitmask import shifted_slices
+from pextant.mesh.overlay import DEFAULT_TILE_SIZE, tiled
+
+
+class Clearance(object):
+    """
+    Distances (in the model's units) from each cell to the nearest obstacle, clamped to the largest distance that
+    matters (the radius, or the range of the cost), so that an obstacle edit only changes the distances within that
+    reach of it.
+    """
+    def __init__(self, shape, resolution, radius=0., cost_weight=0., cost_range=0., distance=None):
+        """
+        :param radius: cells closer than this to an obstacle are not passable
+        :param cost_weight: cost of entering a cell next to an obstacle, decreasing linearly to 0 at 'cost_range'
+            from it
+        :param distance: already computed distances (e.g. of a model rebuilt from shared arrays)
+        """
+        self.shape = tuple(shape)
+        self.resolution = resolution
+        self.radius = radius
+        self.cost_weight = cost_weight
+        self.cost_range = cost_range
+        self.reach = max(radius, cost_range)
+        self.reach_cells = int(np.ceil(self.reach / resolution))
+        self.distance = distance
+
+    def compute(self, obstacles):
+        """distances of every cell, in one pass"""
+        self.distance = self._distance(obstacles, slice(0, self.shape[0]), slice(0, self.shape[1]))
+
+    def update(self, obstacles, changed_cells):
+        """
+        recomputes the distances around the [N x 2] (row, col) cells whose obstacles changed
+
+        :return: (rows, cols) slices of the window of cells whose clearance may have changed
+        """
+        rows, cols = self.window(changed_cells)
+        self.distance[rows, cols] = self._distance(obstacles, rows, cols)
+        return rows, cols
+
+    def window(self, changed_cells):
+        """(rows, cols) slices of the cells within reach of the bounding window of 'changed_cells'"""
+        (row_min, col_min), (row_max, col_max) = np.min(changed_cells, 0), np.max(changed_cells, 0)
+        return self._expand(slice(row_min, row_max + 1), slice(col_min, col_max + 1))
+
+    def _expand(self, rows, cols):
+        reach = self.reach_cells
+        return tuple(slice(max(s.start - reach, 0), min(s.stop + reach, size))
+                     for s, size in zip((rows, cols), self.shape))
+
+    def _distance(self, obstacles, rows, cols):
+        # the nearest obstacle of a cell of the window, if it is within reach, lies within reach of the window
+        outer_rows, outer_cols = self._expand(rows, cols)
+        free = np.logical_not(np.asarray(obstacles[outer_rows, outer_cols], dtype=bool))
+        inner = (slice(rows.start - outer_rows.start, rows.stop - outer_rows.start),
+                 slice(cols.start - outer_cols.start, cols.stop - outer_cols.start))
+        if free.all():
+            # (no obstacle at all, which distance_transform_edt does not handle)
+            return np.full(free[inner].shape, self.reach, dtype=np.float32)
+        distance = distance_transform_edt(free, sampling=self.resolution)[inner]
+        return np.minimum(distance, self.reach).astype(np.float32)
+
+    def fork(self, tile_size=DEFAULT_TILE_SIZE):
+        """clearance for an overlay of the model (see GridMeshModel.overlay), with copy-on-write distances"""
+        fork = copy.copy(self)
+        fork.distance = tiled(self.distance, tile_size)
+        return fork
+
+    def inflated(self, index=(slice(None), slice(None))):
+        """bool array, over 'index' ((rows, cols) slices or arrays), of the cells too close to an obstacle"""
+        return self.distance[index] < self.radius
+
+    def cost(self, index=(slice(None), slice(None))):
+        """clearance cost of entering the cells of 'index' ((rows, cols) slices or arrays)"""
+        if not self.cost_weight or not self.cost_range:
+            return np.zeros(np.shape(self.distance[index]), dtype=np.float32)
+        return self.cost_weight * np.clip(1 - self.distance[index] / self.cost_range, 0, 1)
+
+    def edge_costs(self, offsets):
+        """
+        [rows x cols x kernel size] clearance costs of moving from each cell to its neighbour at each kernel offset
+        (same layout as ExplorerCost's cost layers), 0 for neighbours off the model
+        """
+        cell_costs = self.cost()
+        costs = np.zeros(self.shape + (len(offsets),), dtype=cell_costs.dtype)
+        for idx, offset in enumerate(offsets):
+            source, destination = shifted_slices(offset, self.shape)
+            costs[source + (idx,)] = cell_costs[destination]
+        return costs
+
+    @property
+    def nbytes(self):
+        return 0 if self.distance is None else self.distance.nbytes
@@ -0,0 +1,192 @@
+"""
+Mosaics: a directory of adjacent DEM tiles (e.g. GeoTIFFs delivered per field site) used as one terrain, without
+merging them into a single file first.
+
+The tiles must share a UTM zone and a resolution, and lie on the same pixel grid. Their footprints are indexed in
+an R-tree (shapely's STRtree), so a subsection only opens the tiles it overlaps and copies just the overlapping
+windows. Decoded tiles are kept in an LRU cache bounded in bytes.
+"""
+import os
+import threading
+from collections import OrderedDict
+from glob import glob
+import numpy as np
+import numpy.ma as ma
+from osgeo import gdal
+from shapely.geometry import box
+from shapely.strtree import STRtree
+from pextant.EnvironmentalModel import GDALDataset, GridMesh, gdal_nw_geo_point
+from pextant.lib.blockcache import DEFAULT_CACHE_BYTES
+from pextant.lib.geoshapely import GeoPoint, UTM
+from pextant.mesh.abstractmesh import Dataset, NpDataset
+
+
+class MosaicTile(object):
+    """a tile file and its window (in pixels) within the mosaic"""
+    def __init__(self, path, x_offset, y_offset, x_size, y_size):
+        self.path = path
+        self.x_offset, self.y_offset = x_offset, y_offset
+        self.x_size, self.y_size = x_size, y_size
+
+    def overlap(self, x_offset, y_offset, x_size, y_size):
+        """
+        (rows, cols) slices of the overlap of the tile with a mosaic window, in mosaic pixels, or None if they do
+        not overlap
+        """
+        x0, x1 = max(x_offset, self.x_offset), min(x_offset + x_size, self.x_offset + self.x_size)
+        y0, y1 = max(y_offset, self.y_offset), min(y_offset + y_size, self.y_offset + self.y_size)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return slice(y0, y1), slice(x0, x1)
+
+
+class TileCache(object):
+    """
+    Decoded tiles (float elevations, nan where there is no data), least recently used ones evicted beyond a
+    budget in bytes. Safe to share with background prefetching.
+    """
+    def __init__(self, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.cache_bytes = cache_bytes
+        self.tiles = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.RLock()
+
+    def get(self, tile):
+        with self.lock:
+            return self._get(tile)
+
+    def _get(self, tile):
+        elevations = self.tiles.get(tile.path)
+        if elevations is not None:
+            self.tiles.move_to_end(tile.path)
+            return elevations
+
+        # same reading and nodata rules as single file meshes
+        raster = gdal.Open(tile.path)
+        resolution = raster.GetGeoTransform()[1]
+        dataset = GDALDataset(raster, row_size=tile.y_size, col_size=tile.x_size, resolution=resolution)
+        elevations = ma.filled(dataset.subsection(0, 0, tile.x_size, tile.y_size).data_container, np.nan)
+        self.tiles[tile.path] = elevations
+        self.nbytes += elevations.nbytes
+
+        # evict least recently used tiles, but always keep the one just read
+        while self.nbytes > self.cache_bytes and len(self.tiles) > 1:
+            _, evicted = self.tiles.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        return elevations
+
+    def clear(self):
+        with self.lock:
+            self.tiles = OrderedDict()
+            self.nbytes = 0
+
+
+class MosaicDataset(Dataset):
+    """
+    Dataset made of several tiles. Subsections are assembled from the tiles they overlap, cells no tile covers
+    are masked
+    """
+    def __init__(self, tiles, row_size, col_size, resolution, cache_bytes=DEFAULT_CACHE_BYTES):
+        super(MosaicDataset, self).__init__(tiles, row_size, col_size, resolution)
+        self.tiles = tiles
+        self.tile_cache = TileCache(cache_bytes)
+        self.footprints = [box(tile.x_offset, tile.y_offset, tile.x_offset + tile.x_size, tile.y_offset + tile.y_size)
+                           for tile in tiles]
+        self.index = STRtree(self.footprints)
+        self._footprint_tiles = dict((id(footprint), tile) for footprint, tile in zip(self.footprints, tiles))
+
+    def tiles_in_window(self, x_offset, y_offset, x_size, y_size):
+        hits = self.index.query(box(x_offset, y_offset, x_offset + x_size, y_offset + y_size))
+        # shapely 2 returns the indices of the footprints, older versions the footprints themselves
+        if len(hits) > 0 and np.issubdtype(np.asarray(hits).dtype, np.integer):
+            return [self.tiles[hit] for hit in hits]
+        return [self._footprint_tiles[id(hit)] for hit in hits]
+
+    def subsection(self, x_offset, y_offset, x_size, y_size, desired_res=None, resampling='nearest', dtype=float):
+        """
+        :param resampling: kernel used when desired_res is coarser than the tiles: 'nearest', 'average',
+            'bilinear' or 'cubic'
+        :param dtype: type of the elevations returned
+        """
+        x_offset, y_offset, x_size, y_size = int(x_offset), int(y_offset), int(x_size), int(y_size)
+        map_array = np.full((y_size, x_size), np.nan, dtype=dtype)
+        for tile in self.tiles_in_window(x_offset, y_offset, x_size, y_size):
+            overlap = tile.overlap(x_offset, y_offset, x_size, y_size)
+            if overlap is None:
+                continue  # footprint only touching the window
+            rows, cols = overlap
+            elevations = self.tile_cache.get(tile)
+            map_array[rows.start - y_offset:rows.stop - y_offset, cols.start - x_offset:cols.stop - x_offset] = \
+                elevations[rows.start - tile.y_offset:rows.stop - tile.y_offset,
+                           cols.start - tile.x_offset:cols.stop - tile.x_offset]
+
+        if desired_res and desired_res != self.resolution:
+            map_array = NpDataset(map_array, self.resolution).downsample(desired_res, resampling).data_container
+        else:
+            desired_res = self.resolution
+        return NpDataset(ma.masked_invalid(map_array, copy=False), desired_res)
+
+    def get_elevations(self, rows, cols):
+        """elevations at integer (row, col) positions of the mosaic, nan where there is no data"""
+        rows, cols = np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)
+        values = np.full(rows.shape, np.nan)
+        for tile in self.tiles:
+            selection = (rows >= tile.y_offset) & (rows < tile.y_offset + tile.y_size) & \
+                        (cols >= tile.x_offset) & (cols < tile.x_offset + tile.x_size)
+            if selection.any():
+                values[selection] = self.tile_cache.get(tile)[rows[selection] - tile.y_offset,
+                                                              cols[selection] - tile.x_offset]
+        return values
+
+
+class MosaicMesh(GridMesh):
+    """
+    Terrain made of all the DEM tiles of a directory (see module docstring), loaded and planned across like a
+    single GDALMesh
+    """
+    def __init__(self, directory, pattern='*.tif', cache_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.pattern = pattern
+        self.cache_bytes = cache_bytes
+        gdal.UseExceptions()
+        paths = sorted(glob(os.path.join(directory, pattern)))
+        if len(paths) == 0:
+            raise ValueError('no DEM tiles matching %s in %s' % (pattern, directory))
+
+        # footprint of every tile, in UTM
+        corners, sizes = [], []
+        resolution, utm_reference = None, None
+        for path in paths:
+            raster = gdal.Open(path)
+            nw_geo_point = gdal_nw_geo_point(raster)
+            tile_resolution = raster.GetGeoTransform()[1]
+            if resolution is None:
+                resolution, utm_reference = tile_resolution, nw_geo_point.utm_reference
+            elif not np.isclose(tile_resolution, resolution) or nw_geo_point.utm_reference.proj_key != \
+                    utm_reference.proj_key:
+                raise ValueError('%s does not share the resolution and UTM zone of %s' % (path, paths[0]))
+            corners.append((nw_geo_point.easting, nw_geo_point.northing))
+            sizes.append((raster.RasterXSize, raster.RasterYSize))
+
+        # the mosaic's grid starts at the north west-most corner, tiles are placed on it by their offsets
+        corners, sizes = np.array(corners), np.array(sizes)
+        nw_easting, nw_northing = corners[:, 0].min(), corners[:, 1].max()
+        x_offsets = np.round((corners[:, 0] - nw_easting) / resolution).astype(int)
+        y_offsets = np.round((nw_northing - corners[:, 1]) / resolution).astype(int)
+        tiles = [MosaicTile(path, x_offset, y_offset, x_size, y_size) for path, x_offset, y_offset, (x_size, y_size)
+                 in zip(paths, x_offsets, y_offsets, sizes)]
+        x_size = max(tile.x_offset + tile.x_size for tile in tiles)
+        y_size = max(tile.y_offset + tile.y_size for tile in tiles)
+
+        dataset = MosaicDataset(tiles, row_size=y_size, col_size=x_size, resolution=resolution,
+                                cache_bytes=cache_bytes)
+        super(MosaicMesh, self).__init__(GeoPoint(utm_reference, nw_easting, nw_northing), dataset)
+
+    def __reduce__(self):
+        # reindexing the directory is much cheaper than pickling decoded tiles
+        return MosaicMesh, (self.directory, self.pattern, self.cache_bytes)
+
+    def getElevations(self, mesh_coordinates):
+        # same signature as GridMeshModel.getElevations, but reads (and caches) only the tiles needed
+        row, col = mesh_coordinates
+        return self.dataset.get_elevations(row, col)
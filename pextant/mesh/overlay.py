@@ -0,0 +1,142 @@
+"""
+Copy-on-write layers for obstacle overlays (see GridMeshModel.overlay): what-if versions of a model's obstacles,
+passable cells and neighbour masks that only store the tiles they changed, on top of the model's own arrays.
+"""
+import numpy as np
+
+DEFAULT_TILE_SIZE = 64
+
+
+class TiledLayer(object):
+    """
+    2d array made of a base array and the square tiles that differ from it. A tile is copied (from the base, or
+    from the layer this one was forked from) the first time it is written, so a layer costs memory in proportion
+    to its edits only.
+
+    Reads and writes take (row, col) scalars, (rows, cols) integer arrays or (rows, cols) slices, which is all
+    models and solvers use; anything else goes through the whole array (np.asarray(layer)).
+    """
+    def __init__(self, base, tile_size=DEFAULT_TILE_SIZE, tiles=None):
+        self.base = base
+        self.tile_size = tile_size
+        self.tiles = dict(tiles) if tiles else {}
+        self.owned = set()  # tiles this layer wrote, the others may be shared with forks
+        self.shape = base.shape
+        self.dtype = base.dtype
+        self.ndim = 2
+
+    def fork(self):
+        """layer starting from this one's tiles, sharing them until either layer writes them"""
+        # tiles written so far become shared, so both layers copy them before their next write
+        self.owned = set()
+        return TiledLayer(self.base, self.tile_size, self.tiles)
+
+    @property
+    def nbytes(self):
+        return sum(tile.nbytes for tile in self.tiles.values())
+
+    def _tile_window(self, key):
+        tile_row, tile_col = key
+        tile_size = self.tile_size
+        return (slice(tile_row * tile_size, min((tile_row + 1) * tile_size, self.shape[0])),
+                slice(tile_col * tile_size, min((tile_col + 1) * tile_size, self.shape[1])))
+
+    def _writable_tile(self, key):
+        if key not in self.owned:
+            tile = self.tiles.get(key)
+            self.tiles[key] = np.array(self.base[self._tile_window(key)] if tile is None else tile)
+            self.owned.add(key)
+        return self.tiles[key]
+
+    def _tile_keys(self, row_start, row_stop, col_start, col_stop):
+        tile_size = self.tile_size
+        return [(tile_row, tile_col) for tile_row in range(row_start // tile_size, (row_stop - 1) // tile_size + 1)
+                for tile_col in range(col_start // tile_size, (col_stop - 1) // tile_size + 1)]
+
+    def _overlaps(self, key, row_start, row_stop, col_start, col_stop):
+        # (window, tile) slice pairs of the overlap of a tile with a window
+        rows, cols = self._tile_window(key)
+        row0, row1 = max(rows.start, row_start), min(rows.stop, row_stop)
+        col0, col1 = max(cols.start, col_start), min(cols.stop, col_stop)
+        return ((slice(row0 - row_start, row1 - row_start), slice(col0 - col_start, col1 - col_start)),
+                (slice(row0 - rows.start, row1 - rows.start), slice(col0 - cols.start, col1 - cols.start)))
+
+    def _window(self, index):
+        rows, cols = index
+        row_start, row_stop, _ = rows.indices(self.shape[0])
+        col_start, col_stop, _ = cols.indices(self.shape[1])
+        return row_start, row_stop, col_start, col_stop
+
+    def _grouped(self, rows, cols):
+        # positions of integer (rows, cols) grouped by tile: (key, selection) pairs
+        tile_size = self.tile_size
+        tile_cols = -(-self.shape[1] // tile_size)
+        flat_keys = (rows // tile_size) * tile_cols + cols // tile_size
+        for flat_key in np.unique(flat_keys):
+            yield tuple(divmod(int(flat_key), tile_cols)), flat_keys == flat_key
+
+    def __getitem__(self, index):
+        rows, cols = index
+        if isinstance(rows, slice):
+            row_start, row_stop, col_start, col_stop = self._window(index)
+            window = np.array(self.base[row_start:row_stop, col_start:col_stop])
+            if row_start < row_stop and col_start < col_stop:
+                for key in self._tile_keys(row_start, row_stop, col_start, col_stop):
+                    tile = self.tiles.get(key)
+                    if tile is not None:
+                        window_part, tile_part = self._overlaps(key, row_start, row_stop, col_start, col_stop)
+                        window[window_part] = tile[tile_part]
+            return window
+
+        if np.ndim(rows) == 0 and np.ndim(cols) == 0:
+            tile = self.tiles.get((rows // self.tile_size, cols // self.tile_size))
+            if tile is None:
+                return self.base[rows, cols]
+            return tile[rows % self.tile_size, cols % self.tile_size]
+
+        rows, cols = np.broadcast_arrays(np.asarray(rows, dtype=int), np.asarray(cols, dtype=int))
+        values = self.base[rows, cols]
+        if self.tiles:
+            for key, selection in self._grouped(rows, cols):
+                tile = self.tiles.get(key)
+                if tile is not None:
+                    values[selection] = tile[rows[selection] % self.tile_size, cols[selection] % self.tile_size]
+        return values
+
+    def __setitem__(self, index, value):
+        rows, cols = index
+        if isinstance(rows, slice):
+            row_start, row_stop, col_start, col_stop = self._window(index)
+            if row_start >= row_stop or col_start >= col_stop:
+                return
+            value = np.broadcast_to(value, (row_stop - row_start, col_stop - col_start))
+            for key in self._tile_keys(row_start, row_stop, col_start, col_stop):
+                window_part, tile_part = self._overlaps(key, row_start, row_stop, col_start, col_stop)
+                self._writable_tile(key)[tile_part] = value[window_part]
+            return
+
+        rows, cols = np.broadcast_arrays(np.asarray(rows, dtype=int), np.asarray(cols, dtype=int))
+        value = np.broadcast_to(value, rows.shape)
+        rows, cols, value = rows.ravel(), cols.ravel(), value.ravel()
+        for key, selection in self._grouped(rows, cols):
+            self._writable_tile(key)[rows[selection] % self.tile_size, cols[selection] % self.tile_size] = \
+                value[selection]
+
+    def __array__(self, dtype=None):
+        array = np.array(self.base, dtype=dtype)
+        for key, tile in self.tiles.items():
+            array[self._tile_window(key)] = tile
+        return array
+
+    def astype(self, dtype):
+        return np.asarray(self, dtype=dtype)
+
+    def tolist(self):
+        return np.asarray(self).tolist()
+
+
+def tiled(layer, tile_size=DEFAULT_TILE_SIZE):
+    """copy-on-write version of a layer: a fork of it if it already is a TiledLayer"""
+    if isinstance(layer, TiledLayer):
+        return layer.fork()
+    return TiledLayer(np.asarray(layer), tile_size)
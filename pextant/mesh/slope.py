@@ -0,0 +1,126 @@
+"""
+Slope computation in row tiles on a thread pool. Each tile is read with a one row halo above and below, so tiles
+give exactly the same result as a single pass over the whole raster, while temporaries stay tile sized. NumPy
+releases the GIL in the array operations, so the tiles run in parallel.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import numpy.ma as ma
+
+# 'gradient': central differences along rows and columns, one-sided at the borders (same as np.gradient)
+# 'horn': Horn (1981) weighted 3x3 differences, less sensitive to noise
+# 'zevenbergen_thorne': Zevenbergen & Thorne (1987) central differences of the 4 direct neighbours
+SLOPE_OPERATORS = ['gradient', 'horn', 'zevenbergen_thorne']
+
+DEFAULT_TILE_ROWS = 256
+
+
+def compute_slopes(elevations, resolution, operator='gradient', tile_rows=DEFAULT_TILE_ROWS, threads=None,
+                   dtype=None):
+    """
+    slope (in degrees) of every cell of 'elevations'. Masked or nan elevations give nan slopes, for the cell
+    itself and for every cell whose operator uses it.
+
+    :param elevations: [rows x cols] array, possibly masked
+    :param threads: size of the thread pool, defaults to the number of CPUs
+    :param dtype: floating point type of the result, defaults to that of elevations
+    """
+    if operator not in SLOPE_OPERATORS:
+        raise ValueError('unknown slope operator %s, expected one of %s' % (operator, SLOPE_OPERATORS))
+    data = ma.getdata(elevations)
+    mask = ma.getmask(elevations)
+    dtype = np.dtype(dtype) if dtype is not None else np.result_type(data.dtype, np.float32)
+    slopes = np.empty(data.shape, dtype=dtype)
+
+    rows = data.shape[0]
+    tile_starts = range(0, rows, tile_rows)
+
+    def run_tile(start):
+        end = min(start + tile_rows, rows)
+        slopes[start:end] = _slope_tile(data, mask, start, end, resolution, operator, dtype)
+
+    if threads == 1 or len(tile_starts) == 1:
+        for start in tile_starts:
+            run_tile(start)
+    else:
+        with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as pool:
+            list(pool.map(run_tile, tile_starts))
+    return slopes
+
+
+def extend_slopes(elevations, resolution, known_slopes, row_offset, col_offset, operator='gradient', dtype=None):
+    """
+    same as compute_slopes, reusing 'known_slopes': the slopes compute_slopes gave for the window of 'elevations'
+    starting at (row_offset, col_offset) on its own (e.g. those of a smaller model of the same terrain). Only the
+    cells around the window, and those along its borders (which saw the window's edge), are computed
+    """
+    shape = np.shape(elevations)
+    known_rows, known_cols = np.shape(known_slopes)
+    # borders of the window that are borders of elevations too were computed the same way
+    inner = (row_offset + int(row_offset > 0), row_offset + known_rows - int(row_offset + known_rows < shape[0]),
+             col_offset + int(col_offset > 0), col_offset + known_cols - int(col_offset + known_cols < shape[1]))
+    row0, row1, col0, col1 = inner
+    if row0 >= row1 or col0 >= col1:
+        return compute_slopes(elevations, resolution, operator, dtype=dtype)
+
+    dtype = np.dtype(dtype) if dtype is not None else np.result_type(ma.getdata(elevations).dtype, np.float32)
+    slopes = np.empty(shape, dtype=dtype)
+    slopes[row0:row1, col0:col1] = \
+        known_slopes[row0 - row_offset:row1 - row_offset, col0 - col_offset:col1 - col_offset]
+    for window_row0, window_row1, window_col0, window_col1 in ring_windows(shape, inner):
+        # each window is computed with a one cell halo, where there is one
+        halo_row0, halo_row1 = max(window_row0 - 1, 0), min(window_row1 + 1, shape[0])
+        halo_col0, halo_col1 = max(window_col0 - 1, 0), min(window_col1 + 1, shape[1])
+        window_slopes = compute_slopes(elevations[halo_row0:halo_row1, halo_col0:halo_col1], resolution, operator,
+                                       dtype=dtype)
+        slopes[window_row0:window_row1, window_col0:window_col1] = window_slopes[
+            window_row0 - halo_row0:window_row1 - halo_row0, window_col0 - halo_col0:window_col1 - halo_col0]
+    return slopes
+
+
+def ring_windows(shape, inner):
+    """
+    (row_start, row_stop, col_start, col_stop) windows that cover a grid of 'shape' except for the window 'inner':
+    full width bands above and below it, and the parts of its rows on either side. Empty windows are left out
+    """
+    row0, row1, col0, col1 = inner
+    windows = [(0, row0, 0, shape[1]), (row1, shape[0], 0, shape[1]), (row0, row1, 0, col0),
+               (row0, row1, col1, shape[1])]
+    return [window for window in windows if window[0] < window[1] and window[2] < window[3]]
+
+
+def _slope_tile(data, mask, start, end, resolution, operator, dtype):
+    # rows [start, end) plus the halo rows that exist
+    halo_start, halo_end = max(start - 1, 0), min(end + 1, data.shape[0])
+    block = data[halo_start:halo_end].astype(dtype)
+    if mask is not ma.nomask:
+        block[mask[halo_start:halo_end]] = np.nan
+    interior = slice(start - halo_start, start - halo_start + end - start)
+
+    if operator == 'gradient':
+        gy, gx = np.gradient(block, resolution, resolution)
+        gy, gx = gy[interior], gx[interior]
+    else:
+        # borders of the raster repeat their edge values
+        padded = np.pad(block, ((int(start == 0), int(end == data.shape[0])), (1, 1)), mode='edge')
+        a, b, c = padded[:-2, :-2], padded[:-2, 1:-1], padded[:-2, 2:]
+        d, f = padded[1:-1, :-2], padded[1:-1, 2:]
+        g, h, i = padded[2:, :-2], padded[2:, 1:-1], padded[2:, 2:]
+        if operator == 'horn':
+            gx = ((c + 2 * f + i) - (a + 2 * d + g)) / (8 * resolution)
+            gy = ((g + 2 * h + i) - (a + 2 * b + c)) / (8 * resolution)
+        else:  # zevenbergen_thorne
+            gx = (f - d) / (2 * resolution)
+            gy = (h - b) / (2 * resolution)
+
+    # fused in place: degrees(arctan(sqrt(gx^2 + gy^2))) without further temporaries
+    np.square(gx, out=gx)
+    np.square(gy, out=gy)
+    np.add(gx, gy, out=gx)
+    np.sqrt(gx, out=gx)
+    np.arctan(gx, out=gx)
+    slopes = np.degrees(gx, out=gx)
+    # (the operators do not use a cell's own elevation)
+    slopes[np.isnan(block[interior])] = np.nan
+    return slopes
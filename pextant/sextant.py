@@ -11,8 +11,9 @@ from functools import update_wrapper
 from pextant.EnvironmentalModel import GDALMesh
 from pextant.explorers import Astronaut
 from pextant.analysis.loadWaypoints import JSONloader
-from pextant.lib.geoshapely import GeoPolygon, LAT_LONG
+from pextant.lib.geoshapely import GeoPolygon, LAT_LONG, transform_points
 from pextant.solvers.astarMesh import astarSolver
+from pextant.solvers.prefetch import Prefetcher
 
 from flask import Flask
 from flask import make_response, request, current_app
@@ -73,8 +74,11 @@ def main(argv):
 
     print(geotiff_full_path)
     
-    gdal_mesh = GDALMesh(geotiff_full_path)
+    # lazy: solves only read (and keep) the blocks around their waypoints
+    gdal_mesh = GDALMesh(geotiff_full_path, lazy=True)
     explorer = Astronaut(80)
+    # legs of the current plan get loaded in the background as soon as its waypoints are set
+    prefetcher = Prefetcher(gdal_mesh, explorer, optimize_on='Energy', cached=True)
     solver, waypoints, environmental_model = None, None, None
 
     @app.route('/test', methods=['GET', 'POST'])
@@ -96,9 +100,8 @@ def main(argv):
             print('loaded xp json')
             waypoints = json_loader.get_waypoints()
             print('gdal mesh is  built from %s' % str(geotiff_full_path))
-            environmental_model = gdal_mesh.loadSubSection(waypoints.geoEnvelope(), cached=True)
-            solver = astarSolver(environmental_model, explorer, optimize_on='Energy')
-            print('loaded fine')
+            prefetcher.prefetch(waypoints)
+            print('loading legs')
             return json.dumps({'loaded': True})
         except Exception as e:
             traceback.print_exc()
@@ -117,19 +120,23 @@ def main(argv):
             xp_json = request_data['xp_json']
             json_loader = JSONloader(xp_json['sequence'])
             waypoints = json_loader.get_waypoints()
+            prefetcher.prefetch(waypoints)
         print((waypoints.to(LAT_LONG)))
-        environmental_model = gdal_mesh.loadSubSection(waypoints.geoEnvelope(), cached=True)
-        solver = astarSolver(environmental_model, explorer, optimize_on='Energy')
-        search_results, rawpoints, _ = solver.solvemultipoint(waypoints)
+        search_results, _, _ = prefetcher.solvemultipoint()
         return_json = {
             'latlong':[]
         }
+        # every leg has its own model
+        latlongs = []
+        for leg, search_result in zip(prefetcher.legs, search_results.list):
+            environmental_model = leg.solver.env_model
+            latlongs.append(transform_points(search_result.raw, environmental_model.ROW_COL, LAT_LONG))
         if return_type == 'segmented':
-            for search_result in search_results.list:
-                lat, lon = GeoPolygon(environmental_model.ROW_COL, *np.array(search_result.raw).transpose()).to(LAT_LONG)
+            for latlong in latlongs:
+                lat, lon = latlong.transpose()
                 return_json['latlong'].append({'latitudes': list(lat), 'longitudes': list(lon)})
         else:
-            lat, lon = GeoPolygon(environmental_model.ROW_COL, *np.array(rawpoints).transpose()).to(LAT_LONG)
+            lat, lon = np.concatenate(latlongs).transpose()
             return_json['latlong'].append({'latitudes': list(lat), 'longitudes': list(lon)})
 
         return json.dumps(return_json)
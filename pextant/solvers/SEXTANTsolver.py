@@ -1,4 +1,6 @@
 from pextant.lib.geoshapely import GeoPolygon, LONG_LAT
+from pextant.lib.sharedarrays import SharedArrays
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import csv
 
@@ -12,12 +14,77 @@ class SEXTANTSolver(object):
     def solve(self, start_point, end_point):
         pass
 
-    def solvemultipoint(self, waypoints):
+    def solvemultipoint(self, waypoints, processes=1):
+        """
+        solves every leg between consecutive waypoints. If processes > 1 the legs (which are independent
+        of each other) are fanned out to a process pool, with the models shared through shared memory. Solvers
+        that do not implement the parallel solving hooks solve their legs sequentially
+        """
+        if processes > 1 and len(waypoints) > 2 and self.supports_parallel:
+            search_list = self.solvemultipoint_parallel(waypoints, processes)
+        else:
+            search_list = sextantSearchList(waypoints)
+            for i in range(len(waypoints) - 1):
+                search_result = self.solve(waypoints[i], waypoints[i + 1])
+                search_list.append(search_result)
+        return search_list, search_list.raw(), search_list.itemssrchd()
+
+    def solvemultipoint_parallel(self, waypoints, processes):
         search_list = sextantSearchList(waypoints)
-        for i in range(len(waypoints) - 1):
-            search_result = self.solve(waypoints[i], waypoints[i + 1])
+        points = [self.worker_point(waypoints[i]) for i in range(len(waypoints))]
+        legs = list(zip(points[:-1], points[1:]))
+        with SharedArrays() as shared_arrays:
+            worker_state = self.worker_state(shared_arrays)
+            with ProcessPoolExecutor(max_workers=min(processes, len(legs)), initializer=_init_worker,
+                                     initargs=(type(self), worker_state)) as pool:
+                # map keeps the results in leg order
+                results = list(pool.map(_solve_leg, legs))
+        for result in results:
+            search_result = self.search_from_worker_result(result)
+            if search_result:
+                self.searches.append(search_result)
             search_list.append(search_result)
-        return search_list, search_list.raw(), search_list.itemssrchd()
+        return search_list
+
+    @property
+    def supports_parallel(self):
+        """whether the solver implements worker_state and from_worker_state (see solvemultipoint)"""
+        cls = type(self)
+        return cls.worker_state is not SEXTANTSolver.worker_state and \
+            cls.from_worker_state.__func__ is not SEXTANTSolver.from_worker_state.__func__
+
+    # hooks for parallel solving, to be implemented by solvers that support it
+    def worker_state(self, shared_arrays):
+        """returns a picklable state, from which from_worker_state can rebuild the solver in a worker process"""
+        raise NotImplementedError('%s does not support parallel solving' % type(self).__name__)
+
+    @classmethod
+    def from_worker_state(cls, state):
+        raise NotImplementedError('%s does not support parallel solving' % cls.__name__)
+
+    def worker_point(self, point):
+        """converts a waypoint into something picklable that solve() accepts"""
+        return point
+
+    def worker_result(self, search_result):
+        """reduces the result of solve() to something picklable"""
+        return search_result
+
+    def search_from_worker_result(self, result):
+        """inverse of worker_result, run in the main process"""
+        return result
+
+
+# solver owned by each worker process of a parallel solvemultipoint
+_worker_solver = None
+
+def _init_worker(solver_class, state):
+    global _worker_solver
+    _worker_solver = solver_class.from_worker_state(state)
+
+def _solve_leg(leg):
+    start_point, end_point = leg
+    return _worker_solver.worker_result(_worker_solver.solve(start_point, end_point))
 
 class sextantSearchList(object):
     def __init__(self, points):
@@ -87,6 +154,16 @@ class sextantSearch(object):
         self.coordinates = coordinates
         self.expanded_items = expanded_items
 
+    def shifted(self, row_offset, col_offset):
+        """
+        the same search, with its raw (and expanded) cells moved into a grid in which the one it was found in starts at
+        (row_offset, col_offset), e.g. a larger model of the same terrain. Nodes keep their own elements
+        """
+        raw = [(row + row_offset, col + col_offset) for row, col in self.raw]
+        expanded_items = type(self.expanded_items)((row + row_offset, col + col_offset)
+                                                   for row, col in self.expanded_items)
+        return sextantSearch(raw, self.nodes, self.coordinates, expanded_items)
+
     def tojson(self):
         out = {}
         coordinates = self.coordinates.to(LONG_LAT).transpose().tolist()
@@ -0,0 +1,119 @@
+import numpy as np
+from .SEXTANTsolver import SEXTANTSolver, sextantSearchList
+from .astarMesh import astarSolver
+from pextant.lib.geoshapely import GeoPolygon
+
+
+class adaptiveSolver(SEXTANTSolver):
+    """
+    Solver that loads its own model from a (not loaded) mesh, e.g. a GDALMesh or MosaicMesh, instead of being
+    handed a subsection sized by a fixed margin around the waypoints.
+
+    It starts with the waypoints' envelope plus a small margin, and grows the margin (by 'growth' times) while some
+    leg has no path, or while a path runs along a border of the subsection that is not the border of the mesh
+    itself (so the best path may lie outside of it). Lazy meshes keep the blocks (or tiles) they have read, so
+    growing only reads the new parts of the window. The grown model reuses the slopes and cost layers of the previous
+    one for the cells they do not change at, and only the legs that needed growing are solved again.
+
+    After solving, env_model is the model the returned searches' raw cells refer to.
+    """
+    def __init__(self, mesh, explorer_model, viz=None, optimize_on='Energy', margin=10, growth=2, max_growths=5,
+                 solver_options=None, **model_options):
+        """
+        :param mesh: unloaded mesh, see GridMesh
+        :param margin: initial margin around the waypoints, in cells of the mesh
+        :param solver_options: extra arguments of astarSolver (algorithm_type, heuristic_accelerate...)
+        :param model_options: arguments of loadSubSection (maxSlope, cached...)
+        """
+        self.mesh = mesh
+        self.explorer_model = explorer_model
+        self.optimize_on = optimize_on
+        self.margin = margin
+        self.growth = growth
+        self.max_growths = max_growths
+        self.solver_options = solver_options or {}
+        self.model_options = model_options
+        self.solver = None
+        self.envelope_bounds = None
+        super(adaptiveSolver, self).__init__(None, None, viz)
+
+    def load(self, envelope):
+        """
+        loads the model of 'envelope' (clipped to the mesh) and a solver for it, unless that envelope is already
+        loaded (e.g. by a Prefetcher)
+        """
+        envelope_bounds = envelope.envelope.bounds
+        if envelope_bounds == self.envelope_bounds:
+            return self.env_model
+        known_model, known_costs = self.env_model, None
+        env_model = self.mesh.loadSubSection(envelope, known_model=known_model, **self.model_options)
+        offset = None if known_model is None else env_model.window_offset(known_model)
+        if offset is not None and self.cost_function.cached['costs'] is not None:
+            known_costs = (self.cost_function.cached['costs'],) + offset
+        self.solver = astarSolver(env_model, self.explorer_model, self.viz, self.optimize_on, known_costs=known_costs,
+                                  **self.solver_options)
+        self.env_model = env_model
+        self.cost_function = self.solver.cost_function
+        self.envelope_bounds = envelope_bounds
+        return env_model
+
+    def initial_envelope(self, waypoints):
+        """first window solvemultipoint loads for 'waypoints'"""
+        return waypoints.geoEnvelope().addMargin(self.mesh.resolution, self.margin)
+
+    def solve(self, startpoint, endpoint):
+        search_list, _, _ = self.solvemultipoint(GeoPolygon([startpoint, endpoint]))
+        return search_list.list[0]
+
+    def solvemultipoint(self, waypoints, processes=1):
+        envelope = waypoints.geoEnvelope()
+        margin = self.margin
+        self.load(envelope.addMargin(self.mesh.resolution, margin))
+        searches = self.solver.solvemultipoint(waypoints, processes)[0].list
+        for _ in range(self.max_growths):
+            legs = [] if self.covers_mesh() else self.legs_needing_growth(waypoints, searches)
+            if not legs:
+                break
+            margin *= self.growth
+            known_model = self.env_model
+            self.load(envelope.addMargin(self.mesh.resolution, margin))
+            # legs that were fine keep their searches, moved into the grown model's grid
+            row_offset, col_offset = known_model.yoff - self.env_model.yoff, known_model.xoff - self.env_model.xoff
+            searches = [self.solver.solve(waypoints[i], waypoints[i + 1]) if i in legs else
+                        search.shifted(row_offset, col_offset) if search else search
+                        for i, search in enumerate(searches)]
+
+        search_list = sextantSearchList(waypoints)
+        for search in searches:
+            search_list.append(search)
+        self.searches += [search for search in searches if search]
+        return search_list, search_list.raw(), search_list.itemssrchd()
+
+    def covers_mesh(self):
+        return not any(self.open_borders())
+
+    def open_borders(self):
+        """top, bottom, left, right: whether the mesh extends beyond that border of the loaded model"""
+        env_model = self.env_model
+        return (env_model.yoff > 0, env_model.yoff + env_model.y_size < self.mesh.y_size,
+                env_model.xoff > 0, env_model.xoff + env_model.x_size < self.mesh.x_size)
+
+    def needs_growth(self, waypoints, search_list):
+        return len(self.legs_needing_growth(waypoints, search_list.list)) > 0
+
+    def legs_needing_growth(self, waypoints, searches):
+        """indices of the legs whose search (in the loaded model) may improve in a larger window"""
+        env_model = self.env_model
+        top, bottom, left, right = self.open_borders()
+        legs = []
+        for i, search in enumerate(searches):
+            if not search or len(search.raw) == 0:
+                # no path, unless an endpoint has no data (no window would help then)
+                if env_model.elt_hasdata(waypoints[i]) and env_model.elt_hasdata(waypoints[i + 1]):
+                    legs.append(i)
+                continue
+            rows, cols = np.array(search.raw).transpose()
+            if (top and rows.min() == 0) or (bottom and rows.max() == env_model.y_size - 1) or \
+                    (left and cols.min() == 0) or (right and cols.max() == env_model.x_size - 1):
+                legs.append(i)
+        return legs
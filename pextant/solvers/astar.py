@@ -69,7 +69,7 @@ class aStarCostFunction(object):
     def getCostBetween(self, fromnode, tonode):
         return 0
 
-def aStarSearch(start_node, end_node, cost_function, viz=None):
+def aStarSearch(start_node, end_node, cost_function, viz=None, search_mask=None):
     """
     returns the path (as a list of coordinates), followed by the number of
     states expanded, followed by the total cost
@@ -82,6 +82,9 @@ def aStarSearch(start_node, end_node, cost_function, viz=None):
     costFunction supports a vector costFunction, with the
     three vector elements representing: 'Energy', 'Time', or 'Distance'
     As of right now 'Energy' just refers to metabolic energy.
+
+    search_mask optionally restricts the search to a region: children whose state indexes to False in it
+    are never expanded.
     """
     push = heappush
     pop = heappop
@@ -113,6 +116,8 @@ def aStarSearch(start_node, end_node, cost_function, viz=None):
         for child_node, child_state, cost in cost_function.getCostBetween(current_node, current_node.getChildren()):
             if child_state in explored: #and cost_to_node >= g_cost.get(child_node_state,0):
                 continue
+            if search_mask is not None and not search_mask[child_state]:
+                continue
             ncost = acc_cost + cost
             if child_state in enqueued:
                 qcost, h = enqueued[child_state]
@@ -1,13 +1,28 @@
+import logging
+from functools import partial
 import numpy as np
 import networkx as nx
+from scipy.sparse import csgraph, csr_matrix
 import pextant_cpp
 from .SEXTANTsolver import sextantSearch, SEXTANTSolver, sextantSearchList
 from .astar import aStarSearchNode, aStarNodeCollection, aStarCostFunction, aStarSearch
+from .costtiles import CostTiles, DEFAULT_COST_TILES_BYTES
 from pextant.EnvironmentalModel import EnvironmentalModel, GridMeshModel
 from pextant.lib.geoshapely import GeoPoint, GeoPolygon, LONG_LAT
+from pextant.lib.memory import get_memory_budget, nbytes, report_total
+from pextant.lib.sharedarrays import attach_array
+from pextant.mesh.slope import ring_windows
 from pextant.solvers.nxastar import GG, astar_path
 from time import time
 
+# value scipy.sparse.csgraph uses in predecessor (and source) arrays for 'no such node'
+csgraph_no_path = -9999
+
+# cost layers, in the order of Explorer.optimizevector's weights
+COST_LAYERS = ['path', 'time', 'energy']
+
+logger = logging.getLogger(__name__)
+
 
 class MeshSearchElement(aStarSearchNode):
     def __init__(self, mesh_element, parent=None, cost_from_parent=0):
@@ -43,13 +58,22 @@ class MeshSearchCollection(aStarNodeCollection):
         return mesh_search_element
 
 class ExplorerCost(aStarCostFunction):
-    def __init__(self, astronaut, environment, optimize_on, cached=False, heuristic_accelerate=1):
+    def __init__(self, astronaut, environment, optimize_on, cached=False, heuristic_accelerate=1, costs=None,
+                 memory_budget=None, lazy_costs=False, known_costs=None):
         """
 
         :type astronaut: Astronaut
         :param environment:
         :type environment: GridMeshModel
         :param optimize_on:
+        :param costs: already computed cost layers (output of create_costs_cache), or the CostTiles of a cost
+            function of the same cells, used instead of recomputing them
+        :param memory_budget: bytes the model and the cost layers may take together, defaults to
+            pextant.lib.memory.get_memory_budget(). See plan_costs
+        :param lazy_costs: compute costs a tile at a time as searches reach them (see CostTiles) rather than for
+            the whole model up front
+        :param known_costs: (cost layers, row offset, col offset) of a window of the model, e.g. the cost cache of a
+            smaller model of the same terrain (see adaptiveSolver). Cached layers copy them rather than recompute them
         """
         super(ExplorerCost, self).__init__()
         self.explorer = astronaut
@@ -57,7 +81,17 @@ class ExplorerCost(aStarCostFunction):
         self.optimize_vector = astronaut.optimizevector(optimize_on)
         self.heuristic_accelerate = heuristic_accelerate
         self.cache = cached
-        if cached:
+        self.memory_budget = memory_budget if memory_budget is not None else get_memory_budget()
+        self.lazy_costs = lazy_costs
+        self.known_costs = known_costs
+        self.cost_tiles = None
+        self.missing_costs = None
+        if cached and isinstance(costs, CostTiles):
+            self.cost_tiles = costs
+        elif cached and costs is not None:
+            self.cached["costs"] = costs
+            self.cover_missing_costs()
+        elif cached:
             self.cache_costs()
 
     def cache_all(self):
@@ -66,28 +100,159 @@ class ExplorerCost(aStarCostFunction):
         self.cache_heuristic((end_x, end_y))
 
     def cache_costs(self):
-        self.cached["costs"] = self.create_costs_cache()
+        plan = None if self.lazy_costs else self.plan_costs()
+        if plan is None:
+            self.cached["costs"] = None
+            cache_bytes = DEFAULT_COST_TILES_BYTES if self.memory_budget is None else max(self.available_bytes(), 0)
+            self.cost_tiles = CostTiles(self, COST_LAYERS, cache_bytes=cache_bytes)
+        else:
+            self.cached["costs"] = self.create_costs_cache(*plan) if self.known_costs is None else \
+                self.extend_costs(*plan)
+            self.cover_missing_costs()
+        self.known_costs = None
+
+    def cover_missing_costs(self):
+        """
+        searches need every cost layer for the nodes' derived values: those a degraded cache leaves out (see
+        plan_costs) are computed a tile at a time as searches reach them, in a memo taking what the model and the
+        cached layers leave of the memory budget
+        """
+        costs = self.cached["costs"]
+        missing = [name for name in COST_LAYERS if name not in costs]
+        if not missing:
+            self.missing_costs = None
+            return
+        if self.memory_budget is None:
+            cache_bytes = DEFAULT_COST_TILES_BYTES
+        else:
+            cache_bytes = max(self.available_bytes() - sum(nbytes(layer) for layer in costs.values()), 0)
+        dtype = next(iter(costs.values())).dtype if costs else None
+        self.missing_costs = CostTiles(self, missing, cache_bytes=cache_bytes, dtype=dtype)
+
+    def costs_nbytes(self, layers, dtype):
+        kernel_size = len(self.map.searchKernel.getKernel())
+        return len(layers) * self.map.size * kernel_size * np.dtype(dtype).itemsize
 
-    def create_costs_cache(self):
+    def plan_costs(self):
+        """
+        (layers, dtype) of the cost cache that fits in the memory budget along with the model. Degrades, as long
+        as it does not fit, from all layers at the model's precision to only the layers the optimization uses, then
+        to those in float32. None if even that does not fit: costs are then computed a tile at a time as searches reach
+        them, in a memo that takes what the model leaves of the budget (see CostTiles).
+        """
+        dtype = self.map.dtype
+        if self.memory_budget is None:
+            return COST_LAYERS, dtype
+        available = self.available_bytes()
+        used_layers = [name for name, weight in zip(COST_LAYERS, self.optimize_vector) if weight != 0]
+        for layers, layers_dtype in [(COST_LAYERS, dtype), (used_layers, dtype), (used_layers, np.float32)]:
+            if self.costs_nbytes(layers, layers_dtype) <= available:
+                if (layers, layers_dtype) != (COST_LAYERS, dtype):
+                    logger.warning('cost layers exceed the memory budget, caching only %s in %s'
+                                   % (layers, np.dtype(layers_dtype).name))
+                return layers, layers_dtype
+        logger.warning('cost layers exceed the memory budget, costs will be computed a tile at a time')
+        return None
+
+    def available_bytes(self):
+        """what the model leaves of the memory budget"""
+        return self.memory_budget - report_total(self.map.memory_report())
+
+    def memory_report(self):
+        """bytes held by each cached cost layer and by the heuristics (see pextant.lib.memory)"""
+        costs = self.cached["costs"] or {}
+        report = dict(('costs.' + name, nbytes(layer)) for name, layer in costs.items())
+        if self.cost_tiles is not None:
+            report['cost_tiles'] = self.cost_tiles.nbytes
+        if self.missing_costs is not None:
+            report['missing_costs'] = self.missing_costs.nbytes
+        report['heuristics'] = nbytes(self.cached["heuristics"])
+        return report
+
+    def cache_path_finder_costs(self, path_finder):
+        """
+        hands the energy costs to a C++ PathFinder: all of them, or with lazy costs, the tiles to fetch as its
+        searches reach them
+        """
+        cost_tiles = self.cost_tiles
+        if cost_tiles is not None:
+            path_finder.set_cost_tiles(cost_tiles.y_size, cost_tiles.x_size, cost_tiles.tile_size,
+                                       partial(cost_tiles.layer_tile, 'energy', dtype=np.float32),
+                                       cost_tiles.max_tiles)
+        else:
+            path_finder.cache_costs(self.layer("energy").tolist())
+
+    def layer(self, name):
+        """cost layer 'name' (see COST_LAYERS), computed without being kept if the cache does not hold it"""
+        costs = self.cached["costs"]
+        if costs is not None and name in costs:
+            return costs[name]
+        return self.create_costs_cache([name])[name]
+
+    def extend_costs(self, layers=COST_LAYERS, dtype=None):
+        """
+        same as create_costs_cache(layers, dtype), with the cells known_costs hold copied. Only the cells around
+        their window, and those within the kernel's reach of its borders (whose neighbours wrapped around it), are
+        computed
+        """
+        dtype = self.map.dtype if dtype is None else np.dtype(dtype)
+        known_layers, row_offset, col_offset = self.known_costs
+        if any(name not in known_layers or known_layers[name].dtype != dtype for name in layers):
+            return self.create_costs_cache(layers, dtype)
+        known_rows, known_cols = known_layers[layers[0]].shape[:2]
+        reach = int(np.abs(self.map.searchKernel.getKernel()).max())
+        inner = (row_offset + reach, row_offset + known_rows - reach,
+                 col_offset + reach, col_offset + known_cols - reach)
+        row0, row1, col0, col1 = inner
+        if row0 >= row1 or col0 >= col1:
+            return self.create_costs_cache(layers, dtype)
+
+        kernel_size = len(self.map.searchKernel.getKernel())
+        costs = dict((name, np.empty(self.map.shape + (kernel_size,), dtype=dtype)) for name in layers)
+        for name in layers:
+            costs[name][row0:row1, col0:col1] = \
+                known_layers[name][row0 - row_offset:row1 - row_offset, col0 - col_offset:col1 - col_offset]
+        for window in ring_windows(self.map.shape, inner):
+            window_row0, window_row1, window_col0, window_col1 = window
+            for name, layer in self.create_costs_cache(layers, dtype, window).items():
+                costs[name][window_row0:window_row1, window_col0:window_col1] = layer
+        return costs
+
+    def create_costs_cache(self, layers=COST_LAYERS, dtype=None, window=None):
+        """
+        :param layers: names of the layers to compute (see COST_LAYERS)
+        :param dtype: precision of the layers, defaults to the model's
+        :param window: (row_start, row_stop, col_start, col_stop) of the cells to compute the costs of (see
+            CostTiles), defaults to the whole model
+        """
         kernel = self.map.searchKernel
         offsets = kernel.getKernel()
         dem = self.map
+        # layers are as precise as the model (float32 halves their size), unless told otherwise
+        dtype = dem.dtype if dtype is None else np.dtype(dtype)
+        if window is None:
+            window = (0, dem.shape[0], 0, dem.shape[1])
+        row_start, row_stop, col_start, col_stop = window
+        rows, cols = row_stop - row_start, col_stop - col_start
 
         # planar (i.e. x-y) distances to all neighbors (by kernel-index)
-        dr = np.apply_along_axis(np.linalg.norm, 1, offsets) * self.map.resolution
+        dr = (np.apply_along_axis(np.linalg.norm, 1, offsets) * self.map.resolution).astype(dtype)
 
-        # elevations
-        z = self.map.dataset_unmasked
+        # elevations of the window and of the cells within the kernel's reach around it. Like np.roll, the model
+        #   wraps around at its edges (neighbours off the model are never reachable anyway)
+        reach = int(np.abs(offsets).max())
+        z = self.map.dataset_unmasked[np.ix_(np.arange(row_start - reach, row_stop + reach) % dem.shape[0],
+                                             np.arange(col_start - reach, col_stop + reach) % dem.shape[1])]
+        if z.dtype != dtype:
+            z = z.astype(dtype)
+        z_window = z[reach:reach + rows, reach:reach + cols]
 
         # stored gravity value
         g = self.map.getGravity()
 
         # initialize arrays for holding costs
         neighbour_size = len(self.map.searchKernel.getKernel())
-        slopes_rad = np.empty((dem.shape[0], dem.shape[1], neighbour_size))
-        energy_cost = np.empty((dem.shape[0], dem.shape[1], neighbour_size))
-        time_cost = np.empty((dem.shape[0], dem.shape[1], neighbour_size))
-        path_cost = np.empty((dem.shape[0], dem.shape[1], neighbour_size))
+        costs = dict((name, np.empty((rows, cols, neighbour_size), dtype=dtype)) for name in layers)
 
         for idx, offset in enumerate(offsets):
 
@@ -95,18 +260,36 @@ class ExplorerCost(aStarCostFunction):
             dri = dr[idx]
 
             # angle (in radians) between each node and neighbor at {offset}
-            slopes_rad[:, :, idx] = np.arctan2(np.roll(np.roll(z, -offset[0], axis=0), -offset[1], axis=1) - z, dri)
+            z_neighbour = z[reach + offset[0]:reach + offset[0] + rows, reach + offset[1]:reach + offset[1] + cols]
+            slopes_rad = np.arctan2(z_neighbour - z_window, dri)
 
             # calculate {energy cost} and {planar velocity} from slope, distance, and gravity
-            energy_cost[:, :, idx], v = self.explorer.energy_expenditure(dri, slopes_rad[:, :, idx], g)
+            if 'energy' in costs or 'time' in costs:
+                energy_cost, v = self.explorer.energy_expenditure(dri, slopes_rad, g)
+                if 'energy' in costs:
+                    costs['energy'][:, :, idx] = energy_cost
 
-            # time = distance / rate
-            time_cost[:,:,idx] = dri/v
+                # time = distance / rate
+                if 'time' in costs:
+                    costs['time'][:, :, idx] = dri/v
 
             # total, 3-dimensional distance traveled
-            path_cost[:,:,idx] = dri/np.cos(slopes_rad[:, :, idx])*np.ones_like(z)
+            if 'path' in costs:
+                costs['path'][:, :, idx] = dri/np.cos(slopes_rad)
+
+        return costs
 
-        return {'time': time_cost, 'path': path_cost, 'energy': energy_cost}
+    def cost_layer(self):
+        """
+        single [y_size x x_size x kernel size] layer of costs to each neighbour, weighted by the optimize vector
+        (i.e. the edge weights the searches actually use), clearance costs included
+        """
+        weighted_layers = [weight * self.layer(name) for name, weight in zip(COST_LAYERS, self.optimize_vector)
+                           if weight != 0]
+        clearance = getattr(self.map, 'clearance', None)
+        if clearance is not None and clearance.cost_weight:
+            weighted_layers.append(clearance.edge_costs(self.map.searchKernel.getKernel()))
+        return sum(weighted_layers[1:], weighted_layers[0])
 
     def cache_heuristic(self, goal):
         self.cached["heuristics"] = self.create_heuristic_cache(goal)
@@ -130,8 +313,8 @@ class ExplorerCost(aStarCostFunction):
             max_velocity,  # time per m
             energy_weight  # energy per m
         ])
-        optimize_cost = oct_grid_distance * np.dot(optimize_values, optimize_weights)
-        heuristic_cost = self.heuristic_accelerate * optimize_cost
+        optimize_cost = oct_grid_distance * self.map.dtype.type(np.dot(optimize_values, optimize_weights))
+        heuristic_cost = self.map.dtype.type(self.heuristic_accelerate) * optimize_cost
 
         return heuristic_cost
 
@@ -180,20 +363,29 @@ class ExplorerCost(aStarCostFunction):
         """:type fromnode: MeshSearchElement"""
         from_elt = fromnode.mesh_element
         to_cllt = tonodes.collection
-        if self.cache:
+        costs = self.cached["costs"]
+        if self.cache and costs is not None:
+            row, col = from_elt.mesh_coordinate
+            selection = self.map.neighbour_selection(row, col)
+            cell_costs = dict((name, layer[row, col]) for name, layer in costs.items())
+            if self.missing_costs is not None:
+                # layers a degraded cache leaves out
+                cell_costs.update(self.missing_costs.costs(row, col))
+            optimize_vector = np.array([cell_costs[name][selection] for name in COST_LAYERS])
+        elif self.cache and self.cost_tiles is not None:
             row, col = from_elt.mesh_coordinate
-            selection = self.map.cached_neighbours[row,col]
-            costs = self.cached["costs"]
-            optimize_vector = np.array([
-                costs['path'][row, col][selection],
-                costs['time'][row, col][selection],
-                costs['energy'][row, col][selection]
-            ])
+            selection = self.map.neighbour_selection(row, col)
+            cell_costs = self.cost_tiles.costs(row, col)
+            optimize_vector = np.array([cell_costs[name][selection] for name in COST_LAYERS])
         else:
             optimize_vector = self.calculateCostBetween(from_elt, to_cllt)
 
         optimize_weights = self.optimize_vector
         costs = np.dot(optimize_vector.transpose(), optimize_weights)
+        clearance = getattr(self.map, 'clearance', None)
+        if clearance is not None and clearance.cost_weight:
+            # entering cells close to obstacles costs extra (not part of the derived values)
+            costs = costs + clearance.cost(tuple(np.asarray(to_cllt.mesh_coordinates)))
         tonodes.derived = optimize_vector
 
         return list(zip(tonodes, to_cllt.get_states(), costs))
@@ -233,19 +425,34 @@ class astarSolver(SEXTANTSolver):
     PY_INHOUSE = 1
     PY_NETWORKX = 2
     CPP_NETWORKX = 3
+    SCIPY_CSGRAPH = 4
 
     def __init__(self, env_model, explorer_model, viz=None, optimize_on='Energy',
-                 cached=False, algorithm_type=PY_INHOUSE, heuristic_accelerate=1):
+                 cached=False, algorithm_type=PY_INHOUSE, heuristic_accelerate=1, costs=None, max_slope=None,
+                 memory_budget=None, lazy_costs=False, known_costs=None):
+        """
+        :param memory_budget, lazy_costs, known_costs: see ExplorerCost
+        :param max_slope: solve with the model's passability profile for this explorer and max slope (see
+            GridMeshModel.select_profile), so that solvers for different explorers can share one model. By default
+            the profile in use when the solver is created
+        """
         self.explorer_model = explorer_model
+        if max_slope is not None:
+            self.profile = env_model.select_profile(max_slope, explorer_model.type)
+        else:
+            self.profile = getattr(env_model, 'profile', None)
         self.optimize_on = optimize_on
         self.cache = env_model.cached
         self.algorithm_type = algorithm_type
+        self.heuristic_accelerate = heuristic_accelerate
         self.G = None
-        cost_function = ExplorerCost(explorer_model, env_model, optimize_on, env_model.cached, heuristic_accelerate)
+        self.csgraph = None
+        cost_function = ExplorerCost(explorer_model, env_model, optimize_on, env_model.cached, heuristic_accelerate,
+                                     costs, memory_budget, lazy_costs, known_costs)
         super(astarSolver, self).__init__(env_model, cost_function, viz)
 
         # if using networkx-based implementation, set G
-        if algorithm_type == astarSolver.PY_NETWORKX or algorithm_type == astarSolver.CPP_NETWORKX:
+        if algorithm_type == astarSolver.PY_NETWORKX:
             self.G = GG(self)
 
         # if we're using CPP external module
@@ -259,33 +466,139 @@ class astarSolver(SEXTANTSolver):
             self.path_finder.set_kernel(kernel_list)
 
             # cache data
-            cached_costs = self.cost_function.cached["costs"]
-            if cached_costs is None:
-                cached_costs = self.cost_function.create_costs_cache()
-            cost_map = cached_costs["energy"].tolist()
-            self.path_finder.cache_costs(cost_map)
-            obstacle_map = self.env_model.obstacles.astype(int).tolist()
-            self.path_finder.cache_obstacles(obstacle_map)
+            self.cost_function.cache_path_finder_costs(self.path_finder)
+            self.path_finder_obstacles = self.env_model.inflated_obstacles()
+            self.path_finder.cache_obstacles(self.path_finder_obstacles.astype(int).tolist())
+            self.path_finder_version = self.env_model.version
+            clearance = self.env_model.clearance
+            if clearance is not None and clearance.cost_weight:
+                self.path_finder.cache_clearance_costs(clearance.cost().tolist())
+            if self.env_model.cached:
+                # the packed neighbour masks also rule out moves onto cells without data
+                self.path_finder.cache_neighbours(self.env_model.cached_neighbours.tolist())
+
+    def update_path_finder_obstacles(self):
+        """
+        patches the path finder's obstacles (and clearance costs and neighbour masks) if the model's obstacles changed
+        since they were cached, e.g. by set_obstacle_cells or set_circular_obstacle
+        """
+        if self.path_finder_version == self.env_model.version:
+            return
+        obstacles = self.env_model.inflated_obstacles()
+        changed = obstacles != self.path_finder_obstacles
+        self.path_finder.update_obstacles(np.argwhere(changed & obstacles).tolist(), True)
+        self.path_finder.update_obstacles(np.argwhere(changed & ~obstacles).tolist(), False)
+        self.path_finder_obstacles = obstacles
+        self.path_finder_version = self.env_model.version
+        clearance = self.env_model.clearance
+        if clearance is not None and clearance.cost_weight:
+            self.path_finder.cache_clearance_costs(clearance.cost().tolist())
+        if self.env_model.cached:
+            self.path_finder.cache_neighbours(self.env_model.cached_neighbours.tolist())
+
+    def with_model(self, env_model):
+        """
+        solver for another model of the same cells, e.g. an overlay of this one (see GridMeshModel.overlay),
+        reusing this solver's cost layers (or cost tiles). Solvers of different overlays can run side by side
+        """
+        cost_function = self.cost_function
+        costs = cost_function.cached["costs"] if cost_function.cost_tiles is None else cost_function.cost_tiles
+        return astarSolver(env_model, self.explorer_model, self.viz, self.optimize_on,
+                           algorithm_type=self.algorithm_type, heuristic_accelerate=self.heuristic_accelerate,
+                           costs=costs)
 
-    def accelerate(self, weight=10):
-        self.cost_function = ExplorerCost(self.explorer_model, self.env_model, self.optimize_on,
-                                          self.cache, heuristic_accelerate=weight)
+    def worker_state(self, shared_arrays):
+        costs = self.cost_function.cached["costs"]
+        if costs is not None:
+            costs = dict((name, shared_arrays.share(layer)) for name, layer in costs.items())
+        return {
+            'env_model': self.env_model.to_shared(shared_arrays),
+            'costs': costs,
+            'explorer_model': self.explorer_model,
+            'optimize_on': self.optimize_on,
+            'algorithm_type': self.algorithm_type,
+            'heuristic_accelerate': self.heuristic_accelerate,
+            'memory_budget': self.cost_function.memory_budget,
+            'lazy_costs': self.cost_function.cost_tiles is not None,  # each worker keeps its own tiles
+        }
+
+    @classmethod
+    def from_worker_state(cls, state):
+        env_model = GridMeshModel.attach(state['env_model'])
+        costs = state['costs']
+        if costs is not None:
+            costs = dict((name, attach_array(handle, env_model._shared_segments)) for name, handle in costs.items())
+        return cls(env_model, state['explorer_model'], optimize_on=state['optimize_on'],
+                   algorithm_type=state['algorithm_type'], heuristic_accelerate=state['heuristic_accelerate'],
+                   costs=costs, memory_budget=state['memory_budget'], lazy_costs=state['lazy_costs'])
+
+    def worker_point(self, point):
+        row, col = self.env_model.convert_coordinates(point)[0]
+        return int(row), int(col)
+
+    def worker_result(self, search_result):
+        if not search_result:
+            return False
+        derived = [node.derived for node in search_result.nodes]
+        return search_result.raw, derived, list(search_result.expanded_items)
 
-    def solve(self, startpoint, endpoint):
+    def search_from_worker_result(self, result):
+        if not result:
+            return False
+        raw, derived, expanded_items = result
+        env_model = self.env_model
+        nodes = []
+        for state, node_derived in zip(raw, derived):
+            node = MeshSearchElement(env_model._getMeshElement(np.array([state])))
+            node.derived = node_derived
+            nodes.append(node)
+        if len(raw) == 0:
+            coordinates = []
+        else:
+            coordinates = GeoPolygon(env_model.ROW_COL, *np.array(raw).transpose())
+        return sextantSearch(raw, nodes, coordinates, expanded_items)
+
+    def accelerate(self, weight=10):
+        # heuristics are computed per search, so the cost layers (precomputed, bundled or within a memory budget)
+        #   are kept as they are
+        self.heuristic_accelerate = weight
+        self.cost_function.heuristic_accelerate = weight
+
+    def use_profile(self):
+        # another solver may have selected another profile of the model since
+        if self.profile is not None:
+            explorer_type, max_slope = self.profile
+            self.env_model.select_profile(max_slope, explorer_type)
+
+    def solvemultipoint(self, waypoints, processes=1):
+        self.use_profile()
+        return super(astarSolver, self).solvemultipoint(waypoints, processes)
+
+    def solve(self, startpoint, endpoint, search_mask=None):
+        """
+        :param search_mask: optional region to restrict the search to: a boolean [y_size x x_size] array, searches
+            only expand nodes where it is True, or any region GridMeshModel.search_mask accepts (GeoEnvelope,
+            GeoPolygon, shapely polygon)
+        """
+        self.use_profile()
+        if search_mask is not None:
+            search_mask = self.env_model.search_mask(search_mask)
         if self.algorithm_type == astarSolver.CPP_NETWORKX:
             solver = self.solvenx_cpp
+        elif self.algorithm_type == astarSolver.SCIPY_CSGRAPH:
+            solver = self.solvecsgraph
         elif self.algorithm_type == astarSolver.PY_NETWORKX:
             solver = self.solvenx
         else:  # self.algorithm_type == astarSolver.PY_INHOUSE
             solver = self.solveinhouse
-        return solver(startpoint, endpoint)
+        return solver(startpoint, endpoint, search_mask)
 
-    def solveinhouse(self, startpoint, endpoint):
+    def solveinhouse(self, startpoint, endpoint, search_mask=None):
         env_model = self.env_model
         if env_model.elt_hasdata(startpoint) and env_model.elt_hasdata(endpoint):
             node1, node2 = MeshSearchElement(env_model.getMeshElement(startpoint)), \
                            MeshSearchElement(env_model.getMeshElement(endpoint))
-            solution_path, expanded_items = aStarSearch(node1, node2, self.cost_function, self.viz)
+            solution_path, expanded_items = aStarSearch(node1, node2, self.cost_function, self.viz, search_mask)
             raw, nodes = solution_path
             if len(raw) == 0:
                 coordinates = []
@@ -297,7 +610,7 @@ class astarSolver(SEXTANTSolver):
         else:
             return False
 
-    def solvenx(self, startpoint, endpoint):
+    def solvenx(self, startpoint, endpoint, search_mask=None):
         env_model = self.env_model
         cost_function = self.cost_function
         start = env_model.getMeshElement(startpoint).mesh_coordinate
@@ -307,7 +620,8 @@ class astarSolver(SEXTANTSolver):
                 self.G = GG(self)
             cost_function.setEndNode(MeshSearchElement(env_model.getMeshElement(endpoint)))
             try:
-                raw = astar_path(self.G, start, target, lambda a, b: cost_function.getHeuristicCostRaw(a))
+                raw = astar_path(self.G, start, target, lambda a, b: cost_function.getHeuristicCostRaw(a),
+                                 search_mask=search_mask)
                 coordinates = GeoPolygon(self.env_model.COL_ROW, *np.array(raw).transpose()[::-1])
                 search = sextantSearch(raw, [], coordinates, [])
                 self.searches.append(search)
@@ -317,10 +631,11 @@ class astarSolver(SEXTANTSolver):
         else:
             return False
 
-    def solvenx_cpp(self, startpoint, endpoint):
+    def solvenx_cpp(self, startpoint, endpoint, search_mask=None):
 
-        # reset any prior progress
+        # reset any prior progress, and catch up with obstacles set since the last search
         self.path_finder.reset_progress()
+        self.update_path_finder_obstacles()
 
         # get source and target coordinates
         source = self.env_model.getMeshElement(startpoint).mesh_coordinate  # unscaled (row, column)
@@ -333,8 +648,13 @@ class astarSolver(SEXTANTSolver):
             heuristics_map = self.cost_function.create_heuristic_cache(target).tolist()
             self.path_finder.cache_heuristics(heuristics_map)
 
-            # perform search
-            raw = self.path_finder.astar_solve(source, target)
+            # perform search, restricted to the search mask if there is one
+            if search_mask is not None:
+                self.path_finder.cache_search_mask(search_mask.tolist())
+            try:
+                raw = self.path_finder.astar_solve(source, target)
+            finally:
+                self.path_finder.clear_search_mask()
 
             # if we have a good result
             if len(raw) > 0:
@@ -348,32 +668,116 @@ class astarSolver(SEXTANTSolver):
         # default to fail result
         return False
 
+    def get_csgraph(self):
+        # sparse graph of the whole model, weighted by the cost layer we optimize on
+        if self.csgraph is None:
+            self.csgraph = self.env_model.to_csr_graph(self.cost_function.cost_layer())
+        return self.csgraph
+
+    def _masked_csgraph(self, search_mask):
+        # drops the edges into nodes outside the mask; the cached graph itself is left untouched
+        graph = self.get_csgraph()
+        keep = search_mask.ravel()[graph.indices]
+        from_nodes = np.repeat(np.arange(graph.shape[0]), np.diff(graph.indptr))
+        return csr_matrix((graph.data[keep], (from_nodes[keep], graph.indices[keep])), shape=graph.shape)
+
+    def _csgraph_search(self, sources, min_only=False, search_mask=None):
+        graph = self.get_csgraph() if search_mask is None else self._masked_csgraph(search_mask)
+        source_ids = self.env_model.node_ids(sources)
+        return csgraph.dijkstra(graph, indices=source_ids, return_predecessors=True, min_only=min_only)
+
+    def _csgraph_path(self, predecessors, source_id, target_id):
+        # walk back along the predecessor array from target to source
+        if source_id == csgraph_no_path or (target_id != source_id and predecessors[target_id] == csgraph_no_path):
+            return []
+        path_ids = [target_id]
+        while path_ids[-1] != source_id:
+            path_ids.append(predecessors[path_ids[-1]])
+        path_ids.reverse()
+        return list(map(tuple, self.env_model.node_coordinates(np.array(path_ids)).tolist()))
+
+    def _csgraph_points(self, points):
+        env_model = self.env_model
+        mesh_coordinates = []
+        for point in points:
+            if not env_model.elt_hasdata(point):
+                return None
+            mesh_coordinates.append(env_model.getMeshElement(point).mesh_coordinate)
+        return np.array(mesh_coordinates)
+
+    def _csgraph_result(self, raw):
+        if len(raw) == 0:
+            return False
+        # a start that is its own target still needs two points to make a line
+        line = raw if len(raw) > 1 else raw * 2
+        coordinates = GeoPolygon(self.env_model.ROW_COL, *np.array(line).transpose())
+        search = sextantSearch(raw, [], coordinates, [])
+        self.searches.append(search)
+        return search
+
+    def solvecsgraph(self, startpoint, endpoint, search_mask=None):
+        return self.solve_one_to_many(startpoint, [endpoint], search_mask)[0]
+
+    def solve_one_to_many(self, startpoint, endpoints, search_mask=None):
+        """
+        single dijkstra expansion from startpoint, returns one search (or False) per endpoint
+        """
+        return self.solve_many_to_many([startpoint], endpoints, search_mask)[0]
+
+    def solve_many_to_many(self, startpoints, endpoints, search_mask=None):
+        """
+        returns a [len(startpoints) x len(endpoints)] list of searches (False where there is no path), running
+        one dijkstra expansion per start point. search_mask is as for solve()
+        """
+        self.use_profile()
+        sources = self._csgraph_points(startpoints)
+        targets = self._csgraph_points(endpoints)
+        if sources is None or targets is None:
+            return [[False] * len(endpoints) for _ in startpoints]
+        if search_mask is not None:
+            search_mask = self.env_model.search_mask(search_mask)
+        _, predecessors = self._csgraph_search(sources, search_mask=search_mask)
+        target_ids = self.env_model.node_ids(targets)
+        results = []
+        for source_id, source_predecessors in zip(self.env_model.node_ids(sources), predecessors):
+            results.append([self._csgraph_result(self._csgraph_path(source_predecessors, source_id, target_id))
+                            for target_id in target_ids])
+        return results
+
+    def solve_from_nearest(self, startpoints, endpoint, search_mask=None):
+        """
+        multi-source search: returns the best path to endpoint from whichever of startpoints is cheapest
+        """
+        sources = self._csgraph_points(startpoints)
+        targets = self._csgraph_points([endpoint])
+        if sources is None or targets is None:
+            return False
+        if search_mask is not None:
+            search_mask = self.env_model.search_mask(search_mask)
+        _, predecessors, nearest_sources = self._csgraph_search(sources, min_only=True, search_mask=search_mask)
+        target_id = self.env_model.node_ids(targets)[0]
+        return self._csgraph_result(self._csgraph_path(predecessors, nearest_sources[target_id], target_id))
+
     def weight(self, a, b):
-        selection = (np.array(a) + self.env_model.searchKernel.getKernel()).tolist().index(list(b))
-        costs = self.cost_function.cached["costs"]
-        optimize_weights = self.cost_function.optimize_vector
-        optimize_vector = np.array([
-            costs['path'][a][selection],
-            costs['time'][a][selection],
-            costs['energy'][a][selection]
-        ])
-        costs = np.dot(optimize_vector.transpose(), optimize_weights)
-        return costs
+        offset = np.array(b) - np.array(a)
+        kernel = self.env_model.searchKernel.getKernel()
+        selection = np.flatnonzero(np.all(kernel == offset, axis=1))[0]
+        cost_function = self.cost_function
+        return sum(weight * cost_function.layer(name)[a][selection]
+                   for name, weight in zip(COST_LAYERS, cost_function.optimize_vector) if weight != 0)
 
-def generateGraph(em, weightfx):
+def generateGraph(em, edge_costs=None):
+    """builds a networkx DiGraph from the model's sparse graph export (see GridMeshModel.to_csr_graph)"""
     t1 = time()
+    edges = em.to_csr_graph(edge_costs).tocoo()
+    from_rows, from_cols = np.divmod(edges.row, em.x_size)
+    to_rows, to_cols = np.divmod(edges.col, em.x_size)
     G = nx.DiGraph()
     rows, cols = list(range(em.y_size)), list(range(em.x_size))
     G.add_nodes_from((i, j) for i in rows for j in cols)
-    for i in rows:
-        dt = time() - t1
-        #if dt > 60:
-            #print(i)
-        #if i%10 == 0:
-        #    print(i)
-        for j in cols:
-            n = np.array((i,j))+em.searchKernel.getKernel()[em.cached_neighbours[i,j]]
-            G.add_weighted_edges_from(((i,j), tuple(k), weightfx((i,j),tuple(k))) for k in n)
+    G.add_weighted_edges_from(zip(zip(from_rows.tolist(), from_cols.tolist()),
+                                  zip(to_rows.tolist(), to_cols.tolist()),
+                                  edges.data.tolist()))
     t2 = time()
     print((t2-t1))
     return G
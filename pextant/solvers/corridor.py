@@ -0,0 +1,129 @@
+import numpy as np
+import numpy.ma as ma
+from scipy.ndimage import binary_dilation
+from .SEXTANTsolver import SEXTANTSolver
+from .astarMesh import astarSolver
+from pextant.EnvironmentalModel import GridMeshModel
+from pextant.mesh.abstractmesh import NpDataset
+
+
+def block_reduce_model(env_model, factor, obstacle_threshold=0.):
+    """
+    Builds a model at 'factor' times coarser resolution. Coarse elevations are block means, a coarse cell has no
+    data if any of its fine cells has none, and it is an obstacle if more than 'obstacle_threshold' of its fine
+    cells are (by default any, so thin walls are not lost when coarsening).
+
+    :type env_model: GridMeshModel
+    """
+    rows, cols = -(-env_model.y_size // factor), -(-env_model.x_size // factor)  # ceiling division
+    padding = ((0, rows * factor - env_model.y_size), (0, cols * factor - env_model.x_size))
+
+    def blocks(array, pad_value):
+        padded = np.pad(array, padding, mode='constant', constant_values=pad_value)
+        return padded.reshape(rows, factor, cols, factor)
+
+    valid_fraction = blocks(env_model.isvaliddata, False).mean(axis=(1, 3))
+    elevation_sum = blocks(env_model.dataset_unmasked, 0).sum(axis=(1, 3))
+    elevations = elevation_sum / np.maximum(valid_fraction * factor * factor, 1)
+    obstacle_fraction = blocks(env_model.obstacles, True).mean(axis=(1, 3))
+
+    dataset = NpDataset(ma.masked_array(elevations, valid_fraction < 1), env_model.resolution * factor)
+    coarse_model = GridMeshModel(env_model.nw_geo_point, dataset, planet=env_model.planet,
+                                 maxSlope=env_model.maxSlope, kernel_size=env_model.kernel_size,
+                                 kernel_type=env_model.kernel_type, cached=env_model.cached, dtype=env_model.dtype,
+                                 slope_operator=env_model.slope_operator)
+    coarse_model.set_obstacle_map(obstacle_fraction > obstacle_threshold)
+    if coarse_model.cached:
+        coarse_model.cache_neighbours()
+    return coarse_model
+
+
+class corridorSolver(SEXTANTSolver):
+    """
+    Coarse-to-fine solver: plans on a block-reduced copy of the model, dilates the coarse path into a corridor,
+    and runs the full resolution search only inside that corridor.
+
+    The corridor is widened (doubled) and the search repeated while the restricted search fails, or while the
+    path found runs along the corridor's edge (a sign the corridor is cutting off better paths) and widening
+    still improves its cost by more than 'tolerance' (relative). If no path is found inside the widest corridor,
+    an unrestricted search is run, so the solver never misses a path the plain solver would find.
+    """
+    def __init__(self, env_model, explorer_model, viz=None, optimize_on='Energy', coarsening=4, corridor_width=2,
+                 max_widenings=3, tolerance=0.01, heuristic_accelerate=1):
+        self.fine_solver = astarSolver(env_model, explorer_model, viz, optimize_on,
+                                       heuristic_accelerate=heuristic_accelerate)
+        self.coarse_model = block_reduce_model(env_model, coarsening)
+        self.coarse_solver = astarSolver(self.coarse_model, explorer_model, optimize_on=optimize_on,
+                                         heuristic_accelerate=heuristic_accelerate)
+        self.coarsening = coarsening
+        self.corridor_width = corridor_width  # in coarse cells
+        self.max_widenings = max_widenings
+        self.tolerance = tolerance
+        super(corridorSolver, self).__init__(env_model, self.fine_solver.cost_function, viz)
+
+    def solve(self, startpoint, endpoint):
+        env_model = self.env_model
+        if not (env_model.elt_hasdata(startpoint) and env_model.elt_hasdata(endpoint)):
+            return False
+        start = np.array(env_model.getMeshElement(startpoint).mesh_coordinate)
+        end = np.array(env_model.getMeshElement(endpoint).mesh_coordinate)
+
+        coarse_search = self.coarse_solver.solve(tuple(start // self.coarsening), tuple(end // self.coarsening))
+        if not coarse_search or len(coarse_search.raw) == 0:
+            return self._fallback(start, end, [])
+
+        coarse_path = np.array(coarse_search.raw)
+        best_search, best_cost = False, np.inf
+        expanded_items = []
+        width = self.corridor_width
+        for _ in range(self.max_widenings + 1):
+            corridor = self.corridor_mask(coarse_path, width, start, end)
+            search = self.fine_solver.solve(tuple(start), tuple(end), search_mask=corridor)
+            expanded_items += list(search.expanded_items) if search else []
+            if search and len(search.raw) > 0:
+                cost = self.path_cost(search)
+                improvement = (best_cost - cost) / cost
+                if cost < best_cost:
+                    best_search, best_cost = search, cost
+                if not self.touches_edge(search.raw, corridor) or improvement <= self.tolerance:
+                    break
+            width = max(2 * width, 1)
+
+        if not best_search:
+            return self._fallback(start, end, expanded_items)
+        best_search.expanded_items = expanded_items  # report the work of every attempt
+        self.searches.append(best_search)
+        return best_search
+
+    def _fallback(self, start, end, expanded_items):
+        # unrestricted search
+        search = self.fine_solver.solve(tuple(start), tuple(end))
+        if search:
+            search.expanded_items = expanded_items + list(search.expanded_items)
+            self.searches.append(search)
+        return search
+
+    def corridor_mask(self, coarse_path, width, start, end):
+        """fine resolution boolean mask of the coarse path, dilated by 'width' coarse cells"""
+        coarse_mask = np.zeros(self.coarse_model.shape, dtype=bool)
+        coarse_mask[coarse_path[:, 0], coarse_path[:, 1]] = True
+        if width > 0:  # (binary_dilation dilates until nothing changes for iterations=0)
+            coarse_mask = binary_dilation(coarse_mask, np.ones((3, 3), dtype=bool), iterations=width)
+        factor = self.coarsening
+        mask = coarse_mask.repeat(factor, axis=0).repeat(factor, axis=1)[:self.env_model.y_size,
+                                                                         :self.env_model.x_size]
+        mask[tuple(start)] = mask[tuple(end)] = True
+        return mask
+
+    def touches_edge(self, raw, corridor):
+        # path runs next to passable cells that were excluded from the search
+        excluded = np.logical_and(np.logical_not(corridor), self.env_model.passable)
+        constraining = np.logical_and(binary_dilation(excluded, np.ones((3, 3), dtype=bool)), corridor)
+        rows, cols = np.array(raw).transpose()
+        return constraining[rows, cols].any()
+
+    def path_cost(self, search):
+        optimize_vector = self.cost_function.optimize_vector
+        costs = [np.dot([node.derived['pathlength'], node.derived['time'], node.derived['energy']], optimize_vector)
+                 for node in search.nodes[1:]]
+        return np.sum(costs)
@@ -0,0 +1,87 @@
+"""
+Edge costs computed a tile at a time, the first time a search reaches the tile, for models too large for
+ExplorerCost.create_costs_cache over the whole grid. Tiles are kept in a least recently used memo up to a budget in
+bytes, so memory follows the area searches explore rather than the size of the model.
+"""
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# side, in cells, of the tiles costs are computed by
+DEFAULT_COST_TILE_SIZE = 256
+
+# default memory budget of the memo, in bytes
+DEFAULT_COST_TILES_BYTES = 256 * 2**20
+
+
+class CostTiles(object):
+    """
+    Cost layers of a cost function's model, by tile. Tiles are computed with ExplorerCost.create_costs_cache
+    (vectorized over the tile) and can be read from several threads, and by the C++ path finder (see
+    astarSolver and PathFinder.set_cost_tiles).
+    """
+    def __init__(self, cost_function, layers, tile_size=DEFAULT_COST_TILE_SIZE, cache_bytes=DEFAULT_COST_TILES_BYTES,
+                 dtype=None):
+        """
+        :type cost_function: pextant.solvers.astarMesh.ExplorerCost
+        :param layers: names of the layers to compute (see COST_LAYERS)
+        :param dtype: precision of the layers, defaults to the model's
+        """
+        self.cost_function = cost_function
+        self.layers = list(layers)
+        self.tile_size = tile_size
+        self.cache_bytes = cache_bytes
+        self.dtype = None if dtype is None else np.dtype(dtype)  # np.float32 and the like are types, not dtypes
+        self.y_size, self.x_size = cost_function.map.shape
+        self.tiles = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.RLock()
+
+    @property
+    def max_tiles(self):
+        """number of (full size) tiles the budget holds, at least one"""
+        cost_map = self.cost_function.map
+        kernel_size = len(cost_map.searchKernel.getKernel())
+        itemsize = np.dtype(cost_map.dtype if self.dtype is None else self.dtype).itemsize
+        return max(1, self.cache_bytes // (len(self.layers) * self.tile_size**2 * kernel_size * itemsize))
+
+    def tile(self, tile_row, tile_col):
+        """{layer name: [rows x cols x kernel size] costs} of the cells of tile (tile_row, tile_col)"""
+        with self.lock:
+            key = (tile_row, tile_col)
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                return tile
+
+            tile_size = self.tile_size
+            window = (tile_row * tile_size, min((tile_row + 1) * tile_size, self.y_size),
+                      tile_col * tile_size, min((tile_col + 1) * tile_size, self.x_size))
+            tile = self.cost_function.create_costs_cache(self.layers, self.dtype, window)
+            self.tiles[key] = tile
+            self.nbytes += sum(layer.nbytes for layer in tile.values())
+
+            # evict least recently used tiles, but always keep the one just computed
+            while self.nbytes > self.cache_bytes and len(self.tiles) > 1:
+                _, evicted = self.tiles.popitem(last=False)
+                self.nbytes -= sum(layer.nbytes for layer in evicted.values())
+            return tile
+
+    def layer_tile(self, name, tile_row, tile_col, dtype=None):
+        """
+        [rows x cols x kernel size] costs of layer 'name' in tile (tile_row, tile_col), converted to 'dtype' if
+        given (the C++ path finder takes float32 tiles, which only need a copy if the layers are float64)
+        """
+        layer = self.tile(tile_row, tile_col)[name]
+        return layer if dtype is None else np.ascontiguousarray(layer, dtype=dtype)
+
+    def costs(self, row, col):
+        """{layer name: costs from cell (row, col) to each of its neighbours, by kernel index}"""
+        tile_size = self.tile_size
+        tile = self.tile(row // tile_size, col // tile_size)
+        return dict((name, layer[row % tile_size, col % tile_size]) for name, layer in tile.items())
+
+    def clear(self):
+        with self.lock:
+            self.tiles = OrderedDict()
+            self.nbytes = 0
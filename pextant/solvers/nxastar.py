@@ -7,14 +7,14 @@ import numpy as np
 class GG:
     def __init__(self, solver):
         self.em = solver.env_model
-        self.costfx = solver.cost_function.cached["costs"]["energy"]
+        # the sparse graph already holds every node's neighbours and weights, so lookups are just slices
+        self.graph = solver.get_csgraph()
 
     def n(self, node):
-        traversable_neighbors = self.em.cached_neighbours[node]
-        search_kernal = self.em.searchKernel.getKernel()[traversable_neighbors]
-        neighbors = np.array(node) + search_kernal
-        w = self.costfx[node[0], node[1], traversable_neighbors]
-        return list(zip(list(map(tuple, neighbors)), w.tolist()))
+        node_id = node[0] * self.em.x_size + node[1]
+        start, end = self.graph.indptr[node_id], self.graph.indptr[node_id + 1]
+        rows, cols = np.divmod(self.graph.indices[start:end], self.em.x_size)
+        return list(zip(zip(rows.tolist(), cols.tolist()), self.graph.data[start:end].tolist()))
 
 # Based on networkx's implementation, which cant be used out of
 # the box due to networkx's underlying Graph structure.
@@ -25,7 +25,8 @@ class GG:
 #    All rights reserved.
 #    BSD license.
 
-def astar_path(G, source, target, heuristic=None, weight='weight'):
+def astar_path(G, source, target, heuristic=None, weight='weight', search_mask=None):
+    # search_mask: optional boolean array indexed by node, only nodes where it is True get expanded
     if heuristic is None:
         # The default heuristic is h=0 - same as Dijkstra's algorithm
         def heuristic(u, v):
@@ -70,6 +71,8 @@ def astar_path(G, source, target, heuristic=None, weight='weight'):
         for neighbor, w in G.n(curnode):
             if neighbor in explored:
                 continue
+            if search_mask is not None and not search_mask[neighbor]:
+                continue
             ncost = dist + w
             if neighbor in enqueued:
                 qcost, h = enqueued[neighbor]
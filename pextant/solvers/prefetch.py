@@ -0,0 +1,147 @@
+"""
+Background loading of the legs of a plan. Once a plan's waypoints are known (e.g. from JSONloader.get_waypoints),
+every leg's window is read (warming the mesh's block or tile cache), turned into a model (slopes, obstacles) and
+given its cost layers on a small thread pool, in leg order, so that solving a leg interactively finds it ready.
+"""
+import itertools
+import threading
+from queue import PriorityQueue
+from .SEXTANTsolver import sextantSearchList
+from .adaptive import adaptiveSolver
+from pextant.lib.geoshapely import GeoPolygon
+
+DEFAULT_PREFETCH_THREADS = 2
+
+
+class PrefetchLeg(object):
+    """a leg of the plan, and the adaptiveSolver its window gets loaded into"""
+    PENDING, RUNNING, DONE = range(3)
+
+    def __init__(self, solver, waypoints):
+        self.solver = solver
+        self.waypoints = waypoints
+        self.state = PrefetchLeg.PENDING
+        self.error = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def claim(self):
+        """True for the one caller that gets to load the leg"""
+        with self._lock:
+            if self.state != PrefetchLeg.PENDING:
+                return False
+            self.state = PrefetchLeg.RUNNING
+            return True
+
+    def load(self):
+        try:
+            self.solver.load(self.solver.initial_envelope(self.waypoints))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.state = PrefetchLeg.DONE
+            self.done.set()
+
+    def cancel(self):
+        if self.claim():
+            self.state = PrefetchLeg.DONE
+            self.done.set()
+
+
+class Prefetcher(object):
+    """
+    Loads the legs of a plan on background threads, each into its own adaptiveSolver. Legs are loaded in plan
+    order, except that prioritize moves a leg to the front; asking for a leg that is not loaded yet loads it right
+    away (or waits for the thread already loading it).
+    """
+    def __init__(self, mesh, explorer_model, threads=DEFAULT_PREFETCH_THREADS, **solver_options):
+        """
+        :param mesh: unloaded mesh, preferably lazy (GDALMesh(lazy=True), MosaicMesh) so that blocks read for one
+            leg are reused by its neighbours
+        :param solver_options: arguments of adaptiveSolver (optimize_on, margin, maxSlope, cached...)
+        """
+        self.mesh = mesh
+        self.explorer_model = explorer_model
+        self.threads = threads
+        self.solver_options = solver_options
+        self.waypoints = None
+        self.legs = []
+        self.queue = PriorityQueue()
+        self.counter = itertools.count()  # ties broken by submission order
+        self.workers = []
+
+    def prefetch(self, waypoints):
+        """
+        starts loading every leg between consecutive waypoints, dropping the legs of any previous plan. The same
+        waypoints again keep the legs already loaded
+        """
+        if self.same_waypoints(waypoints):
+            return
+        self.cancel()
+        self.waypoints = waypoints
+        self.legs = [PrefetchLeg(adaptiveSolver(self.mesh, self.explorer_model, **self.solver_options),
+                                 GeoPolygon([waypoints[i], waypoints[i + 1]])) for i in range(len(waypoints) - 1)]
+        for i, leg in enumerate(self.legs):
+            self.queue.put((i, next(self.counter), leg))
+        self._start_workers()
+
+    def same_waypoints(self, waypoints):
+        return self.waypoints is not None and \
+            self.waypoints.utm_reference.proj_key == waypoints.utm_reference.proj_key and \
+            list(self.waypoints.coords) == list(waypoints.coords)
+
+    def prioritize(self, leg_index):
+        """loads leg 'leg_index' before any other leg still waiting"""
+        if 0 <= leg_index < len(self.legs):
+            self.queue.put((-1, -next(self.counter), self.legs[leg_index]))
+
+    def leg_solver(self, leg_index):
+        """adaptiveSolver of a leg, with its window loaded"""
+        leg = self.legs[leg_index]
+        if leg.claim():
+            leg.load()
+        else:
+            leg.done.wait()
+        if leg.error is not None:
+            raise leg.error
+        return leg.solver
+
+    def solve_leg(self, leg_index):
+        solver = self.leg_solver(leg_index)
+        # the next leg loads while this one is solved
+        self.prioritize(leg_index + 1)
+        return solver.solve(self.waypoints[leg_index], self.waypoints[leg_index + 1])
+
+    def solvemultipoint(self):
+        """solves all the legs, same results as SEXTANTSolver.solvemultipoint but each leg refers to its own model"""
+        search_list = sextantSearchList(self.waypoints)
+        for i in range(len(self.legs)):
+            search_list.append(self.solve_leg(i))
+        return search_list, search_list.raw(), search_list.itemssrchd()
+
+    def cancel(self):
+        """drops the legs not loaded yet"""
+        for leg in self.legs:
+            leg.cancel()
+
+    def shutdown(self):
+        self.cancel()
+        for _ in self.workers:
+            self.queue.put((float('inf'), next(self.counter), None))
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def _start_workers(self):
+        while len(self.workers) < self.threads:
+            worker = threading.Thread(target=self._work, name='pextant-prefetch', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def _work(self):
+        while True:
+            _, _, leg = self.queue.get()
+            if leg is None:
+                return
+            if leg.claim():
+                leg.load()
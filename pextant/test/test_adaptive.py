@@ -0,0 +1,98 @@
+import unittest
+from unittest import mock
+import numpy as np
+from pextant.EnvironmentalModel import GridMesh
+from pextant.explorers import Astronaut
+from pextant.lib.geoshapely import GeoPoint, GeoPolygon, UTM
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.solvers.adaptive import adaptiveSolver
+from pextant.solvers.prefetch import Prefetcher
+
+class TestAdaptiveSolver(unittest.TestCase):
+
+	def setUp(self):
+		# flat terrain, with a wall between the waypoints that paths can only go around by its lower end
+		terrain = np.zeros((100, 100))
+		terrain[:70, 48:52] = 50
+		self.grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), NpDataset(terrain, 1.0))
+		self.explorer = Astronaut(80)
+
+	def waypoints(self, cells):
+		rows, cols = np.array(cells, dtype=float).transpose()
+		return GeoPolygon(UTM(5), 300000 + cols, 2100000 - rows)
+
+	def test_grows_around_wall(self):
+		solver = adaptiveSolver(self.grid_mesh, self.explorer, margin=5, maxSlope=15, cached=True)
+		search_list, rawpoints, _ = solver.solvemultipoint(self.waypoints([(10, 40), (10, 60)]))
+		search = search_list.list[0]
+		self.assertTrue(search and len(search.raw) > 0)
+		rows = np.array(search.raw)[:, 0] + solver.env_model.yoff
+		self.assertGreaterEqual(rows.max(), 70)
+		self.assertFalse(solver.needs_growth(self.waypoints([(10, 40), (10, 60)]), search_list))
+
+	def test_tight_window_kept(self):
+		solver = adaptiveSolver(self.grid_mesh, self.explorer, margin=5, maxSlope=15, cached=True)
+		search_list, _, _ = solver.solvemultipoint(self.waypoints([(80, 20), (85, 30)]))
+		self.assertTrue(search_list.list[0])
+		self.assertLess(solver.env_model.size, self.grid_mesh.x_size * self.grid_mesh.y_size / 4)
+
+	def test_prefetched_legs(self):
+		prefetcher = Prefetcher(self.grid_mesh, self.explorer, margin=5, maxSlope=15, cached=True)
+		prefetcher.prefetch(self.waypoints([(80, 20), (85, 30), (90, 10)]))
+		env_model = prefetcher.leg_solver(1).env_model
+		self.assertIsNotNone(env_model)
+		search_list, _, _ = prefetcher.solvemultipoint()
+		self.assertTrue(all(search_list.list))
+		# solving reused the model loaded ahead
+		self.assertIs(prefetcher.legs[1].solver.env_model, env_model)
+		prefetcher.shutdown()
+	def test_grown_model_matches_fresh_load(self):
+		solver = adaptiveSolver(self.grid_mesh, self.explorer, margin=5, maxSlope=15, cached=True)
+		envelopes = []
+		original_load = adaptiveSolver.load
+		def load(solver, envelope):
+			envelopes.append(envelope)
+			return original_load(solver, envelope)
+		with mock.patch.object(adaptiveSolver, 'load', load):
+			solver.solvemultipoint(self.waypoints([(10, 40), (10, 60)]))
+		self.assertGreater(len(envelopes), 1)
+		env_model = solver.env_model
+		fresh_solver = adaptiveSolver(self.grid_mesh, self.explorer, margin=5, maxSlope=15, cached=True)
+		fresh = fresh_solver.load(envelopes[-1])
+		fresh_solver.solver.cost_function.cache_costs()
+		self.assertEqual((fresh.xoff, fresh.yoff, fresh.shape), (env_model.xoff, env_model.yoff, env_model.shape))
+		np.testing.assert_allclose(env_model.slopes, fresh.slopes)
+		np.testing.assert_array_equal(env_model.obstacle_mask(), fresh.obstacle_mask())
+		for name, layer in solver.cost_function.cached['costs'].items():
+			np.testing.assert_allclose(layer, fresh_solver.cost_function.cached['costs'][name], err_msg=name)
+
+	def test_only_growing_legs_resolved(self):
+		solver = adaptiveSolver(self.grid_mesh, self.explorer, margin=5, maxSlope=15, cached=True)
+		# the first leg stays well away from the wall, the second has to go around it
+		waypoints = self.waypoints([(10, 10), (20, 15), (10, 40), (10, 60)])
+		solved = []
+		original_load = adaptiveSolver.load
+		def load(solver, envelope):
+			env_model = original_load(solver, envelope)
+			original_solve = solver.solver.solve
+			def solve(start, end):
+				solved.append(start)
+				return original_solve(start, end)
+			solver.solver.solve = solve
+			return env_model
+		with mock.patch.object(adaptiveSolver, 'load', load):
+			search_list, rawpoints, _ = solver.solvemultipoint(waypoints)
+		self.assertTrue(all(search_list.list))
+		self.assertGreater(len(solved), 3)
+		# after the first pass, only the legs around the wall are solved again
+		first_leg = waypoints[0].to(UTM(5))
+		self.assertEqual(sum(np.allclose(start.to(UTM(5)), first_leg) for start in solved), 1)
+		self.assertEqual(len(rawpoints), sum(len(search.raw) for search in search_list.list))
+		# kept legs were moved into the grown model's cells
+		fresh = adaptiveSolver(self.grid_mesh, self.explorer, margin=5, maxSlope=15, cached=True)
+		direct = fresh.solve(waypoints[0], waypoints[1])
+		np.testing.assert_allclose(search_list.list[0].coordinates.to(UTM(5)), direct.coordinates.to(UTM(5)))
+
+if __name__ == "__main__":
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestAdaptiveSolver)
+	unittest.TextTestRunner(verbosity=2).run(suite)
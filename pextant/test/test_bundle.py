@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from pextant.backend_app.path_manager import PathManager
+from pextant.EnvironmentalModel import GridMesh
+from pextant.explorers import Astronaut
+from pextant.lib.geoshapely import GeoPoint, UTM
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.mesh.bundle import HEADER_FILE, load_bundled, read_bundle, write_bundle
+from pextant.solvers.astarMesh import ExplorerCost
+from pextant.test.test_float32 import smooth_terrain
+
+BACKEND_APP_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend_app')
+
+class TestBundles(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), NpDataset(smooth_terrain(40), 1.0))
+		self.explorer = Astronaut(80)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def compile_model(self, max_slope=35):
+		model = self.grid_mesh.loadSubSection(maxSlope=max_slope, cached=True)
+		return model, ExplorerCost(self.explorer, model, 'Energy', cached=True).cached['costs']
+
+	def test_round_trip(self):
+		model, costs = self.compile_model()
+		bundle_directory = os.path.join(self.directory, 'model')
+		write_bundle(bundle_directory, model, {'source': 'test'}, costs)
+		bundled_model, bundled_costs = read_bundle(bundle_directory, {'source': 'test'})
+		for name, array in model._arrays().items():
+			np.testing.assert_array_equal(bundled_model._arrays()[name], array)
+		for name, layer in costs.items():
+			np.testing.assert_array_equal(bundled_costs[name], layer)
+		self.assertEqual(bundled_model._parameters(), model._parameters())
+		self.assertIsNone(read_bundle(bundle_directory, {'source': 'other'}))
+
+	def test_reuse_across_max_slopes(self):
+		bundle_directory = os.path.join(self.directory, 'model')
+		compiled = []
+		def compile_model():
+			compiled.append(True)
+			return self.compile_model()
+		load_bundled(bundle_directory, {'source': 'test', 'max_slope': None}, compile_model)
+		model, _ = load_bundled(bundle_directory, {'source': 'test', 'max_slope': None}, compile_model)
+		self.assertEqual(len(compiled), 1)
+		# other max slopes are profiles derived from the bundled slopes
+		model.select_profile(5)
+		expected, _ = self.compile_model(5)
+		np.testing.assert_array_equal(model.obstacles, expected.obstacles)
+		np.testing.assert_array_equal(model.cached_neighbours, expected.cached_neighbours)
+
+	def test_unwritable_directory(self):
+		# bundles can't be written under a file (as under a read-only install), the compiled model is used instead
+		blocking_file = os.path.join(self.directory, 'file')
+		open(blocking_file, 'w').close()
+		compiled = self.compile_model()
+		model, costs = load_bundled(os.path.join(blocking_file, 'model'), {'source': 'test'}, lambda: compiled)
+		self.assertIs(model, compiled[0])
+		self.assertIs(costs, compiled[1])
+		self.assertEqual(os.listdir(self.directory), ['file'])
+
+	def test_partial_bundle_removed(self):
+		model, _ = self.compile_model()
+		bundle_directory = os.path.join(self.directory, 'model')
+		with mock.patch('json.dump', side_effect=OSError('disk full')):
+			bundled_model, _ = load_bundled(bundle_directory, {'source': 'test'}, lambda: (model, None))
+		self.assertIs(bundled_model, model)
+		self.assertEqual(os.listdir(self.directory), [])
+
+	def test_path_manager_bundles(self):
+		class Manager(object):
+			def register_component(self, component):
+				pass
+		working_directory, bundles_directory = os.getcwd(), PathManager.BUNDLES_DIRECTORY
+		os.chdir(BACKEND_APP_DIRECTORY)
+		PathManager.BUNDLES_DIRECTORY = self.directory
+		try:
+			path_manager = PathManager(Manager(), False)
+			path_manager.load_model('tutorial.txt', 15, False)
+			header_path = os.path.join(self.directory, 'tutorial.txt', HEADER_FILE)
+			modified = os.stat(header_path).st_mtime_ns
+			# a cache miss for another max slope reads the same bundle rather than rewriting it
+			path_manager.model_cache.clear()
+			path_manager.load_model('tutorial.txt', 25, False)
+			self.assertEqual(os.stat(header_path).st_mtime_ns, modified)
+			self.assertEqual(path_manager.terrain_model.maxSlope, 25)
+		finally:
+			os.chdir(working_directory)
+			PathManager.BUNDLES_DIRECTORY = bundles_directory
+
+if __name__ == "__main__":
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestBundles)
+	unittest.TextTestRunner(verbosity=2).run(suite)
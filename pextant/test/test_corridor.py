@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+from pextant.EnvironmentalModel import GridMesh
+from pextant.explorers import Astronaut
+from pextant.lib.geoshapely import GeoPoint, UTM
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.solvers.astarMesh import astarSolver
+from pextant.solvers.corridor import corridorSolver
+from pextant.test.test_float32 import smooth_terrain
+
+class TestCorridorSolver(unittest.TestCase):
+
+	def setUp(self):
+		self.explorer = Astronaut(80)
+
+	def model(self, terrain):
+		grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), NpDataset(terrain, 1.0))
+		return grid_mesh.loadSubSection(maxSlope=35, cached=True)
+
+	def test_widening_finds_unrestricted_path(self):
+		for seed in (0, 2):
+			model = self.model(smooth_terrain(80, seed))
+			search = astarSolver(model, self.explorer, cached=True).solve((5, 5), (75, 70))
+			# the narrowest corridor (the coarse path's own cells) cuts the best path off, and is widened
+			corridor_search = corridorSolver(model, self.explorer, corridor_width=0, tolerance=0).solve((5, 5), (75, 70))
+			self.assertEqual(corridor_search.raw, search.raw)
+			self.assertLess(len(corridor_search.expanded_items), len(search.expanded_items))
+
+	def test_unrestricted_fallback(self):
+		# a wall with a gap narrower than a coarse cell: no coarse path, the solver falls back to a full search
+		terrain = np.zeros((60, 60))
+		terrain[:, 29:31] = 50
+		terrain[41:43, 29:31] = 0
+		model = self.model(terrain)
+		search = astarSolver(model, self.explorer, cached=True).solve((10, 10), (10, 50))
+		corridor_search = corridorSolver(model, self.explorer).solve((10, 10), (10, 50))
+		self.assertTrue(search and corridor_search)
+		self.assertEqual(corridor_search.raw, search.raw)
+
+if __name__ == "__main__":
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestCorridorSolver)
+	unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+from pextant.EnvironmentalModel import GridMesh
+from pextant.explorers import Astronaut
+from pextant.lib.geoshapely import GeoPoint, UTM
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.solvers.astarMesh import astarSolver
+from pextant.solvers.costtiles import CostTiles
+
+class TestCostTiles(unittest.TestCase):
+
+	def setUp(self):
+		rows, cols = np.mgrid[:90, :90]
+		terrain = 4 * np.sin(rows / 9.) + 3 * np.cos(cols / 7.)
+		grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), NpDataset(terrain, 1.0))
+		self.model = grid_mesh.loadSubSection(maxSlope=35, cached=True)
+		self.explorer = Astronaut(80)
+
+	def test_tiles_match_cache(self):
+		costs = astarSolver(self.model, self.explorer, cached=True).cost_function.cached['costs']
+		cost_function = astarSolver(self.model, self.explorer, cached=True, lazy_costs=True).cost_function
+		cost_tiles = cost_function.cost_tiles
+		cost_tiles.tile_size = 32
+		self.assertIsNone(cost_function.cached['costs'])
+		for name, layer in cost_tiles.tile(1, 2).items():
+			np.testing.assert_array_equal(layer, costs[name][32:64, 64:90])
+		np.testing.assert_array_equal(cost_tiles.costs(70, 5)['energy'], costs['energy'][70, 5])
+
+	def test_scalar_type_dtype(self):
+		cost_function = astarSolver(self.model, self.explorer, cached=True, lazy_costs=True).cost_function
+		cost_tiles = CostTiles(cost_function, ['energy'], tile_size=32, cache_bytes=2 * 32 * 32 * 8 * 4, dtype=np.float32)
+		self.assertEqual(cost_tiles.max_tiles, 2)
+		self.assertEqual(cost_tiles.tile(0, 0)['energy'].dtype, np.float32)
+
+	def test_lazy_paths(self):
+		search = astarSolver(self.model, self.explorer, cached=True).solve((5, 5), (20, 25))
+		lazy_solver = astarSolver(self.model, self.explorer, cached=True, lazy_costs=True)
+		lazy_solver.cost_function.cost_tiles.tile_size = 16
+		lazy_search = lazy_solver.solve((5, 5), (20, 25))
+		self.assertEqual(lazy_search.raw, search.raw)
+		# only the tiles around the path were computed, out of 36
+		self.assertLess(len(lazy_solver.cost_function.cost_tiles.tiles), 12)
+
+	def test_cpp_tiles(self):
+		search = astarSolver(self.model, self.explorer, cached=True, algorithm_type=astarSolver.CPP_NETWORKX).solve(
+			(5, 5), (80, 70))
+		lazy_solver = astarSolver(self.model, self.explorer, cached=True, lazy_costs=True,
+			algorithm_type=astarSolver.CPP_NETWORKX)
+		cost_tiles = lazy_solver.cost_function.cost_tiles
+		cost_tiles.tile_size = 16
+		fetched = []
+		def provider(tile_row, tile_col):
+			fetched.append((tile_row, tile_col))
+			return cost_tiles.layer_tile('energy', tile_row, tile_col, dtype=np.float32)
+		# the path finder holds at most 4 tiles, evicting the least recently used
+		lazy_solver.path_finder.set_cost_tiles(90, 90, 16, provider, 4)
+		lazy_search = lazy_solver.solve((5, 5), (80, 70))
+		self.assertEqual(lazy_search.raw, search.raw)
+		self.assertLessEqual(lazy_solver.path_finder.memory_report()['cost_tiles'], 4 * 16 * 16 * 8 * 4)
+		# (tiles evicted and reached again are fetched again)
+		self.assertGreater(len(fetched), len(set(fetched)))
+
+if __name__ == "__main__":
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestCostTiles)
+	unittest.TextTestRunner(verbosity=2).run(suite)
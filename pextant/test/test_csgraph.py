@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+from pextant.EnvironmentalModel import GridMesh
+from pextant.explorers import Astronaut
+from pextant.lib.geoshapely import GeoPoint, UTM
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.solvers.astarMesh import astarSolver
+from pextant.test.test_float32 import smooth_terrain
+
+class TestCsgraphSolver(unittest.TestCase):
+
+	def setUp(self):
+		grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), NpDataset(smooth_terrain(50), 1.0))
+		self.model = grid_mesh.loadSubSection(maxSlope=35, cached=True)
+		self.explorer = Astronaut(80)
+		self.solver = astarSolver(self.model, self.explorer, cached=True, algorithm_type=astarSolver.SCIPY_CSGRAPH)
+
+	def path_cost(self, raw):
+		return sum(self.solver.weight(a, b) for a, b in zip(raw[:-1], raw[1:]))
+
+	def test_graph_edges(self):
+		graph = self.solver.get_csgraph()
+		self.assertEqual(graph.shape, (self.model.size, self.model.size))
+		# one edge per passable neighbour, weighted like the cost function
+		self.assertEqual(graph.nnz, self.model.neighbour_mask().sum())
+		a, b = (10, 10), (11, 11)
+		self.assertAlmostEqual(graph[self.model.node_ids([a])[0], self.model.node_ids([b])[0]], self.solver.weight(a, b))
+
+	def test_cost_matches_astar(self):
+		astar = astarSolver(self.model, self.explorer, cached=True)
+		for start, end in [((5, 5), (45, 40)), ((40, 3), (2, 47))]:
+			search = self.solver.solve(start, end)
+			astar_search = astar.solve(start, end)
+			self.assertEqual(search.raw[0], start)
+			self.assertEqual(search.raw[-1], end)
+			self.assertAlmostEqual(self.path_cost(search.raw), self.path_cost(astar_search.raw), places=6)
+
+	def test_one_to_many(self):
+		ends = [(45, 40), (2, 47), (25, 25)]
+		searches = self.solver.solve_one_to_many((5, 5), ends)
+		for end, search in zip(ends, searches):
+			self.assertEqual(search.raw, self.solver.solve((5, 5), end).raw)
+		nearest = self.solver.solve_from_nearest([(40, 3), (24, 24)], (25, 25))
+		self.assertEqual(nearest.raw[0], (24, 24))
+
+if __name__ == "__main__":
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestCsgraphSolver)
+	unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,141 @@
+import unittest
+import numpy as np
+from osgeo import gdal_array
+from pextant.EnvironmentalModel import GDALDataset, GridMesh
+from pextant.explorers import Astronaut
+from pextant.lib.geoshapely import GeoPoint, UTM
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.lib.memory import report_total
+from pextant.solvers.astarMesh import astarSolver
+
+def smooth_terrain(size=80, seed=0):
+	# smoothed noise, gentle enough for paths to exist across the whole map
+	rng = np.random.RandomState(seed)
+	terrain = rng.normal(size=(size, size))
+	for axis in (0, 1):
+		for _ in range(20):
+			terrain = (np.roll(terrain, 1, axis) + terrain + np.roll(terrain, -1, axis)) / 3
+	return terrain * 15
+
+class RasterBand(object):
+	"""single band in memory raster, that converts what it reads into the buffer type it is asked for (as gdal does)"""
+	def __init__(self, array, nodata):
+		self.array = array
+		self.YSize, self.XSize = array.shape
+		self.DataType = gdal_array.NumericTypeCodeToGDALTypeCode(array.dtype)
+		self.nodata = nodata
+		self.buf_types = []
+
+	def GetRasterBand(self, index):
+		return self
+
+	def GetNoDataValue(self):
+		return self.nodata
+
+	def GetBlockSize(self):
+		return [self.XSize, 1]
+
+	def GetOverviewCount(self):
+		return 0
+
+	def ReadAsArray(self, x_offset, y_offset, x_size, y_size, buf_x, buf_y, buf_type=None, resample_alg=None):
+		self.buf_types.append(buf_type)
+		window = self.array[int(y_offset):int(y_offset + y_size), int(x_offset):int(x_offset + x_size)]
+		return window.copy() if buf_type is None else window.astype(gdal_array.GDALTypeCodeToNumericTypeCode(buf_type))
+
+class TestFloat32Pipeline(unittest.TestCase):
+
+	def setUp(self):
+		grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), NpDataset(smooth_terrain(), 1.0))
+		self.models = dict((dtype, grid_mesh.loadSubSection(maxSlope=35, cached=True, dtype=dtype))
+			for dtype in (np.float64, np.float32))
+		self.explorer = Astronaut(80)
+
+	def test_dtypes(self):
+		model = self.models[np.float32]
+		self.assertEqual(model.data.dtype, np.float32)
+		self.assertEqual(model.slopes.dtype, np.float32)
+		costs = astarSolver(model, self.explorer, cached=True).cost_function.cached['costs']
+		for layer in costs.values():
+			self.assertEqual(layer.dtype, np.float32)
+
+	def test_path_costs_match(self):
+		totals = {}
+		for dtype, model in self.models.items():
+			search = astarSolver(model, self.explorer, cached=True).solve((5, 5), (70, 72))
+			self.assertTrue(search and len(search.raw) > 0)
+			totals[dtype] = sum(node.derived['energy'] for node in search.nodes[1:])
+		self.assertAlmostEqual(totals[np.float32] / totals[np.float64], 1, places=4)
+
+	def test_memory_budget(self):
+		model = self.models[np.float64]
+		model_bytes = report_total(model.memory_report())
+		layer_bytes = model.size * len(model.searchKernel.getKernel()) * 4
+		solvers = [astarSolver(model, self.explorer, cached=True, memory_budget=budget)
+			for budget in (None, model_bytes + layer_bytes, model_bytes)]
+
+		# over budget, only the energy layer is kept in float32, then no layer at all
+		costs = [solver.cost_function.cached['costs'] for solver in solvers]
+		self.assertEqual(sorted(costs[0]), ['energy', 'path', 'time'])
+		self.assertEqual(list(costs[1]), ['energy'])
+		self.assertEqual(costs[1]['energy'].dtype, np.float32)
+		self.assertIsNone(costs[2])
+		self.assertEqual(solvers[1].cost_function.memory_report()['costs.energy'], layer_bytes)
+
+		totals = []
+		for solver in solvers:
+			search = solver.solve((5, 5), (70, 72))
+			self.assertTrue(search and len(search.raw) > 0)
+			totals.append(sum(node.derived['energy'] for node in search.nodes[1:]))
+		self.assertAlmostEqual(totals[1] / totals[0], 1, places=4)
+		self.assertAlmostEqual(totals[2] / totals[0], 1, places=4)
+
+	def test_degraded_searches(self):
+		model = self.models[np.float64]
+		layer_bytes = model.size * len(model.searchKernel.getKernel()) * 4
+		search = astarSolver(model, self.explorer, cached=True).solve((5, 5), (70, 72))
+		solver = astarSolver(model, self.explorer, cached=True,
+			memory_budget=report_total(model.memory_report()) + layer_bytes)
+		cost_function = solver.cost_function
+		self.assertEqual(list(cost_function.cached['costs']), ['energy'])
+
+		# the layers left out of the cache are read from tiles, never computed per node
+		def calculate_cost_between(*args):
+			raise AssertionError('costs computed per node')
+		cost_function.calculateCostBetween = calculate_cost_between
+		degraded_search = solver.solve((5, 5), (70, 72))
+		self.assertEqual(degraded_search.raw, search.raw)
+		for node, degraded_node in zip(search.nodes, degraded_search.nodes):
+			for name, value in node.derived.items():
+				self.assertAlmostEqual(degraded_node.derived[name] / value, 1, places=5)
+		self.assertEqual(sorted(cost_function.missing_costs.layers), ['path', 'time'])
+
+	def test_accelerate_keeps_costs(self):
+		model = self.models[np.float64]
+		solver = astarSolver(model, self.explorer, cached=True,
+			memory_budget=report_total(model.memory_report()) + model.size * len(model.searchKernel.getKernel()) * 4)
+		cost_function, energy = solver.cost_function, solver.cost_function.cached['costs']['energy']
+		search = solver.solve((5, 5), (70, 72))
+		solver.accelerate(10)
+		self.assertIs(solver.cost_function, cost_function)
+		self.assertIs(cost_function.cached['costs']['energy'], energy)
+		accelerated_search = solver.solve((5, 5), (70, 72))
+		self.assertTrue(accelerated_search and len(accelerated_search.raw) > 0)
+		self.assertLess(len(accelerated_search.expanded_items), len(search.expanded_items))
+	def test_raster_read_as_dtype(self):
+		terrain = np.round(smooth_terrain(40)).astype(np.int16)
+		terrain[3, 4] = -9999
+		band = RasterBand(terrain, -9999)
+		grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), GDALDataset(band, 40, 40, 1.0))
+		model = grid_mesh.loadSubSection(maxSlope=35, dtype=np.float32)
+		# gdal is asked for float32 directly, there is no float64 copy of the window
+		self.assertEqual(band.buf_types, [gdal_array.NumericTypeCodeToGDALTypeCode(np.float32)])
+		self.assertEqual(grid_mesh.dataset.map_array.dtype, np.float32)
+		self.assertEqual(model.data.dtype, np.float32)
+		np.testing.assert_array_equal(model.dataset_unmasked[5:, 5:], terrain[5:, 5:])
+		self.assertTrue(np.ma.getmaskarray(grid_mesh.dataset.subsection(0, 0, 40, 40).data_container)[3, 4])
+		self.assertEqual(grid_mesh.dataset.subsection(0, 0, 40, 40).dtype, np.float64)
+
+if __name__ == "__main__":
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestFloat32Pipeline)
+	unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from pextant.EnvironmentalModel import load_legacy
+
+class TestLegacyGrid(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.elevations = np.round(np.random.RandomState(0).uniform(-1100, -1000, size=(6, 9)), 4)
+		self.file_name = os.path.join(self.directory, 'terrain.txt')
+		with open(self.file_name, 'w') as legacy_file:
+			legacy_file.write('ncols 9\nnrows 6\nxllcorner 0\nyllcorner 0\ncellsize 1.000\nNODATA_value 0\n')
+			for row in self.elevations:
+				legacy_file.write(' '.join('%.4f' % value for value in row) + '\n')
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_cached_grid(self):
+		cache_directory = os.path.join(self.directory, 'cache')
+		parsed = np.asarray(load_legacy(self.file_name, cache_directory).dataset)
+		np.testing.assert_array_equal(parsed, self.elevations)
+		# the parsed grid is kept in the cache directory only, and read back identically
+		self.assertEqual(len(os.listdir(cache_directory)), 1)
+		self.assertEqual(sorted(os.listdir(self.directory)), ['cache', 'terrain.txt'])
+		cached = np.asarray(load_legacy(self.file_name, cache_directory).dataset)
+		np.testing.assert_array_equal(cached, parsed)
+		self.assertEqual(cached.dtype, parsed.dtype)
+
+	def test_uncached_grid(self):
+		# reading writes nothing unless asked to
+		home = os.path.join(self.directory, 'home')
+		with mock.patch.dict(os.environ, HOME=home):
+			np.testing.assert_array_equal(np.asarray(load_legacy(self.file_name).dataset), self.elevations)
+		self.assertEqual(os.listdir(self.directory), ['terrain.txt'])
+
+if __name__ == "__main__":
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestLegacyGrid)
+	unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+from pextant.EnvironmentalModel import GridMesh
+from pextant.lib.geoshapely import GeoPoint, UTM
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.mesh.mosaic import MosaicDataset, MosaicTile
+from pextant.test.test_float32 import smooth_terrain
+
+def split(terrain, row_seams, col_seams, missing=()):
+	"""
+	mosaic of terrain cut along the given rows and columns, its tiles already decoded in the tile cache. Tiles whose
+	(row, col) corner is in missing are left out
+	"""
+	row_edges = [0] + list(row_seams) + [terrain.shape[0]]
+	col_edges = [0] + list(col_seams) + [terrain.shape[1]]
+	tiles, elevations = [], {}
+	for y0, y1 in zip(row_edges[:-1], row_edges[1:]):
+		for x0, x1 in zip(col_edges[:-1], col_edges[1:]):
+			if (y0, x0) in missing:
+				continue
+			tile = MosaicTile('tile_%d_%d.tif' % (y0, x0), x0, y0, x1 - x0, y1 - y0)
+			tiles.append(tile)
+			elevations[tile.path] = terrain[y0:y1, x0:x1].copy()
+	dataset = MosaicDataset(tiles, row_size=terrain.shape[0], col_size=terrain.shape[1], resolution=1.0)
+	for path, tile_elevations in elevations.items():
+		dataset.tile_cache.tiles[path] = tile_elevations
+		dataset.tile_cache.nbytes += tile_elevations.nbytes
+	return dataset
+
+class TestMosaic(unittest.TestCase):
+
+	def setUp(self):
+		self.terrain = smooth_terrain()
+		self.dataset = split(self.terrain, [30, 47], [25])
+
+	def test_windows_across_seams(self):
+		for x_offset, y_offset, x_size, y_size in [(20, 25, 10, 30), (0, 0, 80, 80), (26, 31, 5, 5)]:
+			window = self.dataset.subsection(x_offset, y_offset, x_size, y_size)
+			np.testing.assert_array_equal(np.ma.getdata(window.data_container),
+				self.terrain[y_offset:y_offset + y_size, x_offset:x_offset + x_size])
+			self.assertFalse(np.ma.getmaskarray(window.data_container).any())
+
+	def test_points_across_seams(self):
+		rows, cols = np.meshgrid(np.arange(28, 50), np.arange(22, 28), indexing='ij')
+		np.testing.assert_array_equal(self.dataset.get_elevations(rows, cols), self.terrain[28:50, 22:28])
+
+	def test_slopes_across_seams(self):
+		nw_corner = GeoPoint(UTM(5), 300000, 2100000)
+		mosaic_model = GridMesh(nw_corner, self.dataset).loadSubSection(maxSlope=15)
+		single_model = GridMesh(nw_corner, NpDataset(self.terrain, 1.0)).loadSubSection(maxSlope=15)
+		np.testing.assert_allclose(mosaic_model.slopes, single_model.slopes)
+		np.testing.assert_array_equal(mosaic_model.obstacle_mask(), single_model.obstacle_mask())
+
+	def test_missing_tile_masked(self):
+		dataset = split(self.terrain, [40], [40], missing=[(40, 40)])
+		window = dataset.subsection(30, 30, 20, 20).data_container
+		mask = np.zeros((20, 20), dtype=bool)
+		mask[10:, 10:] = True
+		np.testing.assert_array_equal(np.ma.getmaskarray(window), mask)
+		self.assertTrue(np.isnan(dataset.get_elevations([45], [45])).all())
+
+if __name__ == '__main__':
+	unittest.main()
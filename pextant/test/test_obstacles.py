@@ -0,0 +1,187 @@
+import unittest
+import numpy as np
+from pextant.EnvironmentalModel import GridMesh, GridMeshModel
+from pextant.explorers import Astronaut
+from pextant.lib.bitmask import rle_decode, rle_encode
+from pextant.lib.geoshapely import GeoPoint, UTM, LAT_LONG, LONG_LAT, transform_points
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.solvers.astarMesh import astarSolver
+from pextant.test.test_float32 import smooth_terrain
+
+class TestObstacleEdits(unittest.TestCase):
+
+	def setUp(self):
+		grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), NpDataset(smooth_terrain(60), 0.5))
+		self.model = grid_mesh.loadSubSection(maxSlope=35, cached=True, kernel_size=5)
+
+	def test_circular_obstacle(self):
+		model = self.model
+		before = model.obstacles.copy()
+		expected = before.copy()
+		expected[model.get_euclidean_distance_sq_to_point((10., 5.)) < 9.] = True
+
+		changed = model.set_circular_obstacle((10., 5.), 3.)
+		np.testing.assert_array_equal(model.obstacles, expected)
+		np.testing.assert_array_equal(model.passable, ~expected)
+		np.testing.assert_array_equal(changed, np.argwhere(before != expected))
+		np.testing.assert_array_equal(model.cached_neighbours, model._cache_neighbours())
+
+	def test_obstacle_map(self):
+		model = self.model
+		obstacle_map = np.zeros(model.shape, dtype=bool)
+		obstacle_map[0:3, 40:] = True
+		model.set_obstacle_map(obstacle_map)
+		changed = model.set_obstacle_map(obstacle_map, False)
+		self.assertEqual(len(changed), obstacle_map.sum())
+		self.assertFalse(model.obstacles[obstacle_map].any())
+		np.testing.assert_array_equal(model.cached_neighbours, model._cache_neighbours())
+		self.assertEqual(len(model.set_obstacle_map(obstacle_map, False)), 0)
+
+	def test_obstacle_list(self):
+		model = self.model
+		cells = np.array([[3, 4], [50, 7], [3, 4], [20, 59]])
+		lat_lon = [GeoPoint(model.ROW_COL, row, col).to(LAT_LONG) for row, col in cells]
+		np.testing.assert_array_equal(model.mesh_coordinates(lat_lon, LAT_LONG), cells)
+
+		model.set_obstacle_cells(cells, False)
+		changed = model.set_obstacle_list([GeoPoint(LAT_LONG, lat, lon) for lat, lon in lat_lon])
+		np.testing.assert_array_equal(changed, np.unique(cells, axis=0))
+		self.assertTrue(model.obstacles[cells[:, 0], cells[:, 1]].all())
+		np.testing.assert_array_equal(model.cached_neighbours, model._cache_neighbours())
+		self.assertRaises(IndexError, model.set_obstacle_cells, [[60, 0]])
+
+	def test_obstacle_list_zones(self):
+		# points given in the model's zone and in the neighbouring one land on the same cells
+		model = self.model
+		cells = np.array([[3, 4], [50, 7], [20, 59], [30, 30]])
+		lat_lon = [GeoPoint(model.ROW_COL, row, col).to(LAT_LONG) for row, col in cells]
+		zone_4 = transform_points(lat_lon, LAT_LONG, UTM(4))
+		geo_points = [GeoPoint(UTM(4), *zone_4[0]), GeoPoint(LAT_LONG, *lat_lon[1]),
+			GeoPoint(UTM(4), *zone_4[2]), GeoPoint(LAT_LONG, *lat_lon[3])]
+		model.set_obstacle_cells(cells, False)
+		changed = model.set_obstacle_list(geo_points)
+		np.testing.assert_array_equal(changed, np.unique(cells, axis=0))
+		self.assertTrue(model.obstacles[cells[:, 0], cells[:, 1]].all())
+
+	def test_profiles(self):
+		model = self.model
+		model.set_obstacle_cells([[3, 4]])
+		astronaut = model.obstacles.copy()
+
+		model.select_profile(15, 'Rover')
+		np.testing.assert_array_equal(model.obstacles, ~(model.slopes <= 15))
+		np.testing.assert_array_equal(model.cached_neighbours, model._cache_neighbours())
+
+		# switching back restores the profile, edits included
+		model.select_profile(35)
+		np.testing.assert_array_equal(model.obstacles, astronaut)
+		np.testing.assert_array_equal(model.passable, ~astronaut)
+		np.testing.assert_array_equal(model.cached_neighbours, model._cache_neighbours())
+
+	def test_overlay(self):
+		model = self.model
+		obstacles, version = model.obstacles.copy(), model.version
+		overlay = model.overlay(tile_size=16)
+		changed = overlay.set_circular_obstacle((10., 5.), 3.)
+		self.assertTrue(len(changed) > 0)
+		self.assertNotEqual(overlay.version, version)
+		self.assertTrue(len(overlay.obstacles.tiles) < 16)
+
+		# edited as the model itself would be, which stays untouched
+		expected = obstacles.copy()
+		expected[changed[:, 0], changed[:, 1]] = True
+		np.testing.assert_array_equal(np.asarray(overlay.obstacles), expected)
+		np.testing.assert_array_equal(np.asarray(overlay.passable), ~expected)
+		np.testing.assert_array_equal(np.asarray(overlay.cached_neighbours), overlay._cache_neighbours())
+		np.testing.assert_array_equal(model.obstacles, obstacles)
+		self.assertEqual(model.version, version)
+
+		fork = overlay.overlay()
+		fork.set_obstacle_cells(changed, False)
+		np.testing.assert_array_equal(np.asarray(fork.obstacles), obstacles)
+		np.testing.assert_array_equal(np.asarray(overlay.obstacles), expected)
+
+	def test_clearance(self):
+		model = self.model
+		model.set_obstacle_map(np.ones(model.shape, dtype=bool), False)
+		clearance = model.set_clearance(radius=1., cost_weight=5., cost_range=3.)
+		model.set_circular_obstacle((10., 5.), 2.)
+		model.set_obstacle_cells([[40, 40]])
+		model.set_obstacle_cells([[40, 40]], False)
+
+		# distances kept up to date within their reach only match a full distance transform
+		distance = clearance.distance.copy()
+		clearance.compute(model.obstacles)
+		np.testing.assert_array_equal(clearance.distance, distance)
+		self.assertEqual(distance[40, 40], 3.)
+		inflated = model.inflated_obstacles()
+		self.assertTrue(inflated[model.get_euclidean_distance_sq_to_point((10., 5.)) < 2.5**2].all())
+		self.assertFalse(inflated[40, 40])
+		np.testing.assert_array_equal(model.cached_neighbours, model._cache_neighbours())
+
+		model.set_clearance()
+		self.assertIsNone(model.clearance)
+		np.testing.assert_array_equal(model.inflated_obstacles(), model.obstacles)
+
+	def test_polygon_obstacles(self):
+		model = self.model
+		model.set_obstacle_map(np.ones(model.shape, dtype=bool), False)
+
+		def ring(row_min, col_min, row_max, col_max):
+			corners = [(row_min, col_min), (row_min, col_max), (row_max, col_max), (row_max, col_min), (row_min, col_min)]
+			return [list(GeoPoint(UTM(5), 300000 + col * 0.5, 2100000 - row * 0.5).to(LONG_LAT)) for row, col in corners]
+		geojson = {'type': 'Feature', 'geometry': {'type': 'MultiPolygon', 'coordinates': [
+			[ring(10, 10, 30, 30), ring(15, 15, 25, 25)], [ring(40, 40, 45, 50)]]}}
+
+		expected = np.zeros(model.shape, dtype=bool)
+		expected[10:30, 10:30] = True
+		expected[15:25, 15:25] = False
+		expected[40:45, 40:50] = True
+		changed = model.set_obstacle_polygons(geojson)
+		np.testing.assert_array_equal(model.obstacles, expected)
+		np.testing.assert_array_equal(changed, np.argwhere(expected))
+		np.testing.assert_array_equal(model.cached_neighbours, model._cache_neighbours())
+		np.testing.assert_array_equal(model.search_mask(geojson), expected)
+
+		runs = rle_encode(expected)
+		self.assertEqual(runs.sum(), expected.size)
+		np.testing.assert_array_equal(rle_decode(runs, model.shape), expected)
+
+	def test_nodata_obstacles(self):
+		terrain = np.ma.masked_array(np.zeros((20, 20)), np.zeros((20, 20), dtype=bool))
+		terrain[10, 10] = np.ma.masked
+		for slope_operator in ('gradient', 'horn'):
+			model = GridMeshModel(GeoPoint(UTM(5), 300000, 2100000), NpDataset(terrain, 1.0), maxSlope=35, cached=True,
+				slope_operator=slope_operator)
+			# the cell without data, and the cells whose slopes depend on it, are obstacles
+			expected = np.zeros((20, 20), dtype=bool)
+			if slope_operator == 'gradient':
+				expected[9:12, 10] = expected[10, 9:12] = True
+			else:
+				expected[9:12, 9:12] = True
+			np.testing.assert_array_equal(model.obstacles, expected)
+			np.testing.assert_array_equal(~model.passable, expected)
+			# (obstacle masks also leave out cells without data)
+			np.testing.assert_array_equal(~np.ma.getmaskarray(model.obstacle_mask(35)), expected & ~terrain.mask)
+
+	def test_cpp_solver_sees_new_obstacles(self):
+		model = self.model
+		solver = astarSolver(model, Astronaut(80), cached=True, algorithm_type=astarSolver.CPP_NETWORKX)
+		start, end = GeoPoint(model.ROW_COL, 5, 5), GeoPoint(model.ROW_COL, 50, 40)
+		search = solver.solve(start, end)
+		self.assertTrue(search)
+		# block the middle of the path found, after the path finder cached the obstacles
+		blocked = np.array(search.raw[len(search.raw) // 2 - 2:len(search.raw) // 2 + 3])
+		model.set_obstacle_cells(blocked, True)
+		rerouted = solver.solve(start, end)
+		self.assertTrue(rerouted)
+		self.assertFalse(set(map(tuple, blocked.tolist())) & set(map(tuple, rerouted.raw)))
+		fresh = astarSolver(model, Astronaut(80), cached=True, algorithm_type=astarSolver.CPP_NETWORKX)
+		self.assertEqual(rerouted.raw, fresh.solve(start, end).raw)
+		# and clearing them again is seen too
+		model.set_obstacle_cells(blocked, False)
+		self.assertEqual(solver.solve(start, end).raw, search.raw)
+
+if __name__ == "__main__":
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestObstacleEdits)
+	unittest.TextTestRunner(verbosity=2).run(suite)
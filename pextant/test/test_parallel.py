@@ -0,0 +1,38 @@
+import unittest
+import numpy as np
+from pextant.EnvironmentalModel import GridMesh
+from pextant.explorers import Astronaut
+from pextant.lib.geoshapely import GeoPoint, UTM
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.solvers.astarMesh import astarSolver
+from pextant.solvers.corridor import corridorSolver
+from pextant.test.test_float32 import smooth_terrain
+
+class TestParallelLegs(unittest.TestCase):
+
+	def setUp(self):
+		grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), NpDataset(smooth_terrain(60), 1.0))
+		self.model = grid_mesh.loadSubSection(maxSlope=35, cached=True)
+		self.explorer = Astronaut(80)
+		self.waypoints = [(5, 5), (40, 20), (50, 55), (10, 45)]
+
+	def test_parallel_matches_sequential(self):
+		solver = astarSolver(self.model, self.explorer, cached=True)
+		self.assertTrue(solver.supports_parallel)
+		search_list, raw, _ = solver.solvemultipoint(self.waypoints)
+		parallel_list, parallel_raw, _ = solver.solvemultipoint(self.waypoints, processes=2)
+		np.testing.assert_array_equal(parallel_raw, raw)
+		for search, parallel_search in zip(search_list.list, parallel_list.list):
+			self.assertEqual([node.derived for node in parallel_search.nodes], [node.derived for node in search.nodes])
+
+	def test_sequential_fallback(self):
+		# solvers without the parallel solving hooks solve their legs one after the other
+		solver = corridorSolver(self.model, self.explorer)
+		self.assertFalse(solver.supports_parallel)
+		search_list, raw, _ = solver.solvemultipoint(self.waypoints, processes=2)
+		self.assertEqual(len(search_list.list), len(self.waypoints) - 1)
+		self.assertTrue(all(search_list.list))
+
+if __name__ == "__main__":
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestParallelLegs)
+	unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from pextant.backend_app.model_cache import LoadedModel, ModelCache
+from pextant.backend_app.path_manager import PathManager
+from pextant.EnvironmentalModel import GridMesh
+from pextant.explorers import Astronaut
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.solvers.astarMesh import ExplorerCost
+from pextant.test.test_float32 import smooth_terrain
+from pextant_cpp import PathFinder
+from pextant.lib.geoshapely import GeoPoint, UTM, LAT_LONG, transform_points
+from pextant.test.test_bundle import BACKEND_APP_DIRECTORY
+
+class Manager(object):
+	def register_component(self, component):
+		pass
+
+class TestPathManager(unittest.TestCase):
+
+	def setUp(self):
+		self.working_directory, self.bundles_directory = os.getcwd(), PathManager.BUNDLES_DIRECTORY
+		os.chdir(BACKEND_APP_DIRECTORY)
+		PathManager.BUNDLES_DIRECTORY = tempfile.mkdtemp()
+		self.path_manager = PathManager(Manager(), False)
+
+	def tearDown(self):
+		shutil.rmtree(PathManager.BUNDLES_DIRECTORY)
+		os.chdir(self.working_directory)
+		PathManager.BUNDLES_DIRECTORY = self.bundles_directory
+
+	def test_endpoints_in_other_zones(self):
+		path_manager = self.path_manager
+		path_manager.load_model('tutorial.txt', 25, False)
+		model = path_manager.terrain_model
+		path_manager.set_start_point([20, 20], 'coord', False)
+		# the end point, given in the next UTM zone over
+		lat_lon = GeoPoint(model.ROW_COL, 200, 250).to(LAT_LONG)
+		easting, northing = transform_points(np.array([lat_lon]), LAT_LONG, UTM(2))[0]
+		path_manager.end_point = GeoPoint(UTM(2), easting, northing)
+		path_manager.cache_costs(False)
+		path_manager.cache_obstacles(False)
+		path_manager.cache_heuristics(False)
+		path_manager.find_path()
+		self.assertEqual(tuple(path_manager.found_path[0]), (20, 20))
+		self.assertEqual(tuple(path_manager.found_path[-1]), (200, 250))
+
+class TestModelCache(unittest.TestCase):
+
+	def loaded_model(self, seed):
+		grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), NpDataset(smooth_terrain(40, seed), 1.0))
+		terrain_model = grid_mesh.loadSubSection(maxSlope=35, cached=True)
+		cost_function = ExplorerCost(Astronaut(80), terrain_model, 'Energy', cached=True)
+		return LoadedModel(terrain_model, cost_function, PathFinder())
+
+	def test_eviction(self):
+		first, second = self.loaded_model(0), self.loaded_model(1)
+		cache = ModelCache(first.nbytes + second.nbytes)
+		cache.put('first', first)
+		cache.put('second', second)
+		self.assertEqual(list(cache.models), ['first', 'second'])
+
+		# models are measured as they are now, with what was added to them since loading
+		loaded_bytes = first.nbytes
+		first.select_profile(10)
+		first.terrain_model.set_clearance(radius=2.)
+		self.assertGreater(first.nbytes, loaded_bytes)
+		self.assertEqual(cache.nbytes, first.nbytes + second.nbytes)
+
+		# which the budget now evicts the least recently used model for
+		cache.put('second', second)
+		self.assertEqual(list(cache.models), ['second'])
+
+if __name__ == "__main__":
+	for test_case in (TestPathManager, TestModelCache):
+		suite = unittest.TestLoader().loadTestsFromTestCase(test_case)
+		unittest.TextTestRunner(verbosity=2).run(suite)
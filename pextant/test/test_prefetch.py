@@ -0,0 +1,114 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from osgeo import gdal_array
+from pextant.EnvironmentalModel import GridMesh
+from pextant.explorers import Astronaut
+from pextant.lib.blockcache import BlockCache
+from pextant.lib.geoshapely import GeoPoint, GeoPolygon, UTM
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.solvers.adaptive import adaptiveSolver
+from pextant.solvers.prefetch import Prefetcher
+from pextant.test.test_float32 import smooth_terrain
+from pextant.test.test_mosaic import split
+
+class BlockBand(object):
+	"""band of an in memory raster, with gdal's block layout, that fails if it's read from two threads at once"""
+	def __init__(self, array, block_size):
+		self.array = array
+		self.YSize, self.XSize = array.shape
+		self.block_size = block_size
+		self.DataType = gdal_array.NumericTypeCodeToGDALTypeCode(array.dtype)
+		self.reading = threading.Lock()
+		self.reads = 0
+
+	def GetBlockSize(self):
+		return list(self.block_size)
+
+	def ReadAsArray(self, x_offset, y_offset, x_size, y_size, buf_x, buf_y):
+		if not self.reading.acquire(blocking=False):
+			raise RuntimeError('concurrent read')
+		try:
+			time.sleep(0.001)
+			self.reads += 1
+			x_offset, y_offset = int(x_offset), int(y_offset)
+			return self.array[y_offset:y_offset + int(y_size), x_offset:x_offset + int(x_size)].copy()
+		finally:
+			self.reading.release()
+
+class TestSharedCaches(unittest.TestCase):
+
+	def setUp(self):
+		self.terrain = smooth_terrain().astype(np.float32)
+		self.windows = [(x, y, 17, 13) for x in range(0, 60, 7) for y in range(0, 60, 11)]
+
+	def test_block_windows_from_threads(self):
+		# a budget of a few blocks, so that threads keep evicting each other's blocks
+		band = BlockBand(self.terrain, (16, 8))
+		cache = BlockCache(band, cache_bytes=4 * 16 * 8 * 4)
+		with ThreadPoolExecutor(4) as pool:
+			windows = list(pool.map(lambda window: cache.read_window(*window), self.windows))
+		for (x_offset, y_offset, x_size, y_size), window in zip(self.windows, windows):
+			self.assertEqual(window.dtype, np.float32)
+			np.testing.assert_array_equal(window, self.terrain[y_offset:y_offset + y_size, x_offset:x_offset + x_size])
+		rows, cols = np.random.RandomState(0).randint(0, 80, size=(2, 200))
+		np.testing.assert_array_equal(cache.read_points(rows, cols), self.terrain[rows, cols])
+		self.assertLessEqual(cache.nbytes, cache.cache_bytes)
+
+	def test_striped_band(self):
+		# one row blocks are read several strips at a time
+		band = BlockBand(self.terrain, (80, 1))
+		cache = BlockCache(band)
+		np.testing.assert_array_equal(cache.read_window(3, 5, 70, 60), self.terrain[5:65, 3:73])
+		self.assertEqual(band.reads, 1)
+
+	def test_mosaic_windows_from_threads(self):
+		dataset = split(self.terrain.astype(float), [30, 47], [25])
+		with ThreadPoolExecutor(4) as pool:
+			windows = list(pool.map(lambda window: dataset.subsection(*window), self.windows))
+		for (x_offset, y_offset, x_size, y_size), window in zip(self.windows, windows):
+			np.testing.assert_array_equal(np.ma.getdata(window.data_container),
+				self.terrain[y_offset:y_offset + y_size, x_offset:x_offset + x_size])
+
+class TestPrefetcher(unittest.TestCase):
+
+	def setUp(self):
+		self.grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), NpDataset(smooth_terrain(), 1.0))
+		self.explorer = Astronaut(80)
+		self.options = dict(margin=5, maxSlope=35, cached=True)
+
+	def waypoints(self, cells):
+		rows, cols = np.array(cells, dtype=float).transpose()
+		return GeoPolygon(UTM(5), 300000 + cols, 2100000 - rows)
+
+	def test_legs_match_direct_solves(self):
+		waypoints = self.waypoints([(10, 10), (40, 30), (70, 15), (60, 70)])
+		prefetcher = Prefetcher(self.grid_mesh, self.explorer, threads=3, **self.options)
+		prefetcher.prefetch(waypoints)
+		search_list, _, _ = prefetcher.solvemultipoint()
+		prefetcher.shutdown()
+		for i, search in enumerate(search_list.list):
+			solver = adaptiveSolver(self.grid_mesh, self.explorer, **self.options)
+			direct = solver.solve(waypoints[i], waypoints[i + 1])
+			self.assertTrue(search and direct)
+			np.testing.assert_allclose(search.coordinates.to(UTM(5)), direct.coordinates.to(UTM(5)))
+
+	def test_replanning(self):
+		prefetcher = Prefetcher(self.grid_mesh, self.explorer, threads=0, **self.options)
+		prefetcher.prefetch(self.waypoints([(10, 10), (40, 30), (70, 15)]))
+		legs = prefetcher.legs
+		# no worker threads: legs are only loaded when asked for
+		self.assertIsNotNone(prefetcher.leg_solver(0).env_model)
+		self.assertIsNone(legs[1].solver.env_model)
+		prefetcher.prefetch(self.waypoints([(10, 10), (40, 30), (70, 15)]))
+		self.assertIs(prefetcher.legs, legs)
+		prefetcher.prefetch(self.waypoints([(10, 10), (60, 60)]))
+		self.assertEqual(len(prefetcher.legs), 1)
+		# dropped legs are never loaded
+		self.assertTrue(legs[1].done.is_set())
+		self.assertIsNone(legs[1].solver.env_model)
+
+if __name__ == '__main__':
+	unittest.main()
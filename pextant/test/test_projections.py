@@ -0,0 +1,42 @@
+import unittest
+from unittest import mock
+import numpy as np
+import pyproj
+from pextant.lib import geoshapely
+from pextant.lib.geoshapely import GeoPoint, UTM, Cartesian, LAT_LONG, transform_points
+
+class TestProjections(unittest.TestCase):
+
+	def setUp(self):
+		self.latlongs = np.array([[19.36, -155.20], [19.37, -155.21], [19.38, -155.19]])
+
+	def test_batch_matches_pyproj(self):
+		utm = transform_points(self.latlongs, LAT_LONG, UTM(5))
+		expected = pyproj.Proj(proj='utm', zone=5, datum='WGS84')(self.latlongs[:, 1], self.latlongs[:, 0])
+		np.testing.assert_allclose(utm, np.transpose(expected), atol=1e-6)
+		# one point at a time gives the same as the whole batch
+		for latlong, easting_northing in zip(self.latlongs, utm):
+			np.testing.assert_allclose(GeoPoint(LAT_LONG, *latlong).to(UTM(5)), easting_northing, atol=1e-6)
+		np.testing.assert_allclose(transform_points(utm, UTM(5), LAT_LONG), self.latlongs, atol=1e-9)
+
+	def test_transformers_reused(self):
+		utm = UTM(5)
+		transform_points(self.latlongs, LAT_LONG, utm)
+		with mock.patch.object(pyproj.Transformer, 'from_proj', side_effect=AssertionError('rebuilt')):
+			transform_points(self.latlongs, LAT_LONG, UTM(5))
+		# converting doesn't write the datum into the projection parameters
+		self.assertEqual(utm.proj_param, {'proj': 'utm', 'zone': 5})
+
+	def test_same_zone_is_affine(self):
+		origin = GeoPoint(UTM(5), 300000, 2100000)
+		frame = Cartesian(origin, 0.5)
+		with mock.patch.object(geoshapely, 'get_transformer', side_effect=AssertionError('projected')):
+			utm = transform_points([[10, 20], [4, 0]], frame, UTM(5))
+			np.testing.assert_allclose(utm, [[300005, 2099990], [300002, 2100000]])
+			np.testing.assert_array_equal(transform_points(utm, UTM(5), frame), [[10, 20], [4, 0]])
+			point = GeoPoint(frame, 10, 20)
+			np.testing.assert_array_equal(point.to(frame), [10, 20])
+		self.assertEqual(point.eastingnorthing(), (300005, 2099990))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.test.test_float32 import smooth_terrain
+
+class TestResampling(unittest.TestCase):
+
+	def setUp(self):
+		self.terrain = smooth_terrain(64)
+		self.dataset = NpDataset(self.terrain, 1.0)
+
+	def test_window_matches_full_downsample(self):
+		# averaging a window aligned on coarse cells gives the same cells as averaging the whole map
+		full = np.asarray(self.dataset.downsample(4, 'average'))
+		window = self.dataset.subsection(16, 8, 32, 24, 4, 'average')
+		self.assertEqual(window.shape, (6, 8))
+		self.assertEqual(window.resolution, 4)
+		np.testing.assert_allclose(np.asarray(window), full[2:8, 4:12])
+
+	def test_kernels(self):
+		window = self.terrain[8:32, 16:48]
+		for resampling in ('nearest', 'bilinear', 'cubic', 'average'):
+			coarse = self.dataset.subsection(16, 8, 32, 24, 2, resampling)
+			self.assertEqual(coarse.shape, (12, 16))
+			self.assertEqual(coarse.resolution, 2)
+			coarse = np.asarray(coarse)
+			if resampling != 'cubic':
+				# these kernels never overshoot the elevations of the window
+				self.assertGreaterEqual(coarse.min(), window.min() - 1e-9)
+				self.assertLessEqual(coarse.max(), window.max() + 1e-9)
+
+	def test_average_of_plane(self):
+		rows, cols = np.mgrid[0:40, 0:40]
+		plane = NpDataset(3. * rows + 2. * cols + 1, 1.0)
+		coarse_rows, coarse_cols = np.mgrid[0:20, 0:20]
+		# the mean of each 2x2 block is the plane at the block's center
+		expected = 3. * (2 * coarse_rows + .5) + 2. * (2 * coarse_cols + .5) + 1
+		np.testing.assert_allclose(np.asarray(plane.downsample(2, 'average')), expected)
+
+if __name__ == '__main__':
+	unittest.main()
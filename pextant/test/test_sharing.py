@@ -0,0 +1,53 @@
+import pickle
+import tempfile
+import unittest
+import numpy as np
+from pextant.EnvironmentalModel import GridMesh, GridMeshModel
+from pextant.explorers import Astronaut
+from pextant.lib.geoshapely import GeoPoint, UTM
+from pextant.mesh.abstractmesh import NpDataset
+from pextant.solvers.astarMesh import astarSolver
+from pextant.test.test_float32 import smooth_terrain
+
+class TestModelSharing(unittest.TestCase):
+
+	def setUp(self):
+		terrain = np.ma.masked_array(smooth_terrain(50), np.zeros((50, 50), dtype=bool))
+		terrain[20:24, 30:33] = np.ma.masked
+		grid_mesh = GridMesh(GeoPoint(UTM(5), 300000, 2100000), NpDataset(terrain, 1.0))
+		self.model = grid_mesh.loadSubSection(maxSlope=35, cached=True)
+		self.explorer = Astronaut(80)
+
+	def assertSameModel(self, model):
+		for name, array in self.model._arrays().items():
+			np.testing.assert_array_equal(np.asarray(model._arrays()[name]), array)
+		self.assertEqual(model.nw_geo_point.easting, self.model.nw_geo_point.easting)
+		search = astarSolver(self.model, self.explorer, cached=True).solve((5, 5), (45, 40))
+		other_search = astarSolver(model, self.explorer, cached=True).solve((5, 5), (45, 40))
+		self.assertEqual(other_search.raw, search.raw)
+
+	def test_pickle_by_value(self):
+		self.assertSameModel(pickle.loads(pickle.dumps(self.model)))
+
+	def test_shared_memory(self):
+		state = self.model.to_shared()
+		try:
+			model = GridMeshModel.attach(state)
+			self.assertSameModel(model)
+			# attached models map the shared arrays rather than copying them
+			self.assertFalse(model.slopes.flags.owndata)
+			# and shared models pickle as their shared state only
+			self.assertLess(len(pickle.dumps(self.model)), 10000)
+			self.assertSameModel(pickle.loads(pickle.dumps(self.model)))
+		finally:
+			self.model.release_shared()
+
+	def test_memory_mapped_files(self):
+		with tempfile.TemporaryDirectory() as directory:
+			state = self.model.to_shared(directory=directory)
+			self.assertSameModel(GridMeshModel.attach(state))
+			self.model.release_shared()
+
+if __name__ == "__main__":
+	suite = unittest.TestLoader().loadTestsFromTestCase(TestModelSharing)
+	unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+import numpy.ma as ma
+from pextant.mesh.slope import SLOPE_OPERATORS, compute_slopes, extend_slopes
+from pextant.test.test_float32 import smooth_terrain
+
+class TestSlopeTiles(unittest.TestCase):
+
+	def setUp(self):
+		self.terrain = smooth_terrain(70)
+		mask = np.zeros(self.terrain.shape, dtype=bool)
+		# missing cells right on and next to tile edges
+		mask[[9, 10, 31, 50], [5, 20, 33, 64]] = True
+		self.masked = ma.masked_array(self.terrain, mask)
+
+	def test_tiles_match_single_pass(self):
+		for operator in SLOPE_OPERATORS:
+			for elevations in (self.terrain, self.masked):
+				whole = compute_slopes(elevations, 0.5, operator, tile_rows=len(self.terrain))
+				for tile_rows, threads in [(10, 1), (10, 4), (7, None), (1, 3)]:
+					tiled = compute_slopes(elevations, 0.5, operator, tile_rows=tile_rows, threads=threads)
+					np.testing.assert_allclose(tiled, whole, rtol=1e-12, err_msg='%s, %d rows' % (operator, tile_rows))
+
+	def test_float32(self):
+		for operator in SLOPE_OPERATORS:
+			single = compute_slopes(self.masked, 0.5, operator, tile_rows=9, threads=1)
+			threaded = compute_slopes(self.masked, 0.5, operator, tile_rows=9, threads=4, dtype=np.float32)
+			self.assertEqual(threaded.dtype, np.float32)
+			np.testing.assert_allclose(threaded, single, rtol=1e-4, atol=1e-4)
+	def test_extend_window(self):
+		for operator in SLOPE_OPERATORS:
+			whole = compute_slopes(self.masked, 0.5, operator)
+			for row0, row1, col0, col1 in [(10, 40, 20, 50), (0, 30, 5, 70), (0, 70, 0, 70), (30, 32, 30, 32)]:
+				known = compute_slopes(self.masked[row0:row1, col0:col1], 0.5, operator)
+				extended = extend_slopes(self.masked, 0.5, known, row0, col0, operator)
+				np.testing.assert_allclose(extended, whole, rtol=1e-12, err_msg='%s, %d %d' % (operator, row0, col0))
+
+if __name__ == '__main__':
+	unittest.main()
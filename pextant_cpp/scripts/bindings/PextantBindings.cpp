@@ -25,20 +25,35 @@ PYBIND11_MODULE(pextant_cpp, m)
         .def(py::init<PathFinder::Type>())
         .def_property_readonly("finder_type", &PathFinder::getFinderType)
         .def_property_readonly("costs_cached", &PathFinder::getCostsCached)
+        .def_property_readonly("cost_tiles_set", &PathFinder::getCostTilesSet)
         .def_property_readonly("obstacles_cached", &PathFinder::getObstaclesCached)
         .def_property_readonly("heuristics_cached", &PathFinder::getHeuristicsCached)
+        .def_property_readonly("clearance_costs_cached", &PathFinder::getClearanceCostsCached)
+        .def_property_readonly("neighbours_cached", &PathFinder::getNeighboursCached)
+        .def_property_readonly("search_mask_cached", &PathFinder::getSearchMaskCached)
         .def_property_readonly("all_cached", &PathFinder::getAllCached)
         .def("astar_solve", &PathFinder::AstarSolve)
         .def("set_kernel", &PathFinder::SetKernel)
         .def("clear_kernel", &PathFinder::ClearKernel)
         .def("cache_costs", &PathFinder::CacheToNeighborCosts)
         .def("clear_costs", &PathFinder::ClearToNeighborCosts)
+        .def("set_cost_tiles", &PathFinder::SetCostTiles)
+        .def("clear_cost_tiles", &PathFinder::ClearCostTiles)
         .def("cache_obstacles", &PathFinder::CacheObstacles)
         .def("clear_obstacles", &PathFinder::ClearObstacles)
+        .def("update_obstacles", &PathFinder::UpdateObstacles)
         .def("cache_heuristics", &PathFinder::CacheToGoalHeuristics)
         .def("clear_heuristics", &PathFinder::ClearToGoalHeuristics)
+        .def("cache_clearance_costs", &PathFinder::CacheClearanceCosts)
+        .def("update_clearance_costs", &PathFinder::UpdateClearanceCosts)
+        .def("clear_clearance_costs", &PathFinder::ClearClearanceCosts)
+        .def("cache_neighbours", &PathFinder::CacheNeighbours)
+        .def("clear_neighbours", &PathFinder::ClearNeighbours)
+        .def("cache_search_mask", &PathFinder::CacheSearchMask)
+        .def("clear_search_mask", &PathFinder::ClearSearchMask)
         .def("clear_all", &PathFinder::ClearAll)
-        .def("reset_progress", &PathFinder::ResetProgress);
+        .def("reset_progress", &PathFinder::ResetProgress)
+        .def("memory_report", &PathFinder::MemoryReport);
     py::enum_<PathFinder::Type>(pathFinder, "Type")
         .value("dijkstra", PathFinder::Type::DIJKSTRA)
         .value("astar", PathFinder::Type::ASTAR)
@@ -2,7 +2,10 @@
 #define PATH_FINDER
 
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 #include <pybind11/stl.h>
+#include <cstdint>
+#include <list>
 #include <queue>
 #include <tuple>
 #include "headers/GraphNode.h"
@@ -35,7 +38,11 @@ namespace pextant
         }
         bool getCostsCached()
         {
-            return _cachedCostData.size() != 0;
+            return _cachedCostData.size() != 0 || getCostTilesSet();
+        }
+        bool getCostTilesSet()
+        {
+            return static_cast<bool>(_costTileProvider);
         }
         bool getObstaclesCached()
         {
@@ -45,6 +52,18 @@ namespace pextant
         {
             return _cachedHeuristicData.size() != 0;
         }
+        bool getClearanceCostsCached()
+        {
+            return _cachedClearanceCostData.size() != 0;
+        }
+        bool getNeighboursCached()
+        {
+            return _cachedNeighbourData.size() != 0;
+        }
+        bool getSearchMaskCached()
+        {
+            return _cachedSearchMaskData.size() != 0;
+        }
         bool getAllCached()
         {
             return 
@@ -70,14 +89,43 @@ namespace pextant
         typedef std::vector<std::vector<CachedCostDatum>> CostDataMatrix;
         CostDataMatrix _cachedCostData;
 
+        // alternatively to cached costs, a python callable (tile_row, tile_col) -> [rows x cols x kernel size] array
+        //   of the costs of a tile of the grid (see pextant.solvers.costtiles.CostTiles). Tiles are fetched the first
+        //   time a search reaches them, and at most _maxCostTiles of them are held, the least recently used being
+        //   evicted beyond that. The provider must return C-contiguous float32 arrays: tiles are used without any
+        //   conversion
+        typedef pybind11::array_t<float, pybind11::array::c_style> CostTile;
+        typedef std::list<GraphCoordinate> CostTileOrder;  // most recently used first
+        typedef std::unordered_map<GraphCoordinate, std::pair<CostTile, CostTileOrder::iterator>,
+                                   GraphNode::CoordinateHashFunction> CostTileMap;
+        pybind11::function _costTileProvider;
+        int _costTileSize = 0;
+        size_t _maxCostTiles = 0;
+        mutable CostTileMap _costTiles;
+        mutable CostTileOrder _costTileOrder;
+
         // a num_rows x num_columns 'matrix' that stores whether or not node at [row][col] is an obstacle
         typedef std::vector<std::vector<bool>> ObstacleDataMatrix;
         ObstacleDataMatrix _cachedObstacleData;
 
+        // an optional num_rows x num_columns 'matrix' of bitmasks (GridMeshModel.cached_neighbours): bit i of [row][col]
+        //   is set if node at [row][col] can reach its neighbor at kernel index i
+        typedef std::vector<std::vector<uint64_t>> NeighbourDataMatrix;
+        NeighbourDataMatrix _cachedNeighbourData;
+
+        // an optional num_rows x num_columns 'matrix' that stores whether or not node at [row][col] may be expanded
+        //   (searches are restricted to a region of interest while it is cached)
+        ObstacleDataMatrix _cachedSearchMaskData;
+
         // a num_rows x num_columns 'matrix' that stores heuristic cost to goal of node at [row][col]
         typedef std::vector<std::vector<float>> HeuristicDataMatrix;
         HeuristicDataMatrix _cachedHeuristicData;
 
+        // an optional num_rows x num_columns 'matrix' that stores the extra cost of moving onto node at [row][col]
+        //   for being close to obstacles (see pextant.mesh.clearance.Clearance)
+        typedef std::vector<std::vector<float>> ClearanceCostDataMatrix;
+        ClearanceCostDataMatrix _cachedClearanceCostData;
+
         // PRIORITY QUEUE q:
         //   create queue for determining which nodes to process next.
         //   queue is sorted by f-value, smallest to largest.
@@ -116,16 +164,36 @@ namespace pextant
         void ClearKernel() { _kernel.swap(Kernel()); }
         void CacheToNeighborCosts(pybind11::list& to_neighbor_costs);
         void ClearToNeighborCosts() { _cachedCostData.swap(CostDataMatrix()); }
+        void SetCostTiles(int rowCount, int columnCount, int tileSize, pybind11::function provider, int maxTiles);
+        void ClearCostTiles()
+        {
+            _costTileProvider = pybind11::function();
+            _costTiles.clear();
+            _costTileOrder.clear();
+            _costTileSize = 0;
+        }
         void CacheObstacles(pybind11::list& obstacle_map);
         void ClearObstacles() { _cachedObstacleData.swap(ObstacleDataMatrix()); }
+        void UpdateObstacles(pybind11::list& changed_cells, bool state);
         void CacheToGoalHeuristics(pybind11::list& to_goal_heuristics);
         void ClearToGoalHeuristics() { _cachedHeuristicData.swap(HeuristicDataMatrix()); }
+        void CacheClearanceCosts(pybind11::list& clearance_costs);
+        void UpdateClearanceCosts(int rowOffset, int columnOffset, pybind11::list& window_costs);
+        void ClearClearanceCosts() { _cachedClearanceCostData.swap(ClearanceCostDataMatrix()); }
+        void CacheNeighbours(pybind11::list& neighbour_masks);
+        void ClearNeighbours() { _cachedNeighbourData.swap(NeighbourDataMatrix()); }
+        void CacheSearchMask(pybind11::list& search_mask);
+        void ClearSearchMask() { _cachedSearchMaskData.swap(ObstacleDataMatrix()); }
         void ClearAll()
         {
             ClearKernel();
             ClearToNeighborCosts();
+            ClearCostTiles();
             ClearObstacles();
             ClearToGoalHeuristics();
+            ClearClearanceCosts();
+            ClearNeighbours();
+            ClearSearchMask();
             _gridSize = std::make_pair(0, 0);
         }
         void ResetProgress()
@@ -135,9 +203,13 @@ namespace pextant
             _enqueued.swap(EnqueuedMap());
         }
 
+        // bytes held by each cached layer and by the search progress (queue, explored and enqueued maps)
+        pybind11::dict MemoryReport() const;
+
     private:
         // gets the neighbor of {node} at the specified kernel index
-        //   returns false if kernelIndex is invalid, if neighbor would be 'out of bounds', or if there neighbor is blocked by an obstacle
+        //   returns false if kernelIndex is invalid, if neighbor would be 'out of bounds', if there neighbor is blocked by an obstacle,
+        //   if the cached neighbour masks say it can't be reached, or if it lies outside the cached search mask
         //   returns true otherwise
         bool TryGetNeighborAtKernelIndex(
             const GraphNode& node, 
@@ -145,6 +217,9 @@ namespace pextant
             GraphNode& outNeighbor,
             float& outCost) const;
 
+        // gets cost from {node} to its neighbor at the specified kernel index, from the cached costs or cost tiles
+        float GetNeighborCost(const GraphNode& node, int kernelIndex) const;
+
         // gets heuristic cost to goal for given node
         float GetNodeHeuristic(const GraphNode& node) const;
 
@@ -1,3 +1,4 @@
+#include <algorithm>
 #include <assert.h>
 #include <exception>
 #include <queue>
@@ -8,6 +9,32 @@
 
 namespace py = pybind11;
 
+namespace
+{
+    // bytes held by a 'matrix' (vector of rows), including the row headers
+    template <typename T>
+    size_t MatrixBytes(const std::vector<std::vector<T>>& matrix)
+    {
+        size_t bytes = matrix.capacity() * sizeof(std::vector<T>);
+        for (const auto& row : matrix)
+        {
+            bytes += row.capacity() * sizeof(T);
+        }
+        return bytes;
+    }
+
+    // std::vector<bool> packs its values into bits
+    size_t MatrixBytes(const std::vector<std::vector<bool>>& matrix)
+    {
+        size_t bytes = matrix.capacity() * sizeof(std::vector<bool>);
+        for (const auto& row : matrix)
+        {
+            bytes += (row.capacity() + 7) / 8;
+        }
+        return bytes;
+    }
+}
+
 namespace pextant
 {
     py::list& PathFinder::AstarSolve(py::tuple source, py::tuple target)
@@ -184,6 +211,19 @@ namespace pextant
         }
     }
 
+    void PathFinder::SetCostTiles(int rowCount, int columnCount, int tileSize, pybind11::function provider, int maxTiles)
+    {
+        // tiles replace any cached costs
+        ClearToNeighborCosts();
+        _costTiles.clear();
+        _costTileOrder.clear();
+
+        _gridSize = std::make_pair(rowCount, columnCount);
+        _costTileSize = tileSize;
+        _costTileProvider = provider;
+        _maxCostTiles = static_cast<size_t>(std::max(maxTiles, 1));
+    }
+
     void PathFinder::CacheObstacles(pybind11::list& obstacle_map)
     {
         // make sure gridsize is set
@@ -211,6 +251,26 @@ namespace pextant
         }
     }
 
+    void PathFinder::UpdateObstacles(pybind11::list& changed_cells, bool state)
+    {
+        // obstacles must already be cached, only the listed cells change
+        if (_cachedObstacleData.empty())
+        {
+            printf("obstacles not yet cached - returning");
+            return;
+        }
+
+        // each changed cell is a [row, col] pair
+        for (auto py_cell : changed_cells)
+        {
+            auto cell = py_cell.cast<py::list>();
+            auto iRow = cell[0].cast<int>();
+            auto iCol = cell[1].cast<int>();
+            assert(0 <= iRow && iRow < _gridSize.first && 0 <= iCol && iCol < _gridSize.second);
+            _cachedObstacleData[iRow][iCol] = state;
+        }
+    }
+
     void PathFinder::CacheToGoalHeuristics(pybind11::list& to_goal_heuristics)
     {
         // make sure gridsize is set
@@ -238,6 +298,151 @@ namespace pextant
         }
     }
 
+    void PathFinder::CacheClearanceCosts(pybind11::list& clearance_costs)
+    {
+        // make sure gridsize is set
+        if (_gridSize.first == 0 || _gridSize.second == 0)
+        {
+            printf("grid size not yet set (must perform cost caching first) - returning");
+            return;
+        }
+
+        // get/verify row and column counts
+        auto rowCount = static_cast<int>(py::len(clearance_costs));
+        auto columnCount = static_cast<int>(py::len(clearance_costs[0]));
+        assert(_gridSize.first == rowCount && _gridSize.second == columnCount);
+
+        // create clearance cost matrix
+        _cachedClearanceCostData = ClearanceCostDataMatrix(rowCount, std::vector<float>(columnCount));
+
+        // populate clearance cost matrix
+        for (int iRow = 0; iRow < rowCount; iRow++)
+        {
+            auto py_costs_row = clearance_costs[iRow].cast<py::list>();
+            for (int iCol = 0; iCol < columnCount; iCol++)
+            {
+                _cachedClearanceCostData[iRow][iCol] = py_costs_row[iCol].cast<float>();
+            }
+        }
+    }
+
+    void PathFinder::UpdateClearanceCosts(int rowOffset, int columnOffset, pybind11::list& window_costs)
+    {
+        // clearance costs must already be cached, only the window starting at [rowOffset][columnOffset] changes
+        if (_cachedClearanceCostData.empty())
+        {
+            printf("clearance costs not yet cached - returning");
+            return;
+        }
+
+        auto rowCount = static_cast<int>(py::len(window_costs));
+        for (int iRow = 0; iRow < rowCount; iRow++)
+        {
+            auto py_costs_row = window_costs[iRow].cast<py::list>();
+            auto columnCount = static_cast<int>(py::len(py_costs_row));
+            assert(rowOffset + iRow < _gridSize.first && columnOffset + columnCount <= _gridSize.second);
+            for (int iCol = 0; iCol < columnCount; iCol++)
+            {
+                _cachedClearanceCostData[rowOffset + iRow][columnOffset + iCol] = py_costs_row[iCol].cast<float>();
+            }
+        }
+    }
+
+    void PathFinder::CacheNeighbours(pybind11::list& neighbour_masks)
+    {
+        // make sure gridsize is set
+        if (_gridSize.first == 0 || _gridSize.second == 0)
+        {
+            printf("grid size not yet set (must perform cost caching first) - returning");
+            return;
+        }
+
+        // get/verify row and column counts
+        auto rowCount = static_cast<int>(py::len(neighbour_masks));
+        auto columnCount = static_cast<int>(py::len(neighbour_masks[0]));
+        assert(_gridSize.first == rowCount && _gridSize.second == columnCount);
+
+        // create neighbour matrix
+        _cachedNeighbourData = NeighbourDataMatrix(rowCount, std::vector<uint64_t>(columnCount));
+
+        // populate neighbour matrix
+        for (int iRow = 0; iRow < rowCount; iRow++)
+        {
+            auto py_masks_row = neighbour_masks[iRow].cast<py::list>();
+            for (int iCol = 0; iCol < columnCount; iCol++)
+            {
+                _cachedNeighbourData[iRow][iCol] = py_masks_row[iCol].cast<uint64_t>();
+            }
+        }
+    }
+
+    void PathFinder::CacheSearchMask(pybind11::list& search_mask)
+    {
+        // make sure gridsize is set
+        if (_gridSize.first == 0 || _gridSize.second == 0)
+        {
+            printf("grid size not yet set (must perform cost caching first) - returning");
+            return;
+        }
+
+        // get/verify row and column counts
+        auto rowCount = static_cast<int>(py::len(search_mask));
+        auto columnCount = static_cast<int>(py::len(search_mask[0]));
+        assert(_gridSize.first == rowCount && _gridSize.second == columnCount);
+
+        // create search mask matrix
+        _cachedSearchMaskData = ObstacleDataMatrix(rowCount, std::vector<bool>(columnCount));
+
+        // populate search mask matrix
+        for (int iRow = 0; iRow < rowCount; iRow++)
+        {
+            auto py_mask_row = search_mask[iRow].cast<py::list>();
+            for (int iCol = 0; iCol < columnCount; iCol++)
+            {
+                _cachedSearchMaskData[iRow][iCol] = py_mask_row[iCol].cast<bool>();
+            }
+        }
+    }
+
+    py::dict PathFinder::MemoryReport() const
+    {
+        // cost data is a matrix of per-node vectors, one float per kernel element
+        size_t costBytes = MatrixBytes(_cachedCostData);
+        for (const auto& row : _cachedCostData)
+        {
+            for (const auto& datum : row)
+            {
+                costBytes += datum.capacity() * sizeof(float);
+            }
+        }
+
+        // search progress: hash map entries hold their key/value pair plus (at least) a next pointer and a bucket
+        size_t entryOverhead = 2 * sizeof(void*);
+        size_t progressBytes =
+            _q.size() * sizeof(GraphNode) +
+            _explored.size() * (sizeof(ExploredMap::value_type) + entryOverhead) +
+            _enqueued.size() * (sizeof(EnqueuedMap::value_type) + entryOverhead);
+
+        py::dict report;
+        report["kernel"] = _kernel.capacity() * sizeof(GraphCoordinate);
+        report["costs"] = costBytes;
+
+        // cost tiles are usually shared with the provider's memo
+        size_t costTileBytes = 0;
+        for (const auto& keyTile : _costTiles)
+        {
+            costTileBytes += keyTile.second.first.nbytes();
+        }
+        report["cost_tiles"] = costTileBytes;
+        report["obstacles"] = MatrixBytes(_cachedObstacleData);
+        report["heuristics"] = MatrixBytes(_cachedHeuristicData);
+        report["clearance_costs"] = MatrixBytes(_cachedClearanceCostData);
+        report["neighbours"] = MatrixBytes(_cachedNeighbourData);
+        report["search_mask"] = MatrixBytes(_cachedSearchMaskData);
+        report["progress"] = progressBytes;
+        return report;
+    }
+
     bool PathFinder::TryGetNeighborAtKernelIndex(
         const GraphNode & node,
         int kernelIndex,
@@ -271,11 +476,68 @@ namespace pextant
             return false;
         }
 
+        // check to see if the neighbour masks (if there are any) say neighbor can't be reached
+        if (!_cachedNeighbourData.empty() &&
+            !((_cachedNeighbourData[node.coordinate.first][node.coordinate.second] >> kernelIndex) & 1))
+        {
+            outCost = -1.f;
+            return false;
+        }
+
+        // check to see if neighbor is outside the search mask (if there is one)
+        if (!_cachedSearchMaskData.empty() &&
+            !_cachedSearchMaskData[outNeighbor.coordinate.first][outNeighbor.coordinate.second])
+        {
+            outCost = -1.f;
+            return false;
+        }
+
         // a valid neighbor!
-        outCost = _cachedCostData[node.coordinate.first][node.coordinate.second][kernelIndex];
+        outCost = GetNeighborCost(node, kernelIndex);
+
+        // add the cost of moving close to obstacles (if there is one)
+        if (!_cachedClearanceCostData.empty())
+        {
+            outCost += _cachedClearanceCostData[outNeighbor.coordinate.first][outNeighbor.coordinate.second];
+        }
         return true;
     }
 
+    float PathFinder::GetNeighborCost(const GraphNode& node, int kernelIndex) const
+    {
+        if (!_cachedCostData.empty())
+        {
+            return _cachedCostData[node.coordinate.first][node.coordinate.second][kernelIndex];
+        }
+
+        // find the node's tile, fetching it if it isn't held yet
+        GraphCoordinate tileCoordinate(node.coordinate.first / _costTileSize, node.coordinate.second / _costTileSize);
+        auto tileIt = _costTiles.find(tileCoordinate);
+        if (tileIt != _costTiles.end())
+        {
+            // most recently used
+            _costTileOrder.splice(_costTileOrder.begin(), _costTileOrder, tileIt->second.second);
+        }
+        else
+        {
+            if (_costTiles.size() >= _maxCostTiles)
+            {
+                // evict the least recently used tile
+                _costTiles.erase(_costTileOrder.back());
+                _costTileOrder.pop_back();
+            }
+            auto tile = _costTileProvider(tileCoordinate.first, tileCoordinate.second).cast<CostTile>();
+            _costTileOrder.push_front(tileCoordinate);
+            tileIt = _costTiles.emplace(tileCoordinate, std::make_pair(tile, _costTileOrder.begin())).first;
+        }
+
+        // tiles are [rows x cols x kernel size], row-major
+        const CostTile& tile = tileIt->second.first;
+        auto tileRow = node.coordinate.first % _costTileSize;
+        auto tileCol = node.coordinate.second % _costTileSize;
+        return tile.data()[(tileRow * tile.shape(1) + tileCol) * tile.shape(2) + kernelIndex];
+    }
+
     float PathFinder::GetNodeHeuristic(const GraphNode& node) const
     {
         // assert we're in bounds to see if coordinate is in bounds
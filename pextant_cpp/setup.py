@@ -34,6 +34,10 @@ class CMakeBuild(build_ext):
         extdir = os.path.abspath(os.path.dirname(self.get_ext_fullpath(ext.name)))
         cmake_args = ['-DCMAKE_LIBRARY_OUTPUT_DIRECTORY=' + extdir,
                       '-DPYTHON_EXECUTABLE=' + sys.executable]
+        if not os.path.exists(os.path.join(ext.sourcedir, 'pybind11', 'CMakeLists.txt')):
+            # no pybind11 submodule checked out, use the pybind11 package installed as a build dependency
+            import pybind11
+            cmake_args += ['-Dpybind11_DIR=' + pybind11.get_cmake_dir()]
 
         cfg = 'Debug' if self.debug else 'Release'
         build_args = ['--config', cfg]
@@ -64,5 +68,6 @@ setup(
     long_description='',
     ext_modules=[CMakeExtension('pextant_cpp')],
     cmdclass=dict(build_ext=CMakeBuild),
+    setup_requires=['cmake', 'pybind11'],
     zip_safe=False,
 )